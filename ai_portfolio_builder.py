@@ -210,3 +210,51 @@ class AIPortfolioBuilder:
 
         cash_left = capital - total_mv
         return df, cash_left
+
+
+class EqualWeightBuilder:
+    """
+    الذكاء البسيط: توزيع متساوي بين كل أسهم الكون.
+    كل الأسعار بتيجي في استدعاء واحد (get_last_prices) والتخصيص في خطوة NumPy واحدة.
+    السهم اللي مالوش سعر بيتشال ونصيبه يفضل كاش (زي السلوك القديم).
+    """
+
+    def __init__(self, universe, lookback_days=180, auto_suffix=True, verbose=True, store=None):
+        self.universe = list(universe)
+        self.lookback_days = lookback_days
+        self.egx = EGXYahoo(self.universe, auto_suffix=auto_suffix, verbose=verbose, store=store)
+        self.verbose = verbose
+
+    def build_portfolio(self, capital, max_stocks=None, max_weight_per_stock=None, quotes=None):
+        """
+        max_stocks / max_weight_per_stock موجودين لتوحيد الواجهة مع باقي الـ builders
+        ومش بيأثروا على التوزيع المتساوي.
+        quotes: أسعار لحظية اختيارية (dict) بدل آخر إغلاق
+        """
+        if not self.universe:
+            raise ValueError("من فضلك اختر أسهماً أولاً.")
+
+        capital = float(capital)
+        prices = self.egx.get_last_prices(self.universe, quotes=quotes)
+        valid = ~np.isnan(prices) & (prices > 0)
+        if not valid.any():
+            raise ValueError("لا توجد أسعار حالية لأي سهم من الكون المختار.")
+
+        equal_weight = 1.0 / len(self.universe)
+        price = prices[valid]
+        shares = np.floor_divide(capital * equal_weight, price)
+        market_value = shares * price
+
+        df = pd.DataFrame({
+            "symbol": np.array(self.universe, dtype=object)[valid],
+            "weight_target": equal_weight,
+            "last_price": price,
+            "shares": shares.astype(int),
+            "market_value": market_value,
+        })
+
+        total_mv = market_value.sum()
+        df["weight_real"] = market_value / total_mv if total_mv > 0 else 0.0
+
+        cash_left = capital - total_mv
+        return df, cash_left
@@ -1,6 +1,23 @@
+import contextlib
+import datetime as dt
+import time
+
 import numpy as np
 import pandas as pd
+from build_memo import get_default_memo, memo_key
+from data_quality import validate_panel
+from egx_universe import symbol_groups
 from egx_yahoo import EGXYahoo
+from factor_normalization import normalize_cross_section
+from factor_registry import BENCHMARK_SYMBOL, PERCENT_COLUMNS, TRADING_DAYS, FactorConfig, FactorContext
+from factor_snapshot import column_names, snapshot_rows, to_arrow
+from parallel_factors import choose_execution, compute_factor_table_sharded, factor_table
+from portfolio_allocation import constrain_weights, liquidity_caps
+from streaming_factors import stream_factor_table
+from transaction_costs import estimate_spread
+
+# سياسة الأسهم اللي بياناتها ما اتحدثتش قبل الـ deadline: آخر شموع مخزنة أو استبعاد
+STALE_POLICIES = ("fallback", "drop")
 
 
 class AIPortfolioBuilderV2:
@@ -10,45 +27,129 @@ class AIPortfolioBuilderV2:
     - عامل الأساسيات Fundamentals (من Yahoo لو متوفر)
     - عامل الزخم Momentum (1M, 3M, 6M)
 
-    أوزان العوامل (حسب اختيارك):
+    أوزان العوامل الافتراضية (حسب اختيارك):
     - 20% Risk-Adjusted
     - 50% Fundamentals
     - 30% Momentum
+
+    factor_config: FactorConfig من factor_registry لتغيير الأوزان/النوافذ أو إضافة
+        عوامل (rsi, volume_trend, drawdown, beta, liquidity). العوامل بوزن 0 مش بتتحسب.
+    normalization: طريقة تطبيع العوامل ("minmax" / "rank" / "zscore" / "sector")
+    sector_map: dict {symbol: sector} لطريقة "sector" ولقيود القطاعات
+        (الافتراضي من جدول البيانات الوصفية في egx_universe)
+    adjusted: أسعار معدّلة للتوزيعات والتجزئة/الأسهم المجانية (عشان قفزة التجزئة
+        ما تظهرش كعائد سالب ضخم في العائد والتذبذب والزخم)
+    quality_policy: سياسة فحص جودة البيانات ("flag" / "repair" / "quarantine")
+        - انظر data_quality.validate_panel
+    execution: تنفيذ مرحلة العوامل ("auto" / "serial" / "parallel" / "stream") - parallel بيقسم
+        الأسهم على process pool (انظر parallel_factors)، و auto بيختاره للمسائل الكبيرة بس.
+        stream بيحمّل ويحسب الأسهم على دفعات بذاكرة محدودة (انظر streaming_factors) ومن غير
+        memo. النتيجة زي serial طالما الأسهم ليها نفس تقويم الجلسات
+    workers: عدد العمليات في الوضع المتوازي (الافتراضي عدد الـ CPUs)
+    memo: BuildMemo لإعادة استخدام جدول العوامل والمحفظة لنفس المدخلات ونفس البيانات
+        (الافتراضي memo مشترك على مستوى العملية، و False بيقفله) - انظر build_memo
+    cost_model: CostModel من transaction_costs - لو محدد، تحويل الأوزان لأسهم بيحسب حساب
+        العمولات والرسوم والـ spread وأثر السوق، والتكلفة بتتخصم من الكاش (None = بدون تكاليف)
+    deadline_seconds: ميزانية وقت التحميل لكل build (None = من غير حد). الأسهم اللي ما
+        اتحملتش في الوقت بتتعامل حسب stale_policy:
+        - "fallback": آخر شموع في المخزن (عمود stale = True في جدول العوامل)
+        - "drop": السهم بيتشال من الـ build
+        والأسهم اللي تحميلها بيفشل بشكل متكرر بتتخطى فوراً (انظر circuit_breaker)
     """
 
-    def __init__(self, universe, lookback_days=180, auto_suffix=True, verbose=True):
+    def __init__(self, universe, lookback_days=180, auto_suffix=True, verbose=True, store=None,
+                 normalization="minmax", sector_map=None, factor_config=None, adjusted=True,
+                 quality_policy="repair", execution="auto", workers=None, memo=None, cost_model=None,
+                 deadline_seconds=None, stale_policy="fallback"):
+        if stale_policy not in STALE_POLICIES:
+            raise ValueError(f"سياسة بيانات قديمة غير معروفة: {stale_policy}")
+
         self.universe = list(universe)
         self.lookback_days = lookback_days
-        self.egx = EGXYahoo(self.universe, auto_suffix=auto_suffix, verbose=verbose)
+        self.adjusted = adjusted
+        self.quality_policy = quality_policy
+        self.execution = execution
+        self.workers = workers
+        self.cost_model = cost_model
+        self.deadline_seconds = deadline_seconds
+        self.stale_policy = stale_policy
+        self._deadline = None
+        self.memo = get_default_memo() if memo is None else (memo or None)
+        self.egx = EGXYahoo(self.universe, auto_suffix=auto_suffix, verbose=verbose, store=store)
+        if self.memo is not None:
+            self.memo.watch(self.egx.store)
         self.verbose = verbose
 
-        # أوزان العوامل
-        self.w_risk = 0.20
-        self.w_fund = 0.50
-        self.w_mom = 0.30
+        # أوزان العوامل ومعاملاتها
+        self.factor_config = factor_config if factor_config is not None else FactorConfig()
+
+        # طريقة التطبيع عبر الأسهم
+        self.normalization = normalization
+        if sector_map is None:
+            sector_map = dict(zip(self.universe, symbol_groups(self.universe)))
+        self.sector_map = sector_map
 
         # هنخزن آخر جدول عوامل لعرضه في الواجهة
         self.last_factor_df = None
+        self.last_factor_table = None
+
+        # مصفوفة العوائد اليومية (dates x symbols) من آخر حساب للعوامل
+        self.last_returns = None
+
+        # تقرير جودة البيانات لكل سهم من آخر حساب للعوامل
+        self.last_quality_df = None
+
+        # الأسهم اللي اتحسبت من بيانات قديمة / اتشالت في آخر build بـ deadline
+        self.last_stale_symbols = []
+        self.last_dropped_symbols = []
 
     def _log(self, msg):
         if self.verbose:
             print(msg)
 
+    # اختصارات لأوزان العوامل الأساسية (للتوافق مع الكود القديم)
+    @property
+    def w_risk(self):
+        return self.factor_config.weights.get("risk", 0.0)
+
+    @w_risk.setter
+    def w_risk(self, value):
+        self.factor_config.weights["risk"] = value
+
+    @property
+    def w_fund(self):
+        return self.factor_config.weights.get("fund", 0.0)
+
+    @w_fund.setter
+    def w_fund(self, value):
+        self.factor_config.weights["fund"] = value
+
+    @property
+    def w_mom(self):
+        return self.factor_config.weights.get("mom", 0.0)
+
+    @w_mom.setter
+    def w_mom(self, value):
+        self.factor_config.weights["mom"] = value
+
     # ------------------------------------------------------------------
     # 1) تاريخ الأسعار لكل سهم
     # ------------------------------------------------------------------
-    def _get_price_history(self):
+    def _get_price_history(self, symbols=None, as_of=None):
         """
         الحصول على تاريخ الأسعار لكل سهم في الكون باستخدام egx.get_price(symbol).
+        symbols: لو None نستخدم self.universe
+        as_of: آخر lookback_days جلسة لحد التاريخ ده بدل آخر جلسة متاحة
         نرجع dict: {symbol: Series}
         """
         print("بدء تحميل البيانات...")
+        symbols = self.universe if symbols is None else symbols
         history = {}
 
-        for sym in self.universe:
+        for sym in symbols:
             try:
                 print(f"جلب البيانات للسهم: {sym}")
-                s = self.egx.get_price(sym)
+                s = self.egx.get_price(sym, adjusted=self.adjusted, as_of=as_of)
             except Exception as e:
                 self._log(f"⚠️ خطأ أثناء جلب الأسعار للسهم {sym}: {e}")
                 continue
@@ -72,105 +173,16 @@ class AIPortfolioBuilderV2:
         return history
 
     # ------------------------------------------------------------------
-    # 2) حساب العائد السنوي والتذبذب السنوي لكل سهم
+    # 2) حساب Score للأساسيات Fundamentals
     # ------------------------------------------------------------------
-    def _compute_return_risk(self, history_dict):
-        print("حساب العائد والمخاطرة...")
-        rows = []
-
-        for sym, s in history_dict.items():
-            daily_ret = s.pct_change().dropna()
-            if daily_ret.empty:
-                continue
-
-            mean_daily = float(daily_ret.mean())
-            daily_vol = float(daily_ret.std())
-
-            annual_return = (1 + mean_daily) ** 250 - 1
-            annual_vol = daily_vol * np.sqrt(250)
-
-            if np.isnan(annual_return) or np.isnan(annual_vol) or annual_vol == 0:
-                continue
-
-            risk_score_raw = annual_return / (annual_vol + 1e-6)
-
-            rows.append({
-                "symbol": sym,
-                "annual_return": annual_return,
-                "annual_vol": annual_vol,
-                "risk_score_raw": risk_score_raw
-            })
-
-        print("تم حساب العائد والمخاطرة!")
-        if not rows:
-            return pd.DataFrame()
-
-        df = pd.DataFrame.from_records(rows)
-        return df
-
-    # ------------------------------------------------------------------
-    # 3) حساب زخم السعر Momentum لكل سهم (1M, 3M, 6M)
-    # ------------------------------------------------------------------
-    def _compute_momentum(self, history_dict):
-        print("حساب الزخم السعري...")
-        rows = []
-
-        for sym, s in history_dict.items():
-            s = s.dropna()
-            if len(s) < 22:
-                self._log(f"⚠️ البيانات غير كافية للسهم {sym} لحساب الزخم.")
-                continue
-
-            last = float(s.iloc[-1])
-
-            def safe_mom(back_days):
-                if len(s) <= back_days:
-                    return np.nan
-                prev = float(s.iloc[-back_days])
-                if prev == 0:
-                    return np.nan
-                return (last / prev) - 1.0
-
-            mom_1m = safe_mom(21)   # تقريباً شهر
-            mom_3m = safe_mom(63)   # تقريباً 3 شهور
-            mom_6m = safe_mom(126)  # تقريباً 6 شهور
-
-            vals = [mom_1m, mom_3m, mom_6m]
-            vals_clean = [v for v in vals if not np.isnan(v)]
-            if not vals_clean:
-                self._log(f"⚠️ البيانات غير كافية لحساب الزخم للسهم {sym}.")
-                continue
-
-            # استخدام قيمة بديلة إذا كانت القيم غير موجودة
-            mom_score_raw = 0.5 * (mom_1m if not np.isnan(mom_1m) else 0) + \
-                            0.3 * (mom_3m if not np.isnan(mom_3m) else 0) + \
-                            0.2 * (mom_6m if not np.isnan(mom_6m) else 0)
-
-            rows.append({
-                "symbol": sym,
-                "mom_1m": mom_1m,
-                "mom_3m": mom_3m,
-                "mom_6m": mom_6m,
-                "mom_score_raw": mom_score_raw
-            })
-
-        print("تم حساب الزخم السعري!")
-        if not rows:
-            return pd.DataFrame()
-
-        df = pd.DataFrame.from_records(rows)
-        return df
-
-    # ------------------------------------------------------------------
-    # 4) حساب Score للأساسيات Fundamentals
-    # ------------------------------------------------------------------
-    def _compute_fundamental_scores(self):
+    def _compute_fundamental_scores(self, symbols=None):
         print("حساب الأساسيات...")
+        symbols = self.universe if symbols is None else symbols
         if not hasattr(self.egx, "get_fundamentals"):
-            return {sym: 0.5 for sym in self.universe}
+            return {sym: 0.5 for sym in symbols}
 
         raw_scores = {}
-        for sym in self.universe:
+        for sym in symbols:
             try:
                 fd = self.egx.get_fundamentals(sym)
             except Exception as e:
@@ -232,7 +244,7 @@ class AIPortfolioBuilderV2:
         return raw_scores
 
     # ------------------------------------------------------------------
-    # 5) تطبيع القيم بين 0 و 1 (min-max)
+    # 3) تطبيع القيم بين 0 و 1 (min-max)
     # ------------------------------------------------------------------
     @staticmethod
     def _min_max_normalize(series):
@@ -240,92 +252,515 @@ class AIPortfolioBuilderV2:
         if len(arr) == 0:
             return np.array([])
 
-        min_v = np.nanmin(arr)
-        max_v = np.nanmax(arr)
+        return normalize_cross_section(arr, method="minmax")
+
+    # ------------------------------------------------------------------
+    # 4) جدول العوامل الخام (بدون تطبيع) لمجموعة أسهم
+    # ------------------------------------------------------------------
+    def _get_volume_history(self, symbols, as_of=None):
+        """
+        حجم التداول لكل سهم من نفس بيانات OHLCV المخزنة (بدون تحميل إضافي)
+        """
+        volumes = {}
+        for sym in symbols:
+            v = self.egx.get_volume(sym, adjusted=self.adjusted, as_of=as_of)
+            if v is not None and not v.empty:
+                volumes[sym] = v
+        return volumes
+
+    def _get_benchmark_history(self, as_of=None):
+        s = self.egx.get_price(BENCHMARK_SYMBOL, adjusted=self.adjusted, as_of=as_of)
+        if s is None or s.empty:
+            return None
+        return s.iloc[-self.lookback_days:]
+
+    def _memo_key(self, kind, symbols, as_of=None, **params):
+        """
+        (مفتاح الـ memo، رموز المخزن المعتمد عليها) أو (None, None) لو الـ memo مقفول.
+        الأسعار بتتحمل الأول (لو ناقصة) عشان بصمة البيانات تبقى بصمة اللي هيتحسب عليه فعلاً.
+        تاريخ المفتاح هو as_of لو محدد، وإلا تاريخ النهارده (الأساسيات بتتغير من يوم ليوم).
+        """
+        # في وضع stream البصمة محتاجة تحميل الكون كله قبل الحساب، وده عكس فكرة الـ pipeline
+        if self.memo is None or self.execution == "stream":
+            return None, None
+
+        data_symbols = list(symbols)
+        if "benchmark_returns" in self.factor_config.required_inputs():
+            data_symbols.append(BENCHMARK_SYMBOL)
+        if self._deadline is None:
+            self.egx.prefetch(data_symbols)
+        else:
+            # التحميل حصل بالفعل بمهلة الـ deadline، والأسهم المستبعدة جزء من المدخلات
+            params = dict(params, dropped=sorted(self.last_dropped_symbols))
+        fingerprints = self.egx.data_fingerprint(data_symbols)
+
+        key = memo_key(
+            kind,
+            sorted(str(s) for s in symbols),
+            self.lookback_days,
+            self.adjusted,
+            self.quality_policy,
+            self.factor_config.key(),
+            fingerprints,
+            pd.Timestamp(as_of).isoformat() if as_of is not None else dt.date.today().isoformat(),
+            params,
+        )
+        return key, list(fingerprints)
+
+    @staticmethod
+    def _in_symbol_order(df, symbols):
+        """
+        ترتيب الصفوف زي الحساب المباشر لنفس ترتيب الكون (المفتاح بيستخدم الكون مرتب)
+        """
+        position = {sym: i for i, sym in enumerate(symbols)}
+        order = df["symbol"].map(position)
+        if "quarantined" in df.columns:
+            order = order + df["quarantined"].astype(bool) * len(symbols)
+        return df.iloc[np.argsort(order.values, kind="stable")].reset_index(drop=True)
 
-        if np.isnan(min_v) or np.isnan(max_v) or max_v == min_v:
-            return np.array([0.5] * len(arr))
+    @staticmethod
+    def _returns_for(returns, symbols):
+        if returns is None:
+            return None
+        return returns[[sym for sym in symbols if sym in returns.columns]]
 
-        return (arr - min_v) / (max_v - min_v)
+    def compute_factor_table(self, symbols=None, as_of=None):
+        """
+        يحسب جدول العوامل الخام لكل سهم (العوامل الفعّالة في factor_config + آخر سعر).
+        التطبيع والـ total_score بيتحسبوا في score_factors لأنهم يعتمدوا على الكون كله.
+        لو نفس الأسهم ونفس البيانات اتحسبت قبل كده بنرجّع النتيجة من الـ memo.
+        as_of: الجدول زي ما كان هيتحسب في التاريخ ده (بيانات لحد as_of بس). الأساسيات
+        مالهاش تاريخ فبتاخد القيمة المحايدة 0.5 لكل الأسهم في الحالة دي.
+        مع deadline_seconds الجدول فيه عمود stale للأسهم المحسوبة من آخر شموع مخزنة.
+        """
+        symbols = self.universe if symbols is None else list(symbols)
+
+        with self._deadline_scope(symbols):
+            factor_df = self._memoized_factor_table(symbols, as_of)
+            if self.deadline_seconds is not None:
+                factor_df["stale"] = factor_df["symbol"].isin(self.last_stale_symbols)
+        return factor_df
+
+    def _memoized_factor_table(self, symbols, as_of=None):
+        key, deps = self._memo_key("factors", symbols, as_of=as_of)
+        cached = self.memo.get(key) if key else None
+        if cached is not None:
+            factor_df, returns, quality = cached
+            self.last_returns = self._returns_for(returns, symbols)
+            self.last_quality_df = self._in_symbol_order(quality, symbols)
+            return self._in_symbol_order(factor_df, symbols)
+
+        factor_df = self._compute_factor_table(symbols, as_of)
+        if key:
+            self.memo.put(key, (factor_df.copy(), self.last_returns, self.last_quality_df), deps)
+        return factor_df
 
     # ------------------------------------------------------------------
-    # 6) بناء المحفظة
+    # ميزانية وقت التحميل (deadline)
     # ------------------------------------------------------------------
-    def build_portfolio(self, capital, max_stocks=12, max_weight_per_stock=0.2):
-        print("بدء بناء المحفظة...")
-        capital = float(capital)
+    @contextlib.contextmanager
+    def _deadline_scope(self, symbols):
+        """
+        جوه الـ scope: التحميل من Yahoo بيستنى لحد الـ deadline بس، وبعدها كل القراءة
+        من المخزن من غير أي تحميل (انظر EGXYahoo.cached_only). scope جوه scope (حساب
+        العوامل جوه build_portfolio) بيستخدم نفس الـ deadline.
+        """
+        if self.deadline_seconds is None or self._deadline is not None:
+            yield
+            return
+
+        self._deadline = time.monotonic() + float(self.deadline_seconds)
+        self.last_stale_symbols = []
+        self.last_dropped_symbols = []
+        try:
+            # في وضع stream كل دفعة بتتحمل لوحدها بالوقت الباقي
+            if self.execution != "stream":
+                self._fetch_until_deadline(symbols)
+            with self.egx.cached_only(allow_stale=self.stale_policy == "fallback"):
+                yield
+        finally:
+            self._deadline = None
+
+    def _fetch_until_deadline(self, symbols):
+        """
+        prefetch بمهلة الوقت الباقي + تسجيل الأسهم اللي بياناتها قديمة أو ناقصة
+        """
+        data_symbols = list(symbols)
+        if "benchmark_returns" in self.factor_config.required_inputs():
+            data_symbols.append(BENCHMARK_SYMBOL)
+        self.egx.prefetch(data_symbols, timeout=max(self._deadline - time.monotonic(), 0.0))
+
+        stale, dropped = [], []
+        for sym, status in self.egx.data_status(symbols).items():
+            if status == "stale" and self.stale_policy == "fallback":
+                stale.append(sym)
+            elif status != "fresh":
+                dropped.append(sym)
+
+        if stale:
+            self._log(f"⚠️ أسهم محسوبة من آخر بيانات مخزنة (التحديث ما وصلش في الوقت): {stale}")
+        if dropped:
+            self._log(f"⚠️ أسهم مستبعدة لعدم وصول بياناتها في الوقت: {dropped}")
+        self.last_stale_symbols.extend(stale)
+        self.last_dropped_symbols.extend(dropped)
+
+    def _compute_factor_table(self, symbols, as_of=None):
+        if self.execution == "stream":
+            return self._compute_factor_table_streaming(symbols, as_of)
 
         # 1) التاريخ السعري
-        history = self._get_price_history()
+        history = self._get_price_history(symbols, as_of)
         if not history:
             raise ValueError("لا توجد بيانات تاريخية صالحة لأي سهم من الكون المختار.")
 
-        # 2) عامل العائد/المخاطرة
-        rr_df = self._compute_return_risk(history)
-        if rr_df.empty:
-            raise ValueError("تعذر حساب العائد/المخاطرة للأسهم.")
+        factor_df, quality, ctx = self._factor_table_from_history(history, as_of)
+        self.last_quality_df = quality
+        if factor_df is None:
+            raise ValueError("لا توجد بيانات تاريخية صالحة لأي سهم من الكون المختار.")
 
-        # 3) عامل الزخم
-        mom_df = self._compute_momentum(history)
-        if mom_df.empty:
-            raise ValueError("تعذر حساب الزخم السعري للأسهم.")
+        self.last_returns = ctx.get("returns")
+        return factor_df
 
-        # 4) عامل الأساسيات
-        fund_scores_dict = self._compute_fundamental_scores()
+    def _compute_factor_table_streaming(self, symbols, as_of=None):
+        """
+        نفس _compute_factor_table لكن على دفعات: دفعة بتتحمل في الخلفية ودفعة بتتحسب،
+        وكل دفعة بتسيب ملخص صفوفها بس (انظر streaming_factors). الأسهم اللي الدفعة
+        حمّلتها بنفسها بتتشال من مخزن الأسعار المشترك بعد حسابها، فالشموع الخام ما بتكبرش
+        مع حجم الكون (اللي كان في المخزن قبل الـ build بيفضل زي ما هو). اللي مراحل بعد
+        العوامل محتاجاه بيتساب مع كل دفعة: الـ spread في صف السهم (_factor_table_from_history)
+        وعوائد الدفعة اليومية (last_returns لمخاطر المحفظة والسيناريوهات)، فمفيش تحميل تاني.
+        """
+        fetched = set()
+        errors = []
+        returns = []
+
+        def fetch(chunk):
+            before = self.egx.data_status(chunk)
+            if self._deadline is not None:
+                self._fetch_until_deadline(chunk)
+            else:
+                self.egx.prefetch(chunk)
+            after = self.egx.data_status(chunk)
+            fetched.update(s for s in chunk if before[s] != "fresh" and after[s] == "fresh")
+            return self._get_price_history(chunk, as_of)
+
+        def score(history):
+            try:
+                factor_df, quality, ctx = self._factor_table_from_history(history, as_of)
+                if ctx is not None:
+                    returns.append(ctx.get("returns"))
+            except ValueError as e:
+                # زي _score_shard في الوضع المتوازي: دفعة ما ينفعش يتحسب لها عوامل (تاريخ
+                # أقصر من النوافذ مثلاً) بتتساب بتقرير جودتها بس والباقي يكمل
+                self._log(f"⚠️ تعذر حساب العوامل للأسهم {list(history)}: {e}")
+                errors.append(e)
+                _, quality = validate_panel(pd.DataFrame(history), policy=self.quality_policy)
+                quality = quality.reset_index()
+                factor_df = None
+            finally:
+                done = [s for s in history if s in fetched]
+                self.egx.evict(done)
+                fetched.difference_update(done)
+            if factor_df is None:
+                # دفعة كل أسهمها مستبعدة: بتتسجل في الجدول (بدون عوامل) زي الحساب الكامل
+                factor_df = quality.loc[quality["quarantined"], ["symbol", "quality_score", "quarantined"]]
+            return factor_df, quality
+
+        factor_df, quality = stream_factor_table(symbols, fetch, score)
+        self.last_quality_df = quality
+        self.last_returns = pd.concat(returns, axis=1, sort=True) if returns else None
+        if factor_df is None or factor_df["quarantined"].astype(bool).all():
+            if errors:
+                raise errors[0]
+            raise ValueError("لا توجد بيانات تاريخية صالحة لأي سهم من الكون المختار.")
+        return self._in_symbol_order(factor_df, symbols)
 
-        # 5) دمج العوامل في جدول واحد
-        factor_df = pd.merge(rr_df, mom_df, on="symbol", how="inner")
+    def _factor_table_from_history(self, history, as_of=None):
+        """
+        فحص الجودة + العوامل + آخر سعر لمجموعة أسهم {symbol: Series}.
+        يرجّع (factor_df, quality_df, ctx) - factor_df = None لو كل الأسهم اتستبعدت.
+        """
+        # 2) فحص جودة البيانات على المصفوفة كلها (إصلاح الشموع السيئة / استبعاد الأسهم)
+        close, quality = validate_panel(pd.DataFrame(history), policy=self.quality_policy)
+        quarantined = quality.index[quality["quarantined"]].tolist()
+        if quarantined:
+            self._log(f"⚠️ أسهم مستبعدة لسوء جودة البيانات: {quarantined}")
+        clean_history = {sym: history[sym] for sym in close.columns}
+        if not clean_history:
+            return None, quality.reset_index(), None
+
+        # 3) العوامل الفعّالة فقط من السجل، مع مدخلات مشتركة تتحسب مرة واحدة
+        #    (بدون أساسيات في حالة as_of → قيمة محايدة)
+        ctx = FactorContext(
+            clean_history,
+            volume_loader=lambda syms: self._get_volume_history(syms, as_of),
+            fundamentals_loader=self._compute_fundamental_scores if as_of is None else None,
+            benchmark_loader=lambda: self._get_benchmark_history(as_of),
+            close=close,
+        )
+        mode, n_shards = choose_execution(close.size, close.shape[1], self.execution, self.workers)
+        if mode == "parallel":
+            factor_df = self._compute_factors_parallel(close, n_shards, as_of)
+        else:
+            factor_df = factor_table(ctx, self.factor_config)
+
+        # آخر سعر لكل سهم من الأسعار بعد الإصلاح (بيستخدم في التخصيص)، فالشمعة السيئة
+        # اللي اتصلحت للعوامل ما تدخلش في حساب عدد الأسهم
+        factor_df["last_price"] = factor_df["symbol"].map(
+            lambda s: float(close[s].dropna().iloc[-1])
+        )
+
+        # spread كل سهم من High/Low بيتحسب هنا من نفس البيانات ويفضل في صفه، فالتخصيص
+        # ما بيرجعش للمخزن (في وضع stream الأسهم بتتشال منه بعد حساب دفعتها)
+        if self.cost_model is not None:
+            factor_df["spread_est"] = self._get_spread_estimates(factor_df["symbol"].tolist(), as_of)
+
+        # جودة البيانات لكل سهم. الأسهم المستبعدة بتفضل في الجدول (بدون عوامل)
+        # عشان الـ snapshot يسجلها وما يتعادش حسابها مباشرة مع كل build
+        factor_df["quality_score"] = factor_df["symbol"].map(quality["quality_score"])
+        factor_df["quarantined"] = False
+        if quarantined:
+            excluded = pd.DataFrame({
+                "symbol": quarantined,
+                "quality_score": quality.loc[quarantined, "quality_score"].values,
+                "quarantined": True,
+            })
+            factor_df = pd.concat([factor_df, excluded], ignore_index=True)
 
-        if factor_df.empty:
-            raise ValueError("لم يتبق أسهم مشتركة بين عوامل العائد/المخاطرة والزخم.")
+        return factor_df, quality.reset_index(), ctx
 
-        factor_df["fund_score_raw"] = factor_df["symbol"].map(
-            lambda s: fund_scores_dict.get(s, 0.5)
+    def _compute_factors_parallel(self, close, n_shards, as_of=None):
+        """
+        المدخلات اللي بتيجي من المخزن أو الشبكة (الحجم، الأساسيات، المؤشر) بتتحمل هنا مرة
+        واحدة، والـ workers بيحسبوا العوامل على شرائح الأسهم من shared memory
+        """
+        required = self.factor_config.required_inputs()
+        symbols = list(close.columns)
+
+        volume = pd.DataFrame(self._get_volume_history(symbols, as_of))
+        fundamentals = None
+        if "fundamentals" in required and as_of is None:
+            fundamentals = self._compute_fundamental_scores(symbols)
+        benchmark = self._get_benchmark_history(as_of) if "benchmark_returns" in required else None
+
+        self._log(f"⚙️ حساب العوامل على {n_shards} عمليات متوازية")
+        return compute_factor_table_sharded(
+            close,
+            self.factor_config,
+            volume=volume if not volume.empty else None,
+            fundamentals=fundamentals,
+            benchmark=benchmark,
+            n_shards=n_shards,
         )
 
-        # 6) نطبّع كل عامل إلى [0,1]
-        factor_df["risk_score"] = self._min_max_normalize(factor_df["risk_score_raw"].values)
-        factor_df["mom_score"] = self._min_max_normalize(factor_df["mom_score_raw"].values)
-        factor_df["fund_score"] = self._min_max_normalize(factor_df["fund_score_raw"].values)
+    def get_returns_panel(self, symbols):
+        """
+        مصفوفة العوائد اليومية لمجموعة أسهم (مثلاً أسهم المحفظة النهائية).
+        بنعيد استخدام مصفوفة آخر build لو فيها كل الأسهم، وإلا بنبنيها من المخزن.
+        """
+        symbols = list(symbols)
+        if self.last_returns is not None and all(sym in self.last_returns.columns for sym in symbols):
+            return self.last_returns[symbols]
 
-        # 7) حساب Score النهائي
-        factor_df["total_score"] = (
-            self.w_risk * factor_df["risk_score"] +
-            self.w_fund * factor_df["fund_score"] +
-            self.w_mom * factor_df["mom_score"]
+        history = self._get_price_history(symbols)
+        if not history:
+            raise ValueError("لا توجد بيانات تاريخية صالحة لأي سهم من الكون المختار.")
+        return FactorContext(history).get("returns")
+
+    # ------------------------------------------------------------------
+    # 5) تطبيع العوامل وحساب الـ Score النهائي
+    # ------------------------------------------------------------------
+    def score_factors(self, factor_df):
+        factor_df = factor_df.copy()
+
+        # نطبّع كل العوامل إلى [0,1] مرة واحدة على مصفوفة (n_symbols, n_factors)
+        factors = self.factor_config.active_factors()
+        raw_cols = [f.output for f in factors]
+        groups = None
+        if self.normalization == "sector":
+            groups = [self.sector_map.get(sym, "UNKNOWN") for sym in factor_df["symbol"]]
+
+        scores = normalize_cross_section(
+            factor_df[raw_cols].values, method=self.normalization, groups=groups
         )
 
+        # حساب Score النهائي
+        total = 0.0
+        for i, f in enumerate(factors):
+            factor_df[f.score_column] = scores[:, i]
+            total = total + self.factor_config.weights[f.name] * factor_df[f.score_column]
+        factor_df["total_score"] = total
+
+        # أعمدة العرض (العائد والتذبذب كنسب مئوية) – الواجهة بتعرضها زي ما هي
+        for col, pct_col in PERCENT_COLUMNS.items():
+            if col in factor_df.columns:
+                factor_df[pct_col] = (factor_df[col] * 100).round(2)
+
         # نعمل sort حسب total_score
-        factor_df = factor_df.sort_values("total_score", ascending=False)
+        return factor_df.sort_values("total_score", ascending=False)
+
+    # ------------------------------------------------------------------
+    # 6) جدول العوامل من Snapshot محسوب مسبقاً
+    # ------------------------------------------------------------------
+    def _factor_table_from_snapshot(self, factor_snapshot):
+        """
+        نفلتر الـ snapshot على الكون المختار فقط.
+        لو الـ snapshot ناقصه عامل من العوامل الفعّالة، بنحسب الجدول كله مباشرة.
+        الأسهم الناقصة من الـ snapshot (لو فيه) بتتحسب مباشرة وتتضاف.
+        """
+        required = [f.output for f in self.factor_config.active_factors()]
+        columns = column_names(factor_snapshot)
+        if any(col not in columns for col in required):
+            self._log("⚠️ الـ snapshot لا يحتوي كل العوامل المطلوبة، سيتم الحساب مباشرة.")
+            return self.compute_factor_table()
+
+        # مع snapshot بصيغة Arrow الفلترة بتحصل على الملف الممسوح في الذاكرة،
+        # وصفوف الكون بس هي اللي بتتحول لـ pandas
+        snap = snapshot_rows(factor_snapshot, self.universe)
+        missing = [sym for sym in self.universe if sym not in set(snap["symbol"])]
+
+        if missing:
+            self._log(f"⚠️ أسهم غير موجودة في الـ snapshot وسيتم حسابها مباشرة: {missing}")
+            try:
+                live_df = self.compute_factor_table(missing)
+            except ValueError:
+                live_df = pd.DataFrame()
+            snap = pd.concat([snap, live_df], ignore_index=True)
+
+        if snap.empty:
+            raise ValueError("لا توجد بيانات تاريخية صالحة لأي سهم من الكون المختار.")
 
-        # نخزن نسخة لعرضها في Streamlit
-        self.last_factor_df = factor_df.copy().reset_index(drop=True)
+        return snap
 
-        # 8) نختار أعلى max_stocks
+    # ------------------------------------------------------------------
+    # 7) بناء المحفظة
+    # ------------------------------------------------------------------
+    @staticmethod
+    def target_weights(factor_df, max_stocks, max_weight_per_stock):
+        """
+        من جدول عوامل متقيّم ومترتب (score_factors): أعلى max_stocks سهم وأوزانهم
+        المبدئية من total_score بعد حد الوزن. يرجّع (top_df, weights)
+        """
         top_df = factor_df.head(max_stocks).copy()
-        top_symbols = top_df["symbol"].tolist()
+        n = len(top_df)
 
-        # 9) تحويل total_score إلى أوزان مبدئية
+        # تحويل total_score إلى أوزان مبدئية
         raw_scores = np.clip(top_df["total_score"].values, a_min=0.0, a_max=None)
         if raw_scores.sum() == 0:
-            weights_raw = np.array([1.0 / len(top_symbols)] * len(top_symbols))
+            weights_raw = np.array([1.0 / n] * n)
         else:
             weights_raw = raw_scores / raw_scores.sum()
 
         # تطبيق حد أقصى للوزن
         weights_clipped = np.clip(weights_raw, 0.0, max_weight_per_stock)
         if weights_clipped.sum() == 0:
-            weights_clipped = np.array([1.0 / len(top_symbols)] * len(top_symbols))
+            weights_clipped = np.array([1.0 / n] * n)
         else:
             weights_clipped = weights_clipped / weights_clipped.sum()
 
-        # 10) جلب آخر سعر لكل سهم من التاريخ نفسه
+        return top_df, weights_clipped
+
+    def _exposure_groups(self, symbols, sector_caps=None, exposure_caps=None):
+        """
+        قائمة (labels, caps) لـ constrain_weights من قيود القطاعات والبيانات الوصفية
+        """
+        groups = []
+        if sector_caps is not None:
+            labels = [self.sector_map.get(sym, "UNKNOWN") for sym in symbols]
+            groups.append((labels, sector_caps))
+        for field, caps in (exposure_caps or {}).items():
+            groups.append((symbol_groups(symbols, field), caps))
+        return groups
+
+    def build_portfolio(self, capital, max_stocks=12, max_weight_per_stock=0.2, factor_snapshot=None,
+                        max_adv_fraction=None, sector_caps=None, exposure_caps=None, as_of=None):
+        """
+        factor_snapshot: جدول عوامل محسوب مسبقاً لكل السوق (من factor_snapshot.py).
+        لو موجود، بنفلتره على الكون المختار بدل تحميل الأسعار وحساب العوامل.
+        max_adv_fraction: لو محدد (مثلاً 0.1)، قيمة أي مركز لا تتعدى هذه النسبة من
+        متوسط قيمة التداول اليومي للسهم. الزيادة تتوزع على باقي الأسهم أو تفضل كاش.
+        sector_caps: أقصى وزن لكل قطاع – رقم واحد لكل القطاعات أو dict {sector: cap}
+        exposure_caps: قيود على باقي البيانات الوصفية، مثلاً {"cap_bucket": {"small": 0.2}}
+        القيود كلها بتتحل مع حد السهم الواحد في خطوة واحدة (constrain_weights).
+        نفس المدخلات على نفس البيانات في نفس اليوم بترجع من الـ memo مباشرة.
+        as_of: المحفظة اللي النموذج كان هيبنيها في التاريخ ده، من بيانات المخزن لحد as_of بس
+        (الأسعار، آخر سعر للتخصيص، المؤشر، الحجم) – انظر compute_factor_table.
+        """
+        if as_of is not None and factor_snapshot is not None:
+            raise ValueError("لا يمكن استخدام factor_snapshot مع as_of (الـ snapshot محسوب على آخر بيانات).")
+
+        with self._deadline_scope(self.universe if factor_snapshot is None else ()):
+            key = deps = None
+            if factor_snapshot is None:
+                key, deps = self._memo_key(
+                    "portfolio",
+                    self.universe,
+                    as_of=as_of,
+                    capital=float(capital),
+                    max_stocks=max_stocks,
+                    max_weight_per_stock=max_weight_per_stock,
+                    max_adv_fraction=max_adv_fraction,
+                    sector_caps=sector_caps,
+                    exposure_caps=exposure_caps,
+                    normalization=self.normalization,
+                    sectors={sym: self.sector_map.get(sym) for sym in self.universe},
+                    costs=self.cost_model.key() if self.cost_model is not None else None,
+                )
+
+            cached = self.memo.get(key) if key else None
+            if cached is not None:
+                pf_df, cash_left, factor_df, returns, quality = cached
+                self.last_factor_df = factor_df.copy()
+                self.last_factor_table = to_arrow(self.last_factor_df)
+                self.last_returns = self._returns_for(returns, self.universe)
+                self.last_quality_df = quality
+                return pf_df.copy(), cash_left
+
+            pf_df, cash_left = self._build_portfolio(
+                capital, max_stocks, max_weight_per_stock, factor_snapshot,
+                max_adv_fraction, sector_caps, exposure_caps, as_of,
+            )
+            if key:
+                self.memo.put(
+                    key,
+                    (pf_df.copy(), cash_left, self.last_factor_df.copy(), self.last_returns, self.last_quality_df),
+                    deps,
+                )
+            return pf_df, cash_left
+
+    def _build_portfolio(self, capital, max_stocks, max_weight_per_stock, factor_snapshot,
+                         max_adv_fraction, sector_caps, exposure_caps, as_of=None):
+        print("بدء بناء المحفظة...")
+        capital = float(capital)
+
+        # 1) جدول العوامل الخام
+        if factor_snapshot is not None:
+            factor_df = self._factor_table_from_snapshot(factor_snapshot)
+        else:
+            factor_df = self.compute_factor_table(as_of=as_of)
+
+        # الأسهم المستبعدة لسوء جودة البيانات مش بتدخل التطبيع ولا الاختيار
+        if "quarantined" in factor_df.columns:
+            factor_df = factor_df[~factor_df["quarantined"].astype(bool)]
+            if factor_df.empty:
+                raise ValueError("كل الأسهم مستبعدة لسوء جودة البيانات.")
+
+        # 2) التطبيع والـ Score النهائي
+        factor_df = self.score_factors(factor_df)
+
+        # نخزن الجدول لعرضه في Streamlit (reset_index بيرجّع frame جديد، مفيش داعي لـ copy)،
+        # ونسخة Arrow بتتعمل مرة واحدة وتتسلم للواجهة من غير تحويل تاني
+        self.last_factor_df = factor_df.reset_index(drop=True)
+        self.last_factor_table = to_arrow(self.last_factor_df)
+
+        # 3) و 4) أعلى max_stocks وأوزانهم المبدئية
+        top_df, weights_clipped = self.target_weights(factor_df, max_stocks, max_weight_per_stock)
+        top_symbols = top_df["symbol"].tolist()
+
+        # 5) آخر سعر لكل سهم من جدول العوامل
         last_prices = {}
-        for sym in top_symbols:
-            s = history.get(sym)
-            if s is None or s.empty:
-                continue
-            p = float(s.iloc[-1])
+        for sym, p in zip(top_symbols, top_df["last_price"].values):
+            p = float(p)
             if np.isnan(p):
                 continue
             last_prices[sym] = p
@@ -333,7 +768,7 @@ class AIPortfolioBuilderV2:
         if not last_prices:
             raise ValueError("تعذر الحصول على أسعار نهائية للأسهم المختارة.")
 
-        # 11) مطابقة الأوزان مع الأسهم اللي لها سعر فعلي
+        # 6) مطابقة الأوزان مع الأسهم اللي لها سعر فعلي
         valid_syms = [sym for sym in top_symbols if sym in last_prices]
         if not valid_syms:
             raise ValueError("بعد استبعاد الأسهم بدون سعر، لم يتبق أي سهم لبناء المحفظة.")
@@ -346,22 +781,62 @@ class AIPortfolioBuilderV2:
         w_final = np.array(w_final, dtype=float)
         w_final = w_final / w_final.sum()
 
-        # 12) تحويل الأوزان لعدد أسهم فعلي
+        # 7) مرحلة القيود: حد السيولة لكل مركز (نسبة من متوسط قيمة التداول اليومي)
+        #    + حدود القطاعات/المجموعات
+        adtv = None
+        liq_caps = None
+        caps = np.inf
+        if max_adv_fraction:
+            # snapshot قديم ممكن ما يكونش فيه العمود → من غير حد سيولة
+            if "avg_traded_value" in top_df:
+                adtv_col = top_df["avg_traded_value"]
+            else:
+                adtv_col = pd.Series(np.nan, index=top_df.index)
+            adtv_by_sym = dict(zip(top_df["symbol"], adtv_col))
+            adtv = np.array([adtv_by_sym.get(sym, np.nan) for sym in valid_syms], dtype=float)
+            liq_caps = liquidity_caps(capital, adtv, max_adv_fraction)
+            caps = liq_caps
+
+        groups = self._exposure_groups(valid_syms, sector_caps, exposure_caps)
+        if liq_caps is not None or groups:
+            # إعادة التوزيع ما تعديش حد الوزن لكل سهم (ولا تقلل وزن سهم بسببه)
+            caps = np.minimum(caps, np.maximum(w_final, max_weight_per_stock))
+            w_final = constrain_weights(w_final, caps, groups)
+
+        # 8) تحويل الأوزان لعدد أسهم فعلي (بعد تكاليف التنفيذ لو فيه cost_model)
+        prices = np.array([last_prices[sym] for sym in valid_syms], dtype=float)
+        allocs = capital * w_final
+        costs = None
+        if self.cost_model is not None:
+            market = self._cost_inputs(valid_syms, top_df, as_of)
+            all_shares, costs = self.cost_model.size_orders(allocs, prices, **market)
+        else:
+            all_shares = (allocs // prices).astype(int)
+
         rows = []
-        for sym, w in zip(valid_syms, w_final):
-            price = last_prices[sym]
-            alloc = capital * w
-            shares = int(alloc // price)
+        for i, (sym, w) in enumerate(zip(valid_syms, w_final)):
+            price = prices[i]
+            alloc = allocs[i]
+            shares = int(all_shares[i])
             mv = shares * price
 
-            rows.append({
+            row = {
                 "symbol": sym,
                 "weight_target": w,
                 "capital_alloc": alloc,
                 "last_price": price,
                 "shares": shares,
                 "market_value": mv
-            })
+            }
+            if liq_caps is not None:
+                row["avg_traded_value"] = adtv[i]
+                row["liquidity_capped"] = bool(w >= liq_caps[i] - 1e-12)
+            if sector_caps is not None:
+                row["sector"] = self.sector_map.get(sym, "UNKNOWN")
+            if costs is not None:
+                row["spread_est"] = market["spread"][i]
+                row["trade_cost"] = costs[i]
+            rows.append(row)
 
         if not rows:
             raise ValueError("لم يتمكن النظام من تخصيص أي أسهم (ربما الأسعار غير صالحة).")
@@ -377,5 +852,48 @@ class AIPortfolioBuilderV2:
         pf_df = pf_df.sort_values("weight_real", ascending=False).reset_index(drop=True)
 
         cash_left = capital - total_mv
+        if costs is not None:
+            cash_left -= float(costs.sum())
         print("تم بناء المحفظة بنجاح!")
         return pf_df, cash_left
+
+    def _get_spread_estimates(self, symbols, as_of=None):
+        """
+        spread نسبي مقدّر من High/Low آخر lookback_days جلسة لكل سهم (NaN لو مش متاح)
+        """
+        highs, lows = {}, {}
+        for sym in symbols:
+            frame = self.egx.get_ohlcv(sym, adjusted=self.adjusted, as_of=as_of)
+            if frame is None or frame.empty:
+                continue
+            frame = frame.iloc[-self.lookback_days:]
+            highs[sym] = frame["High"]
+            lows[sym] = frame["Low"]
+
+        if not highs:
+            return np.full(len(symbols), np.nan)
+        high = pd.DataFrame(highs).reindex(columns=symbols)
+        low = pd.DataFrame(lows).reindex(index=high.index, columns=symbols)
+        return estimate_spread(high.to_numpy(dtype=float), low.to_numpy(dtype=float))
+
+    def _cost_inputs(self, symbols, factor_df, as_of=None):
+        """
+        مدخلات نموذج التكاليف لكل سهم: الـ spread، متوسط قيمة التداول، والتذبذب اليومي
+        """
+        by_symbol = factor_df.set_index("symbol")
+
+        def column(name):
+            if name not in by_symbol.columns:
+                return None
+            return by_symbol[name].reindex(symbols).to_numpy(dtype=float)
+
+        # الـ spread من جدول العوامل لو اتحسب معاه، وإلا (snapshot مثلاً) من المخزن
+        spread = column("spread_est")
+        if spread is None:
+            spread = self._get_spread_estimates(symbols, as_of)
+        annual_vol = column("annual_vol")
+        return {
+            "spread": spread,
+            "adtv": column("avg_traded_value"),
+            "daily_vol": annual_vol / np.sqrt(TRADING_DAYS) if annual_vol is not None else None,
+        }
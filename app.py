@@ -1,6 +1,19 @@
+import time
+
+_IMPORT_T0 = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
-import numpy as np
+
+# زمن استيراد ما تحتاجه صفحة الدخول فقط (streamlit)
+# حزمة البيانات/الحسابات (pandas / yfinance / builders) بتتحمّل بعد تسجيل الدخول
+LOGIN_IMPORT_BUDGET_SECONDS = 1.5
+LOGIN_IMPORT_SECONDS = time.perf_counter() - _IMPORT_T0
+
+if LOGIN_IMPORT_SECONDS > LOGIN_IMPORT_BUDGET_SECONDS:
+    print(
+        f"⚠️ login imports took {LOGIN_IMPORT_SECONDS:.2f}s "
+        f"(budget {LOGIN_IMPORT_BUDGET_SECONDS:.2f}s)"
+    )
 
 # ==============================
 # 🔐 LOGIN PAGE
@@ -16,6 +29,17 @@ VALID_PASSWORD = "12345"
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
 
+
+def start_background_warmup():
+    """
+    Prefetch the default universe into the shared price store in a
+    background thread, so the first build after login hits warm data.
+    """
+    from egx_universe import DEFAULT_UNIVERSE
+    from egx_yahoo import start_warmup
+
+    start_warmup(DEFAULT_UNIVERSE)
+
 def login_screen():
     st.title("🔐 Secure Login")
     st.write("Please enter your credentials to access the application.")
@@ -26,6 +50,7 @@ def login_screen():
     if st.button("Login"):
         if username == VALID_USERNAME and password == VALID_PASSWORD:
             st.session_state.authenticated = True
+            start_background_warmup()
             st.success("Login successful!")
             st.rerun()
 
@@ -38,16 +63,18 @@ def login_screen():
 # ==============================
 
 def run_portfolio_app():
-    st.title("📊 EGX AI Portfolio Builder V2")
-    st.write("Advanced multi-factor portfolio builder for the Egyptian Stock Market.")
+    # no-op if the warm-up is already running or the store is warm
+    start_background_warmup()
 
     # Import your actual V2 app logic here
     # Instead of copying the entire long file,
-    # we simply import and call its main() function
+    # we simply import it (cached after the first run) and call its
+    # render() entry point on every rerun. render() draws the V2 title
+    # and never calls st.set_page_config.
 
     import egx_ai_portfolio_app_v2
 
-    
+    egx_ai_portfolio_app_v2.render()
 
 
 # ==============================
@@ -0,0 +1,83 @@
+"""
+قياس زمن الاستيراد لصفحة الدخول مقابل حزمة البيانات/الحسابات.
+
+كل قياس بيتم في interpreter جديد (cold import) عشان الـ module cache ما يأثرش.
+الاستخدام:
+    python bench_startup.py
+"""
+import ast
+import os
+import subprocess
+import sys
+
+LOGIN_MODULES = ["streamlit", "egx_universe"]
+COMPUTE_MODULES = ["ai_portfolio_builder_v2", "yfinance"]
+HEAVY_MODULES = ["yfinance", "requests", "ai_portfolio_builder_v2", "egx_yahoo"]
+
+
+def _read_login_budget():
+    """
+    نقرأ LOGIN_IMPORT_BUDGET_SECONDS من app.py بدون تشغيله
+    (استيراد app.py بيشغّل صفحة streamlit نفسها)
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id == "LOGIN_IMPORT_BUDGET_SECONDS" for t in node.targets
+        ):
+            return float(ast.literal_eval(node.value))
+    raise RuntimeError("LOGIN_IMPORT_BUDGET_SECONDS not found in app.py")
+
+
+def _cold_import(modules, repeats=3):
+    code = (
+        "import sys, time\n"
+        "t0 = time.perf_counter()\n"
+        f"for m in {modules!r}:\n"
+        "    __import__(m)\n"
+        "elapsed = time.perf_counter() - t0\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(elapsed, ','.join(heavy))\n"
+    )
+
+    best = None
+    heavy = ""
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip().split(" ", 1)
+        elapsed = float(out[0])
+        heavy = out[1] if len(out) > 1 else ""
+        best = elapsed if best is None else min(best, elapsed)
+    return best, heavy
+
+
+def main():
+    budget = _read_login_budget()
+    login_s, login_heavy = _cold_import(LOGIN_MODULES)
+    compute_s, _ = _cold_import(COMPUTE_MODULES)
+
+    print(f"login screen imports : {login_s:.3f}s (budget {budget:.2f}s)")
+    print(f"compute stack imports: {compute_s:.3f}s (loaded after login)")
+
+    ok = True
+    if login_heavy:
+        print(f"FAIL: login screen pulled in heavy modules: {login_heavy}")
+        ok = False
+    if login_s > budget:
+        print("FAIL: login screen import budget exceeded")
+        ok = False
+
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Memoization لنتايج الـ builder (جدول العوامل والمحفظة) بمفتاح محتوى المدخلات.
+
+المفتاح hash ثابت لـ (الكون مرتب، الـ lookback، إعدادات العوامل، بصمة بيانات كل سهم
+في مخزن الأسعار، تاريخ اليوم، القيود). بصمة البيانات بتتغير مع أي تحديث للأسعار أو
+الإجراءات المؤسسية، فالنتيجة القديمة عمرها ما بترجع لبيانات اتغيرت.
+
+- طبقة في الذاكرة: LRU محدود (max_entries)
+- طبقة اختيارية على الديسك (EGX_MEMO_DIR): ملف pickle لكل مفتاح، بتخدم إعادة تشغيل العملية
+- لما المخزن يتحدث لسهم (PriceStore.add_listener)، العناصر اللي فيها السهم بتتشال
+  من الذاكرة فوراً
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+MEMO_DIR = os.environ.get("EGX_MEMO_DIR")
+MEMO_MAX_ENTRIES = 64
+MEMO_MAX_DISK_ENTRIES = 512
+
+
+def memo_key(*parts):
+    """
+    hash ثابت لأي مجموعة قيم قابلة للتحويل لـ JSON (الـ dicts بترتيب المفاتيح)
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class BuildMemo:
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES, disk_dir=MEMO_DIR, max_disk_entries=MEMO_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._watched = set()
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    # طبقة الديسك
+    # ------------------------------------------------------------------
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _load(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _dump(self, key, value):
+        if not self.disk_dir:
+            return
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self._path(key)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+        # نحتفظ بأحدث max_disk_entries ملف بس
+        files = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith(".pkl")]
+        if len(files) > self.max_disk_entries:
+            files.sort(key=os.path.getmtime)
+            for old in files[:len(files) - self.max_disk_entries]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------
+    # الواجهة
+    # ------------------------------------------------------------------
+    def get(self, key):
+        """
+        القيمة المخزنة للمفتاح أو None (الذاكرة الأول، بعدين الديسك)
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+
+        value = self._load(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value[0], value[1])
+        return value[1]
+
+    def _remember(self, key, symbols, value):
+        self._items[key] = (frozenset(symbols), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def put(self, key, value, symbols=()):
+        """
+        symbols: رموز المخزن اللي النتيجة معتمدة عليها (للإلغاء لما أي منها يتحدث)
+        """
+        with self._lock:
+            self._remember(key, symbols, value)
+        self._dump(key, (frozenset(symbols), value))
+
+    def invalidate(self, symbol=None):
+        """
+        يشيل من الذاكرة العناصر المعتمدة على السهم (أو كل العناصر لو symbol=None).
+        ملفات الديسك مش محتاجة تتمسح: مفتاحها فيه بصمة البيانات القديمة فمش هتتطلب تاني.
+        """
+        with self._lock:
+            if symbol is None:
+                self._items.clear()
+                return
+            stale = [key for key, (symbols, _) in self._items.items() if symbol in symbols]
+            for key in stale:
+                del self._items[key]
+
+    def watch(self, store):
+        """
+        يسجل الـ memo عند مخزن أسعار عشان يتلغى لما المخزن يتحدث (مرة واحدة لكل مخزن)
+        """
+        with self._lock:
+            if id(store) in self._watched:
+                return
+            self._watched.add(id(store))
+        store.add_listener(self.invalidate)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+# memo افتراضي واحد لكل العملية
+_DEFAULT_MEMO = None
+_DEFAULT_MEMO_LOCK = threading.Lock()
+
+
+def get_default_memo():
+    global _DEFAULT_MEMO
+    with _DEFAULT_MEMO_LOCK:
+        if _DEFAULT_MEMO is None:
+            _DEFAULT_MEMO = BuildMemo()
+        return _DEFAULT_MEMO
@@ -0,0 +1,72 @@
+"""
+Circuit breaker لكل سهم على طلبات Yahoo.
+
+السهم اللي تحميله بيفشل (خطأ، رد فاضي، أو انتهاء الوقت) failure_threshold مرات
+متتالية بيتقفل (open) لمدة cooldown_seconds: الطلبات الجاية بتتخطاه فوراً بدل ما
+تستنى نفس الفشل تاني. بعد المدة بيتسمح بمحاولة واحدة (half-open): لو نجحت العداد
+بيتصفر، ولو فشلت بيتقفل تاني لنفس المدة.
+"""
+import threading
+import time
+
+FAILURE_THRESHOLD = 3
+COOLDOWN_SECONDS = 15 * 60
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, cooldown_seconds=COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._failures = {}
+        self._open_until = {}
+        self._lock = threading.Lock()
+
+    def allow(self, symbol):
+        """
+        False لو السهم مقفول ولسه المدة ما خلصتش
+        """
+        with self._lock:
+            until = self._open_until.get(symbol)
+            return until is None or time.monotonic() >= until
+
+    def record_success(self, symbol):
+        with self._lock:
+            self._failures.pop(symbol, None)
+            self._open_until.pop(symbol, None)
+
+    def record_failure(self, symbol):
+        with self._lock:
+            count = self._failures.get(symbol, 0) + 1
+            self._failures[symbol] = count
+            if count >= self.failure_threshold:
+                self._open_until[symbol] = time.monotonic() + self.cooldown_seconds
+
+    def open_symbols(self):
+        """
+        الأسهم المقفولة حالياً
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [sym for sym, until in self._open_until.items() if now < until]
+
+    def reset(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._failures.clear()
+                self._open_until.clear()
+            else:
+                self._failures.pop(symbol, None)
+                self._open_until.pop(symbol, None)
+
+
+# breaker افتراضي واحد لكل العملية (مشترك بين كل الـ builders زي مخزن الأسعار)
+_DEFAULT_BREAKER = None
+_DEFAULT_BREAKER_LOCK = threading.Lock()
+
+
+def get_default_breaker():
+    global _DEFAULT_BREAKER
+    with _DEFAULT_BREAKER_LOCK:
+        if _DEFAULT_BREAKER is None:
+            _DEFAULT_BREAKER = CircuitBreaker()
+        return _DEFAULT_BREAKER
@@ -0,0 +1,232 @@
+"""
+Client لخدمة الحسابات المنفصلة (compute_worker.py).
+
+صفحات Streamlit بتبقى thin clients: الحسابات التقيلة (العوامل، التخصيص، الـ backtest،
+المخاطر) بتتنفذ في عمليات worker منفصلة بدل threads الـ Streamlit.
+التفعيل: EGX_COMPUTE_URL=http://127.0.0.1:8765
+"""
+import json
+import math
+import os
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from egx_yahoo import EGXYahoo
+from factor_snapshot import to_arrow
+
+COMPUTE_URL = os.environ.get("EGX_COMPUTE_URL")
+
+
+# ----------------------------------------------------------------------
+# تحويل الجداول من/إلى JSON (مشترك بين الـ client والـ worker)
+# ----------------------------------------------------------------------
+def _json_value(v):
+    if isinstance(v, (np.integer,)):
+        return int(v)
+    if isinstance(v, (np.floating, float)):
+        v = float(v)
+        return None if math.isnan(v) or math.isinf(v) else v
+    if isinstance(v, np.bool_):
+        return bool(v)
+    if isinstance(v, (pd.Timestamp,)):
+        return v.isoformat()
+    return v
+
+
+def frame_to_json(df):
+    """
+    DataFrame → dict (columns, index, data) بقيم JSON عادية (NaN → null)
+    """
+    if df is None:
+        return None
+    index = df.index
+    return {
+        "columns": [str(c) for c in df.columns],
+        "index": [_json_value(i) for i in index],
+        "index_is_date": isinstance(index, pd.DatetimeIndex),
+        "data": [[_json_value(v) for v in row] for row in df.itertuples(index=False, name=None)],
+    }
+
+
+def frame_from_json(obj):
+    if obj is None:
+        return None
+    index = obj["index"]
+    if obj.get("index_is_date"):
+        index = pd.DatetimeIndex(index)
+    df = pd.DataFrame(obj["data"], columns=obj["columns"], index=index)
+    # null في أعمدة رقمية → NaN
+    return df.infer_objects()
+
+
+class ComputeClient:
+    def __init__(self, base_url=None, timeout=300):
+        self.base_url = (base_url or COMPUTE_URL or "http://127.0.0.1:8765").rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        req = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            headers={"Content-Type": "application/json"},
+            method="GET" if payload is None else "POST",
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                body = json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            try:
+                body = json.loads(e.read().decode("utf-8"))
+            except ValueError:
+                raise ValueError(f"خطأ من خدمة الحسابات ({e.code})")
+        except urllib.error.URLError as e:
+            raise ValueError(f"تعذر الاتصال بخدمة الحسابات {self.base_url}: {e.reason}")
+
+        if "error" in body:
+            raise ValueError(body["error"])
+        return body
+
+    def health(self):
+        return self._request("/health")
+
+    def score(self, universe, lookback_days=180, normalization="minmax", weights=None, deadline_seconds=None):
+        """
+        جدول العوامل المتقيّم (score_factors) للكون
+        """
+        body = self._request("/score", {
+            "universe": list(universe),
+            "lookback_days": int(lookback_days),
+            "normalization": normalization,
+            "weights": weights,
+            "deadline_seconds": deadline_seconds,
+        })
+        return frame_from_json(body["factors"])
+
+    def allocate(self, universe, capital, lookback_days=180, normalization="minmax", weights=None,
+                 max_stocks=12, max_weight_per_stock=0.2, max_adv_fraction=None,
+                 sector_caps=None, exposure_caps=None, use_snapshot=False, costs=None, deadline_seconds=None):
+        """
+        costs: إعدادات نموذج التكاليف (CostModel.key()) أو None = بدون تكاليف
+        يرجّع (pf_df, cash_left, factor_df, returns, info) – returns عوائد أسهم المحفظة اليومية،
+        info فيه stale_symbols / dropped_symbols (الأسهم اللي اتأثرت بالـ deadline)
+        """
+        body = self._request("/allocate", {
+            "universe": list(universe),
+            "capital": float(capital),
+            "lookback_days": int(lookback_days),
+            "normalization": normalization,
+            "weights": weights,
+            "max_stocks": int(max_stocks),
+            "max_weight_per_stock": float(max_weight_per_stock),
+            "max_adv_fraction": max_adv_fraction,
+            "sector_caps": sector_caps,
+            "exposure_caps": exposure_caps,
+            "use_snapshot": bool(use_snapshot),
+            "costs": costs,
+            "deadline_seconds": deadline_seconds,
+        })
+        return (
+            frame_from_json(body["portfolio"]),
+            float(body["cash_left"]),
+            frame_from_json(body["factors"]),
+            frame_from_json(body["returns"]),
+            {
+                "stale_symbols": body.get("stale_symbols", []),
+                "dropped_symbols": body.get("dropped_symbols", []),
+            },
+        )
+
+    def backtest(self, universe, lookback_days=180, normalization="minmax", weights=None,
+                 capital=100000.0, rebalance_days=21, max_stocks=8, max_weight_per_stock=0.2, costs=None):
+        body = self._request("/backtest", {
+            "universe": list(universe),
+            "lookback_days": int(lookback_days),
+            "normalization": normalization,
+            "weights": weights,
+            "capital": float(capital),
+            "rebalance_days": int(rebalance_days),
+            "max_stocks": int(max_stocks),
+            "max_weight_per_stock": float(max_weight_per_stock),
+            "costs": costs,
+        })
+        equity = frame_from_json(body["equity"])
+        return {
+            "equity": equity["equity"],
+            "returns": equity["returns"],
+            "weights": frame_from_json(body["weights"]),
+            "stats": body["stats"],
+        }
+
+    def risk(self, weights, lookback_days=180, portfolio_value=None, alpha=0.95):
+        """
+        weights: dict {symbol: weight}. يرجّع (summary, contributions) زي PortfolioRiskAnalyzer.report
+        """
+        body = self._request("/risk", {
+            "weights": {str(k): float(v) for k, v in dict(weights).items()},
+            "lookback_days": int(lookback_days),
+            "portfolio_value": portfolio_value,
+            "alpha": float(alpha),
+        })
+        return body["summary"], frame_from_json(body["contributions"])
+
+
+class RemoteBuilder:
+    """
+    نفس الجزء من واجهة AIPortfolioBuilderV2 اللي صفحة V2 بتستخدمه،
+    لكن الحساب نفسه بيتنفذ في خدمة الحسابات.
+    """
+
+    def __init__(self, universe, lookback_days=180, normalization="minmax", factor_weights=None,
+                 client=None, auto_suffix=True, store=None, cost_model=None, deadline_seconds=None):
+        self.universe = list(universe)
+        self.lookback_days = lookback_days
+        self.normalization = normalization
+        self.factor_weights = factor_weights
+        self.cost_model = cost_model
+        self.deadline_seconds = deadline_seconds
+        self.client = client or ComputeClient()
+        # أسعار آخر إغلاق (لإعادة التوازن) من المخزن المحلي
+        self.egx = EGXYahoo(self.universe, auto_suffix=auto_suffix, verbose=False, store=store)
+
+        self.last_factor_df = None
+        self.last_factor_table = None
+        self.last_returns = None
+        self.last_stale_symbols = []
+        self.last_dropped_symbols = []
+
+    def build_portfolio(self, capital, max_stocks=12, max_weight_per_stock=0.2, factor_snapshot=None,
+                        max_adv_fraction=None, sector_caps=None, exposure_caps=None):
+        """
+        factor_snapshot: لو موجود، الـ worker بيستخدم آخر snapshot عنده بدل الحساب المباشر
+        """
+        pf_df, cash_left, factor_df, returns, info = self.client.allocate(
+            self.universe,
+            capital,
+            lookback_days=self.lookback_days,
+            normalization=self.normalization,
+            weights=self.factor_weights,
+            max_stocks=max_stocks,
+            max_weight_per_stock=max_weight_per_stock,
+            max_adv_fraction=max_adv_fraction,
+            sector_caps=sector_caps,
+            exposure_caps=exposure_caps,
+            use_snapshot=factor_snapshot is not None,
+            costs=self.cost_model.key() if self.cost_model is not None else None,
+            deadline_seconds=self.deadline_seconds,
+        )
+        self.last_factor_df = factor_df
+        self.last_stale_symbols = info["stale_symbols"]
+        self.last_dropped_symbols = info["dropped_symbols"]
+        self.last_factor_table = to_arrow(factor_df)
+        self.last_returns = returns
+        return pf_df, cash_left
+
+    def get_returns_panel(self, symbols):
+        symbols = list(symbols)
+        if self.last_returns is None or any(sym not in self.last_returns.columns for sym in symbols):
+            raise ValueError("عوائد الأسهم غير متاحة من خدمة الحسابات.")
+        return self.last_returns[symbols]
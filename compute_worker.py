@@ -0,0 +1,363 @@
+"""
+خدمة حسابات محلية منفصلة عن Streamlit (stdlib HTTP + process pool).
+
+- كل worker عملية (process) مستقلة فيها مخزن أسعار دافي (warm) محمّل عند البدء،
+  فالحساب التقيل ما بيتنافسش مع رسم الواجهة على الـ GIL
+- طلبات score/allocate اللي بتوصل في نفس نافذة قصيرة (batch_window) وبنفس
+  الإعدادات بتتجمع: جدول العوامل الخام بيتحسب مرة واحدة لاتحاد الأكوان،
+  وكل طلب بيتفلتر ويتطبّع على الكون بتاعه
+- ممكن تشغيل أكتر من خدمة (بورت مختلف) وراء نفس الواجهة
+
+التشغيل:
+    python compute_worker.py --port 8765 --workers 4
+
+Endpoints (JSON):
+    GET  /health
+    POST /score      {universe, lookback_days, normalization, weights, deadline_seconds}
+    POST /allocate   {universe, capital, lookback_days, normalization, weights, max_stocks,
+                      max_weight_per_stock, max_adv_fraction, sector_caps, exposure_caps, use_snapshot,
+                      costs, deadline_seconds}
+    POST /backtest   {universe, lookback_days, normalization, weights, capital, rebalance_days,
+                      max_stocks, max_weight_per_stock, costs}
+
+costs: إعدادات CostModel (CostModel.key()) أو null = بدون تكاليف
+    POST /risk       {weights: {symbol: w}, lookback_days, portfolio_value, alpha}
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from compute_client import frame_to_json
+
+DEFAULT_PORT = 8765
+BATCH_WINDOW_SECONDS = 0.05
+REQUEST_TIMEOUT_SECONDS = 600
+SNAPSHOT_MAX_AGE_DAYS = 4
+
+BATCHED_ENDPOINTS = ("score", "allocate")
+
+
+# ----------------------------------------------------------------------
+# داخل عملية الـ worker
+# ----------------------------------------------------------------------
+_BUILDERS = {}
+
+
+def _init_worker(warm_symbols):
+    """
+    تحميل أسعار الكون الافتراضي في مخزن العملية مرة واحدة عند بدء الـ worker
+    """
+    from egx_yahoo import EGXYahoo
+
+    if warm_symbols:
+        EGXYahoo(list(warm_symbols), verbose=False).prefetch()
+
+
+def _builder(universe, lookback_days, normalization, weights, costs=None, deadline_seconds=None):
+    """
+    builder لكل (كون، إعدادات) داخل الـ worker – كلهم على نفس المخزن الدافي
+    """
+    from ai_portfolio_builder_v2 import AIPortfolioBuilderV2
+    from factor_registry import FactorConfig
+    from transaction_costs import CostModel
+
+    key = (
+        tuple(universe), int(lookback_days), normalization, json.dumps(weights, sort_keys=True),
+        json.dumps(costs, sort_keys=True), deadline_seconds,
+    )
+    builder = _BUILDERS.get(key)
+    if builder is None:
+        builder = AIPortfolioBuilderV2(
+            universe,
+            lookback_days=lookback_days,
+            verbose=False,
+            normalization=normalization,
+            factor_config=FactorConfig(weights) if weights else None,
+            cost_model=CostModel(**costs) if costs is not None else None,
+            deadline_seconds=deadline_seconds,
+        )
+        _BUILDERS[key] = builder
+    return builder
+
+
+def _factor_table(key, payloads):
+    """
+    جدول العوامل الخام لاتحاد أكوان الطلبات (أو آخر snapshot لو مطلوب ومتاح)
+    """
+    lookback_days, normalization, weights, use_snapshot, deadline_seconds = key
+    if use_snapshot:
+        from factor_snapshot import load_latest_snapshot
+
+        snapshot = load_latest_snapshot(
+            lookback_days=lookback_days, max_age_days=SNAPSHOT_MAX_AGE_DAYS, as_arrow=True
+        )
+        if snapshot is not None:
+            return snapshot[0], None
+
+    union = []
+    for payload in payloads:
+        for sym in payload["universe"]:
+            if sym not in union:
+                union.append(sym)
+
+    base = _builder(union, lookback_days, normalization, weights, deadline_seconds=deadline_seconds)
+    if deadline_seconds is None:
+        base.egx.prefetch(union)
+    return base.compute_factor_table(), base
+
+
+def run_batch(kind, key, payloads):
+    """
+    ينفذ مجموعة طلبات score/allocate بنفس الإعدادات. يرجّع نتيجة لكل طلب بنفس الترتيب.
+    """
+    lookback_days, normalization, weights, _, _ = key
+    try:
+        table, base = _factor_table(key, payloads)
+    except Exception as e:
+        return [{"error": str(e)}] * len(payloads)
+
+    # الأسهم اللي اتحسبت من بيانات قديمة / اتشالت بسبب الـ deadline في الحساب المجمع
+    stale = base.last_stale_symbols if base is not None else []
+    dropped = base.last_dropped_symbols if base is not None else []
+
+    results = []
+    for payload in payloads:
+        builder = _builder(payload["universe"], lookback_days, normalization, weights, payload.get("costs"))
+        try:
+            if kind == "score":
+                factor_df = builder._factor_table_from_snapshot(table)
+                if "quarantined" in factor_df.columns:
+                    factor_df = factor_df[~factor_df["quarantined"].astype(bool)]
+                scored = builder.score_factors(factor_df).reset_index(drop=True)
+                results.append({"factors": frame_to_json(scored)})
+                continue
+
+            pf_df, cash_left = builder.build_portfolio(
+                capital=payload["capital"],
+                max_stocks=payload.get("max_stocks", 12),
+                max_weight_per_stock=payload.get("max_weight_per_stock", 0.2),
+                factor_snapshot=table,
+                max_adv_fraction=payload.get("max_adv_fraction"),
+                sector_caps=payload.get("sector_caps"),
+                exposure_caps=payload.get("exposure_caps"),
+            )
+            source = base if base is not None else builder
+            returns = source.get_returns_panel(pf_df["symbol"].tolist())
+            universe = set(payload["universe"])
+            results.append({
+                "portfolio": frame_to_json(pf_df),
+                "cash_left": float(cash_left),
+                "factors": frame_to_json(builder.last_factor_df),
+                "returns": frame_to_json(returns),
+                "stale_symbols": [sym for sym in stale if sym in universe],
+                "dropped_symbols": [sym for sym in dropped if sym in universe],
+            })
+        except Exception as e:
+            results.append({"error": str(e)})
+    return results
+
+
+def run_backtest(payload):
+    from portfolio_backtest import PortfolioBacktester
+
+    builder = _builder(
+        payload["universe"], payload.get("lookback_days", 180),
+        payload.get("normalization", "minmax"), payload.get("weights"), payload.get("costs"),
+    )
+    result = PortfolioBacktester(
+        builder,
+        rebalance_days=payload.get("rebalance_days", 21),
+        max_stocks=payload.get("max_stocks", 8),
+        max_weight_per_stock=payload.get("max_weight_per_stock", 0.2),
+        cost_model=builder.cost_model,
+    ).run(capital=payload.get("capital", 100000.0))
+
+    equity = result["equity"].to_frame("equity")
+    equity["returns"] = result["returns"]
+    return {
+        "equity": frame_to_json(equity),
+        "weights": frame_to_json(result["weights"]),
+        "stats": result["stats"],
+    }
+
+
+def run_risk(payload):
+    import pandas as pd
+
+    from portfolio_risk import PortfolioRiskAnalyzer
+
+    weights = pd.Series(payload["weights"], dtype=float)
+    builder = _builder(list(weights.index), payload.get("lookback_days", 180), "minmax", None)
+    returns = builder.get_returns_panel(list(weights.index))
+    analyzer = PortfolioRiskAnalyzer(weights, returns, portfolio_value=payload.get("portfolio_value"))
+    summary, contributions = analyzer.report(alpha=payload.get("alpha", 0.95))
+    return {"summary": summary, "contributions": frame_to_json(contributions)}
+
+
+# ----------------------------------------------------------------------
+# داخل عملية الخدمة (HTTP)
+# ----------------------------------------------------------------------
+class _Batcher:
+    """
+    يجمع الطلبات بنفس (النوع، الإعدادات) خلال batch_window ثانية ويبعتها للـ pool كمهمة واحدة
+    """
+
+    def __init__(self, pool, batch_window):
+        self.pool = pool
+        self.batch_window = batch_window
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, payload):
+        key = (
+            int(payload.get("lookback_days", 180)),
+            payload.get("normalization", "minmax"),
+            payload.get("weights"),
+            bool(payload.get("use_snapshot", False)),
+            payload.get("deadline_seconds"),
+        )
+        group = (kind, json.dumps(key, sort_keys=True))
+        future = Future()
+        with self._lock:
+            pending = self._pending.get(group)
+            if pending is None:
+                pending = self._pending[group] = (key, [])
+                threading.Timer(self.batch_window, self._flush, args=(kind, group)).start()
+            pending[1].append((payload, future))
+        return future
+
+    def _flush(self, kind, group):
+        with self._lock:
+            key, items = self._pending.pop(group)
+
+        payloads = [payload for payload, _ in items]
+        job = self.pool.submit(run_batch, kind, key, payloads)
+
+        def _done(job):
+            try:
+                results = job.result()
+            except Exception as e:
+                results = [{"error": str(e)}] * len(items)
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
+
+        job.add_done_callback(_done)
+
+
+class ComputeService:
+    def __init__(self, workers=None, warm_symbols=None, batch_window=BATCH_WINDOW_SECONDS):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(list(warm_symbols or []),),
+        )
+        self.batcher = _Batcher(self.pool, batch_window)
+        self.started_at = time.time()
+
+    def handle(self, endpoint, payload):
+        if endpoint in BATCHED_ENDPOINTS:
+            future = self.batcher.submit(endpoint, payload)
+        elif endpoint == "backtest":
+            future = self.pool.submit(run_backtest, payload)
+        elif endpoint == "risk":
+            future = self.pool.submit(run_risk, payload)
+        else:
+            raise KeyError(endpoint)
+        return future.result(timeout=REQUEST_TIMEOUT_SECONDS)
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def _make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/health":
+                self._send(200, {
+                    "status": "ok",
+                    "workers": service.workers,
+                    "uptime_seconds": round(time.time() - service.started_at, 1),
+                })
+            else:
+                self._send(404, {"error": f"endpoint غير معروف: {self.path}"})
+
+        def do_POST(self):
+            endpoint = self.path.strip("/")
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send(400, {"error": "طلب JSON غير صالح"})
+                return
+
+            try:
+                result = service.handle(endpoint, payload)
+            except KeyError:
+                self._send(404, {"error": f"endpoint غير معروف: {self.path}"})
+                return
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+                return
+
+            self._send(400 if "error" in result else 200, result)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=None, warm_symbols=None,
+          batch_window=BATCH_WINDOW_SECONDS):
+    """
+    يبدأ الخدمة ويرجّع (server, service). server.serve_forever() بيشغّلها.
+    """
+    service = ComputeService(workers=workers, warm_symbols=warm_symbols, batch_window=batch_window)
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    server.daemon_threads = True
+    return server, service
+
+
+def main():
+    from egx_universe import DEFAULT_UNIVERSE
+
+    parser = argparse.ArgumentParser(description="EGX portfolio compute worker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW_SECONDS)
+    parser.add_argument("--no-warm", action="store_true", help="لا تحمّل الكون الافتراضي عند البدء")
+    args = parser.parse_args()
+
+    server, service = serve(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        warm_symbols=None if args.no_warm else DEFAULT_UNIVERSE,
+        batch_window=args.batch_window,
+    )
+    print(f"✅ compute worker on http://{args.host}:{args.port} ({service.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
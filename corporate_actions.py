@@ -0,0 +1,148 @@
+"""
+الإجراءات المؤسسية (توزيعات نقدية، تجزئة، أسهم مجانية) ومعاملات التعديل.
+
+المخزن بيحتفظ بالأسعار الخام + جدول إجراءات لكل سهم، ومن الاتنين بنحسب
+سلسلة معامل تعديل (adjustment factor) مرة واحدة وبنخزنها.
+السعر المعدّل = السعر الخام × المعامل (ضرب vectorized واحد لكل الأعمدة).
+
+- split: نسبة الأسهم الجديدة للقديمة (تجزئة 2:1 = 2.0، سهم مجاني لكل 4 = 1.25)
+- dividend: التوزيع النقدي للسهم بتاريخ الاستحقاق (ex-date)
+
+Yahoo أحياناً بيرجّع Close معدّل للتجزئة بالفعل، وأحياناً (كتير في EGX) الإجراء
+مش مسجل خالص. عشان كده:
+- تجزئة مسجلة بنطبقها بس لو القفزة في السعر الخام يوم الحدث متسقة مع النسبة
+  (يعني السعر لسه مش معدّل) – وده بيمنع التعديل مرتين
+- هبوط يومي أكبر من MIN_INFERRED_SPLIT (خارج حدود التذبذب اليومية في EGX)
+  بيتعامل كتجزئة غير مسجلة بنسبة القفزة نفسها
+"""
+import numpy as np
+import pandas as pd
+
+# أعمدة yfinance (actions=True) → أسماء الأعمدة في جدول الإجراءات
+ACTION_COLUMNS = {"Dividends": "dividend", "Stock Splits": "split"}
+
+# أقل نسبة سعر أمس / سعر اليوم تعتبر تجزئة غير مسجلة (هبوط ≥ 33%)
+MIN_INFERRED_SPLIT = 1.5
+
+PRICE_COLUMNS = ("Open", "High", "Low", "Close")
+
+
+def empty_actions():
+    return pd.DataFrame(
+        {"dividend": pd.Series(dtype=float), "split": pd.Series(dtype=float)},
+        index=pd.DatetimeIndex([], name="Date"),
+    )
+
+
+def extract_actions(frame):
+    """
+    جدول الإجراءات (الصفوف اللي فيها إجراء فعلاً) من إطار سهم واحد من yf.download
+    """
+    cols = [c for c in ACTION_COLUMNS if c in frame.columns]
+    if not cols:
+        return empty_actions()
+
+    actions = frame[cols].rename(columns=ACTION_COLUMNS).astype(float).fillna(0.0)
+    actions = actions.reindex(columns=["dividend", "split"], fill_value=0.0)
+    actions = actions[(actions["dividend"] != 0) | (actions["split"] != 0)]
+    actions.index = pd.DatetimeIndex(actions.index, name="Date")
+    actions.columns.name = None
+    return actions.sort_index()
+
+
+def merge_actions(old, new):
+    """
+    يدمج إجراءات جديدة مع المخزنة. يرجّع (الجدول المدموج, فيه إجراء جديد؟)
+    """
+    if old is None or old.empty:
+        return new.copy(), not new.empty
+    if new is None or new.empty:
+        return old, False
+
+    merged = new.combine_first(old).sort_index()
+    added = len(merged) != len(old) or not merged.loc[old.index].equals(old)
+    return merged, bool(added)
+
+
+def adjustment_factors(close, actions=None, infer_splits=True):
+    """
+    close: Series أسعار إغلاق خام
+    actions: جدول الإجراءات (dividend, split) أو None
+    يرجّع DataFrame بنفس index الأسعار فيه:
+    - price: معامل تعديل الأسعار (تجزئة + توزيعات)
+    - volume: معامل تعديل الحجم (تجزئة فقط، مقلوب معامل السعر)
+    آخر يوم معامله 1 دايماً، يعني السعر المعدّل بعملة آخر سعر.
+    """
+    values = close.to_numpy(dtype=float)
+    n = len(values)
+    split_mult = np.ones(n)
+    div_mult = np.ones(n)
+    if n < 2:
+        return pd.DataFrame({"price": split_mult, "volume": split_mult}, index=close.index)
+
+    prev = np.empty(n)
+    prev[0] = np.nan
+    prev[1:] = values[:-1]
+    # القفزة بتتحسب بين سعرين موجبين بس: سعر صفر/سالب خطأ بيانات (data_quality بتصلحه)
+    # ولو اتقسم عليه القفزة بتبقى inf وكل اللي قبله معامله 0
+    valid = np.isfinite(prev) & np.isfinite(values) & (prev > 0) & (values > 0)
+    jump = np.full(n, np.nan)
+    jump[valid] = prev[valid] / values[valid]
+
+    if actions is not None and not actions.empty:
+        # حدث في يوم مش يوم تداول → أول جلسة بعده
+        pos = close.index.searchsorted(actions.index)
+        inside = pos < n
+        pos = pos[inside]
+        splits = actions["split"].to_numpy(dtype=float)[inside]
+        divs = actions["dividend"].to_numpy(dtype=float)[inside]
+
+        # تجزئة مسجلة: نطبقها لو القفزة أقرب للنسبة منها لـ 1
+        has_split = (splits > 0) & (splits != 1.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            obs = np.log(jump[pos])
+        unadjusted = has_split & (np.abs(obs - np.log(np.where(has_split, splits, 1.0))) < np.abs(obs))
+        np.multiply.at(split_mult, pos[unadjusted], 1.0 / splits[unadjusted])
+
+        has_div = (divs > 0) & (prev[pos] > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            np.multiply.at(div_mult, pos[has_div], 1.0 - divs[has_div] / prev[pos[has_div]])
+
+    if infer_splits:
+        # قفزة شمعة واحدة بترجع فوراً (خطأ بيانات) مش تجزئة – دي بتتعامل في data_quality
+        reverted = np.zeros(n, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            reverted[1:] |= jump[:-1] <= 1.0 / MIN_INFERRED_SPLIT
+            reverted[:-1] |= jump[1:] <= 1.0 / MIN_INFERRED_SPLIT
+            inferred = (jump >= MIN_INFERRED_SPLIT) & (split_mult == 1.0) & ~reverted
+        split_mult[inferred] = 1.0 / jump[inferred]
+
+    # المعامل في يوم t = حاصل ضرب كل الأحداث اللي بعده
+    def _after(mult):
+        rev = np.cumprod(mult[::-1])[::-1]
+        return np.append(rev[1:], 1.0)
+
+    split_factor = _after(split_mult)
+    return pd.DataFrame(
+        {"price": split_factor * _after(div_mult), "volume": 1.0 / split_factor},
+        index=close.index,
+    )
+
+
+def apply_factors(frame, factors):
+    """
+    نسخة معدّلة من إطار OHLCV: الأسعار × معامل السعر والحجم × معامل الحجم
+    (الأنواع المضغوطة بتفضل زي ما هي)
+    """
+    out = frame.copy()
+    cols = [c for c in PRICE_COLUMNS if c in frame.columns]
+    price = factors["price"].to_numpy()
+
+    adjusted = frame[cols].to_numpy(dtype=float) * price[:, None]
+    for i, col in enumerate(cols):
+        out[col] = adjusted[:, i].astype(frame[col].dtype)
+    if "Volume" in frame.columns:
+        out["Volume"] = (frame["Volume"].to_numpy(dtype=float) * factors["volume"].to_numpy()).astype(
+            frame["Volume"].dtype
+        )
+    return out
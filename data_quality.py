@@ -0,0 +1,129 @@
+"""
+مرحلة فحص جودة البيانات قبل حساب العوامل.
+
+بتشتغل على مصفوفة الإغلاق المتراصة (dates x symbols) كلها مرة واحدة (vectorized)
+بدون loop على الأسهم، وبتكشف:
+- nonpositive: أسعار صفر أو سالبة
+- stale: نفس سعر الإغلاق متكرر STALE_RUN جلسة متتالية أو أكتر
+- glitch: قفزة واحدة بعدها رجوع فوري (زي خطأ العلامة العشرية 10×)
+- spike: قفزة أكبر من SPIKE_SIGMA × التذبذب المعتاد للسهم (MAD) بدون رجوع
+- gap: فجوة تقويمية أكبر من MAX_GAP_DAYS بين شمعتين صالحتين
+
+السياسات (policy):
+- "flag"       : تقرير فقط، البيانات زي ما هي
+- "repair"     : الشموع السيئة (nonpositive/stale/glitch) بتتحول NaN وتتعامل كفجوة
+- "quarantine" : زي repair + استبعاد الأسهم اللي quality_score بتاعها أقل من min_quality
+
+القفزات بدون رجوع والفجوات بتتسجل بس (ممكن تكون حدث حقيقي أو إيقاف تداول).
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+QUALITY_POLICIES = ("flag", "repair", "quarantine")
+
+SPIKE_SIGMA = 8.0
+# أقل قفزة (log) تعتبر spike حتى لو السهم هادي جداً (~25%)
+MIN_SPIKE_LOG_MOVE = np.log(1.25)
+STALE_RUN = 5
+MAX_GAP_DAYS = 10
+MIN_QUALITY = 0.9
+
+
+def _run_lengths(flags):
+    """
+    لكل خلية True: طول السلسلة المتصلة اللي هي جزء منها (على محور التواريخ)
+    """
+    c = np.cumsum(flags, axis=0)
+    forward = c - np.maximum.accumulate(np.where(~flags, c, 0), axis=0)
+
+    rev = flags[::-1]
+    cr = np.cumsum(rev, axis=0)
+    backward = (cr - np.maximum.accumulate(np.where(~rev, cr, 0), axis=0))[::-1]
+    return np.where(flags, forward + backward - 1, 0)
+
+
+def validate_panel(close, policy="repair", spike_sigma=SPIKE_SIGMA, stale_run=STALE_RUN,
+                   max_gap_days=MAX_GAP_DAYS, min_quality=MIN_QUALITY):
+    """
+    close: DataFrame أسعار إغلاق (dates x symbols) فيه NaN للأيام الناقصة
+    يرجّع (clean_close, report):
+    - clean_close: المصفوفة بعد تطبيق السياسة (الأسهم المستبعدة مش موجودة فيها)
+    - report: DataFrame لكل سهم (index=symbol) فيه عدد كل مشكلة و quality_score و quarantined
+    """
+    if policy not in QUALITY_POLICIES:
+        raise ValueError(f"سياسة جودة بيانات غير معروفة: {policy}")
+
+    close = close.sort_index()
+    values = close.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+
+    # 1) أسعار صفر أو سالبة
+    nonpositive = valid & (values <= 0)
+    usable = valid & ~nonpositive
+    clean = np.where(usable, values, np.nan)
+
+    # السعر الصالح السابق لكل خلية (عبر الفجوات)
+    prev = pd.DataFrame(clean).ffill().shift(1).to_numpy()
+
+    # 2) تكرار نفس الإغلاق (أول شمعة في السلسلة سعر حقيقي، الباقي مكرر)
+    repeat = usable & (clean == prev)
+    stale = repeat & (_run_lengths(repeat) >= stale_run - 1)
+
+    # 3) القفزات: log return مقارنة بتذبذب السهم المعتاد (MAD)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lr = np.log(clean / prev)
+    with warnings.catch_warnings():
+        # سهم بدون أي عائد صالح → median = NaN (والـ threshold بيرجع للحد الأدنى)
+        warnings.simplefilter("ignore", RuntimeWarning)
+        med = np.nanmedian(lr, axis=0)
+        mad = np.nanmedian(np.abs(lr - med), axis=0)
+    threshold = np.maximum(spike_sigma * 1.4826 * np.nan_to_num(mad), MIN_SPIKE_LOG_MOVE)
+    with np.errstate(invalid="ignore"):
+        big = np.abs(lr) > threshold
+
+    # glitch: قفزة ورجوع في الشمعة اللي بعدها بعكس الإشارة
+    next_lr = np.full_like(lr, np.nan)
+    next_lr[:-1] = lr[1:]
+    with np.errstate(invalid="ignore"):
+        reverts = (np.abs(next_lr) > threshold) & (np.sign(next_lr) == -np.sign(lr))
+    glitch = big & reverts
+    spike = big & ~glitch
+    # الشمعة اللي بعد الـ glitch قفزتها مجرد الرجوع، مش spike مستقل
+    spike[1:] &= ~glitch[:-1]
+
+    # 4) فجوات تقويمية بين شموع صالحة
+    dates = close.index.values.astype("datetime64[D]").astype(float)
+    last_date = pd.DataFrame(np.where(usable, dates[:, None], np.nan)).ffill().shift(1).to_numpy()
+    gap = usable & ((dates[:, None] - last_date) > max_gap_days)
+
+    bad = nonpositive | stale | glitch | spike | gap
+    n_bars = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        score = np.where(n_bars > 0, 1.0 - bad.sum(axis=0) / np.maximum(n_bars, 1), 0.0)
+
+    report = pd.DataFrame({
+        "n_bars": n_bars,
+        "nonpositive": nonpositive.sum(axis=0),
+        "stale": stale.sum(axis=0),
+        "glitches": glitch.sum(axis=0),
+        "spikes": spike.sum(axis=0),
+        "gaps": gap.sum(axis=0),
+        "quality_score": score,
+    }, index=pd.Index(close.columns, name="symbol"))
+
+    if policy == "flag":
+        report["quarantined"] = False
+        return close, report
+
+    repaired = np.where(nonpositive | stale | glitch, np.nan, values)
+    clean_close = pd.DataFrame(repaired, index=close.index, columns=close.columns)
+
+    remaining = (~np.isnan(repaired)).sum(axis=0)
+    quarantined = remaining < 2
+    if policy == "quarantine":
+        quarantined = quarantined | (score < min_quality)
+    report["quarantined"] = quarantined
+
+    return clean_close.loc[:, ~quarantined], report
@@ -1,21 +1,13 @@
 import streamlit as st
 import pandas as pd
-from ai_portfolio_builder import AIPortfolioBuilder
+from ai_portfolio_builder import AIPortfolioBuilder, EqualWeightBuilder
+from egx_universe import DEFAULT_UNIVERSE
 
 st.set_page_config(page_title="EGX AI Portfolio", layout="wide")
 
 st.title("🤖📈 EGX AI Portfolio Builder")
 st.markdown("كوّن محفظة استثمارية في البورصة المصرية باستخدام الذكاء الاصطناعي.")
 
-# ---------------------------------------------------------
-# الكون الافتراضي لأسهم البورصة المصرية
-# ---------------------------------------------------------
-DEFAULT_UNIVERSE = [
-    "COMI", "ETEL", "EKHO", "AMOC", "CIEB", "SWDY",
-    "ORHD", "ESRS", "FWRY", "HRHO", "EFIH", "ADIB",
-    "DICE", "CCAP", "ABUK"
-]
-
 # ---------------------------------------------------------
 # SIDEBAR
 # ---------------------------------------------------------
@@ -78,42 +70,14 @@ if build_button:
                 # ---------------------------------------------------------
                 if mode.startswith("بسيط"):
 
-                    builder = AIPortfolioBuilder(
+                    builder = EqualWeightBuilder(
                         universe=selected_universe,
                         lookback_days=lookback_days,
                         auto_suffix=True,
                         verbose=False
                     )
 
-                    equal_weight = 1.0 / len(selected_universe)
-                    rows = []
-
-                    for sym in selected_universe:
-                        price = builder.egx.get_last_price(sym)
-                        if price is None:
-                            continue
-
-                        alloc = capital * equal_weight
-                        shares = int(alloc // price)
-                        mv = shares * price
-
-                        rows.append({
-                            "symbol": sym,
-                            "weight_target": equal_weight,
-                            "last_price": price,
-                            "shares": shares,
-                            "market_value": mv
-                        })
-
-                    df = pd.DataFrame(rows)
-                    total_mv = df["market_value"].sum()
-
-                    if total_mv > 0:
-                        df["weight_real"] = df["market_value"] / total_mv
-                    else:
-                        df["weight_real"] = 0.0
-
-                    cash_left = capital - total_mv
+                    df, cash_left = builder.build_portfolio(capital=capital)
 
                 # ---------------------------------------------------------
                 # 2) الذكاء الذكي = عائد / مخاطر تاريخية
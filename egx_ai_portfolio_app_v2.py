@@ -1,11 +1,17 @@
 import streamlit as st
 import pandas as pd
 from ai_portfolio_builder_v2 import AIPortfolioBuilderV2
-
-# ---------------------------------------------------------
-# إعداد صفحة التطبيق
-# ---------------------------------------------------------
-st.set_page_config(page_title="EGX AI Portfolio V2", layout="wide")
+from compute_client import COMPUTE_URL, RemoteBuilder
+from egx_universe import DEFAULT_UNIVERSE
+from factor_snapshot import column_names, load_latest_snapshot
+from portfolio_risk import PortfolioRiskAnalyzer
+from price_store import get_default_store
+from quote_service import PortfolioRevaluer, QuoteService
+from rebalance_planner import RebalancePlanner, load_holdings
+from results_store import EXPORT_FORMATS, ResultsStore, export_frames
+from scenario_engine import ScenarioEngine
+from transaction_costs import CostModel
+from universe_screener import UniverseScreener
 
 # ---------------------------------------------------------
 # صفحة الدخول (Login)
@@ -49,176 +55,601 @@ def check_login():
 
     st.stop()
 
-# أول حاجة نتحقق من اللوجين
-check_login()
+# طرق تطبيع العوامل المتاحة في الواجهة
+NORMALIZATION_LABELS = {
+    "minmax": "Min-Max (افتراضي)",
+    "rank": "Rank / Percentile",
+    "zscore": "Winsorized Z-Score",
+}
+
+# أقصى عمر لـ snapshot العوامل (أيام) – يغطي إجازة نهاية الأسبوع
+SNAPSHOT_MAX_AGE_DAYS = 4
+
+# أقصى وقت لتحميل الأسعار في كل بناء (ثواني) – بعده بنكمل بآخر بيانات مخزنة
+BUILD_DEADLINE_SECONDS = 20
+
+# كل قد إيه بنسأل عن الأسعار اللحظية (ثواني)
+QUOTE_POLL_SECONDS = 60
 
 # ---------------------------------------------------------
-# لو وصلنا هنا يبقى الدخول صحيح – نعرض المنصة V2
+# سياق البيانات/الحسابات المشترك
 # ---------------------------------------------------------
+@st.cache_resource
+def get_data_context():
+    """
+    سياق مشترك على مستوى العملية (process) بيتبني مرة واحدة:
+    مخزن الأسعار اللي كل الـ builders بتقرأ منه
+    """
+    return {"store": get_default_store(), "results": ResultsStore()}
+
+
+@st.cache_resource
+def get_quote_service():
+    """
+    خدمة أسعار لحظية واحدة على مستوى العملية (thread واحد في الخلفية مشترك بين
+    الجلسات). كل محفظة معروضة بتضيف أسهمها وهي بتشترك وبتشيلها لما تتبدل.
+    الخدمة ماسكة الـ revaluer بـ weak reference، فلما الجلسة تتقفل ويتمسح
+    session_state أسهمها بتقع من الـ polling الجاي.
+    """
+    service = QuoteService(interval_seconds=QUOTE_POLL_SECONDS)
+    service.start()
+    return service
+
+
+def start_live_revaluation(df, cash_left):
+    """
+    يربط المحفظة المعروضة بخدمة الأسعار اللحظية بدون إعادة تشغيل الـ builder
+    """
+    previous = st.session_state.get("v2_live")
+    if previous is not None:
+        previous["service"].unsubscribe(previous["revaluer"].update)
+
+    held = df[df["shares"] > 0]
+    revaluer = PortfolioRevaluer(held, cash=cash_left)
+    service = get_quote_service()
+    service.subscribe(revaluer.update, symbols=held["symbol"])
+    if service.latest:
+        revaluer.update(service.latest)
+
+    st.session_state.v2_live = {"service": service, "revaluer": revaluer}
+
+
+def render_live(live):
+    """
+    المحفظة الأخيرة بالأسعار اللحظية (بتتحدث في الخلفية، والعرض مع كل rerun)
+    """
+    revaluer = live["revaluer"]
+    summary = revaluer.summary()
+
+    st.subheader("⏱️ المحفظة بالأسعار اللحظية")
+    col_a, col_b, col_c = st.columns(3)
+    with col_a:
+        st.metric("قيمة الأسهم الآن", f"{summary['market_value']:,.2f} EGP")
+    with col_b:
+        st.metric(
+            "الربح/الخسارة",
+            f"{summary['pnl']:,.2f} EGP",
+            f"{summary['pnl_pct'] * 100:.2f}%"
+        )
+    with col_c:
+        st.metric("إجمالي (أسهم + كاش)", f"{summary['total_value']:,.2f} EGP")
+
+    st.dataframe(revaluer.frame(), use_container_width=True)
+
+    if summary["updated_at"] is None:
+        st.caption("لم تصل أسعار لحظية بعد – القيم بأسعار البناء.")
+    else:
+        st.caption(f"آخر تحديث: {pd.Timestamp(summary['updated_at'], unit='s'):%H:%M:%S} UTC")
+    st.button("🔄 تحديث العرض")
+
+
+def get_builder(universe, lookback_days, normalization="minmax"):
+    """
+    builder جاهز لكل جلسة (session) ولكل (universe, lookback_days, normalization).
+    بيتخزن في st.session_state عشان كل rerun يستخدم نفس الـ builder
+    بدل ما يتبني من الأول، وكلهم بيشاركوا نفس مخزن الأسعار.
+    لو EGX_COMPUTE_URL محدد، الحساب نفسه بيتنفذ في خدمة الحسابات (compute_worker.py).
+    """
+    if "v2_builders" not in st.session_state:
+        st.session_state.v2_builders = {}
+
+    key = (tuple(universe), int(lookback_days), normalization)
+    builder = st.session_state.v2_builders.get(key)
+    if builder is None and COMPUTE_URL:
+        builder = RemoteBuilder(
+            universe,
+            lookback_days=lookback_days,
+            normalization=normalization,
+            store=get_data_context()["store"],
+            cost_model=CostModel(),
+            deadline_seconds=BUILD_DEADLINE_SECONDS,
+        )
+        st.session_state.v2_builders[key] = builder
+    elif builder is None:
+        builder = AIPortfolioBuilderV2(
+            universe=universe,
+            lookback_days=lookback_days,
+            auto_suffix=True,
+            verbose=False,
+            store=get_data_context()["store"],
+            normalization=normalization,
+            cost_model=CostModel(),
+            deadline_seconds=BUILD_DEADLINE_SECONDS,
+        )
+        st.session_state.v2_builders[key] = builder
+
+    return builder
 
-st.title("📊 EGX AI Portfolio Builder V2")
-st.markdown(
-    "هذه النسخة المتقدمة تستخدم نموذج **متعدد العوامل**: "
-    "عائد/مخاطرة + أساسيات (Fundamentals) + زخم (Momentum)"
-)
-
-# الكون الافتراضي لأسهم البورصة المصرية
-DEFAULT_UNIVERSE = [
-    "COMI", "ETEL", "EKHO", "AMOC", "CIEB", "SWDY",
-    "ORHD", "ESRS", "FWRY", "HRHO", "EFIH", "ADIB",
-    "DICE", "CCAP", "ABUK"
-]
 
 # ---------------------------------------------------------
 # SIDEBAR
 # ---------------------------------------------------------
-st.sidebar.header("إعدادات المحفظة (V2)")
-
-capital = st.sidebar.number_input(
-    "المبلغ المستثمر (EGP)",
-    min_value=1000.0,
-    value=100000.0,
-    step=5000.0
-)
-
-selected_universe = st.sidebar.multiselect(
-    "اختر أسهم من البورصة المصرية:",
-    options=DEFAULT_UNIVERSE,
-    default=DEFAULT_UNIVERSE[:10]
-)
-
-lookback_days = st.sidebar.number_input(
-    "عدد الأيام التاريخية (Lookback Days)",
-    min_value=60,
-    max_value=365,
-    value=180,
-    step=30
-)
-
-max_stocks = st.sidebar.number_input(
-    "أقصى عدد أسهم في المحفظة",
-    min_value=3,
-    max_value=20,
-    value=8
-)
-
-max_weight_per_stock = st.sidebar.slider(
-    "أقصى وزن لسهم واحد (%)",
-    min_value=5,
-    max_value=50,
-    value=20
-) / 100.0
-
-build_button = st.sidebar.button("🚀 كوّن محفظة V2 متعددة العوامل")
+def render_sidebar():
+    st.sidebar.header("إعدادات المحفظة (V2)")
+
+    capital = st.sidebar.number_input(
+        "المبلغ المستثمر (EGP)",
+        min_value=1000.0,
+        value=100000.0,
+        step=5000.0
+    )
+
+    full_market = st.sidebar.checkbox(
+        "🌐 كل السوق (فلترة مبدئية بالسيولة وطول التاريخ)",
+        value=False
+    )
+
+    selected_universe = st.sidebar.multiselect(
+        "اختر أسهم من البورصة المصرية:",
+        options=DEFAULT_UNIVERSE,
+        default=DEFAULT_UNIVERSE[:10],
+        disabled=full_market
+    )
+
+    lookback_days = st.sidebar.number_input(
+        "عدد الأيام التاريخية (Lookback Days)",
+        min_value=60,
+        max_value=365,
+        value=180,
+        step=30
+    )
+
+    max_stocks = st.sidebar.number_input(
+        "أقصى عدد أسهم في المحفظة",
+        min_value=3,
+        max_value=20,
+        value=8
+    )
+
+    max_weight_per_stock = st.sidebar.slider(
+        "أقصى وزن لسهم واحد (%)",
+        min_value=5,
+        max_value=50,
+        value=20
+    ) / 100.0
+
+    max_adv_pct = st.sidebar.slider(
+        "أقصى مركز كنسبة من متوسط قيمة التداول اليومي (%) – 0 = بدون حد",
+        min_value=0,
+        max_value=100,
+        value=0
+    )
+
+    max_sector_pct = st.sidebar.slider(
+        "أقصى وزن لقطاع واحد (%) – 100 = بدون حد",
+        min_value=10,
+        max_value=100,
+        value=100
+    )
+
+    normalization = st.sidebar.selectbox(
+        "طريقة تطبيع العوامل",
+        options=list(NORMALIZATION_LABELS.keys()),
+        format_func=lambda m: NORMALIZATION_LABELS[m],
+    )
+
+    scenario_months = st.sidebar.selectbox(
+        "أفق سيناريوهات المحاكاة (شهور)",
+        options=[6, 12],
+        index=1
+    )
+
+    holdings_file = st.sidebar.file_uploader(
+        "محفظتك الحالية (CSV: symbol, shares) – اختياري لإعادة التوازن",
+        type=["csv"]
+    )
+
+    no_trade_band = st.sidebar.slider(
+        "نطاق عدم التداول (%)",
+        min_value=0,
+        max_value=10,
+        value=2
+    ) / 100.0
+
+    build_button = st.sidebar.button("🚀 كوّن محفظة V2 متعددة العوامل")
+
+    return {
+        "capital": capital,
+        "selected_universe": selected_universe,
+        "full_market": full_market,
+        "lookback_days": lookback_days,
+        "max_stocks": max_stocks,
+        "max_weight_per_stock": max_weight_per_stock,
+        "normalization": normalization,
+        "max_adv_fraction": (max_adv_pct / 100.0) or None,
+        "sector_caps": max_sector_pct / 100.0 if max_sector_pct < 100 else None,
+        "scenario_months": scenario_months,
+        "holdings_file": holdings_file,
+        "no_trade_band": no_trade_band,
+        "build_button": build_button,
+    }
+
 
 # ---------------------------------------------------------
-# MAIN LOGIC
+# عرض النتائج
 # ---------------------------------------------------------
-if build_button:
-    if not selected_universe:
-        st.error("من فضلك اختر أسهماً أولاً.")
+def render_portfolio(df, cash_left):
+    st.success("✅ تم تكوين المحفظة المتقدمة V2 بنجاح")
+
+    col1, col2 = st.columns(2)
+
+    # -------- جدول المحفظة --------
+    with col1:
+        st.subheader("📊 تفاصيل المحفظة (V2)")
+        st.dataframe(df, use_container_width=True)
+
+    # -------- رسم الأوزان --------
+    with col2:
+        st.subheader("🎯 أوزان المحفظة (بعد التقريب)")
+        if "weight_real" in df.columns:
+            weights_series = pd.Series(
+                df["weight_real"].values,
+                index=df["symbol"]
+            )
+            st.bar_chart(weights_series)
+        else:
+            st.info("لا توجد أوزان محسوبة.")
+
+    # -------- توزيع القطاعات --------
+    if "sector" in df.columns:
+        st.subheader("🏦 الوزن حسب القطاع")
+        st.bar_chart(df.groupby("sector")["weight_real"].sum().sort_values(ascending=False))
+
+    # -------- ملخص المحفظة --------
+    st.markdown("---")
+    total_mv = df["market_value"].sum()
+
+    st.subheader("📘 ملخص المحفظة المتقدمة")
+    col_a, col_b, col_c = st.columns(3)
+    with col_a:
+        st.metric("قيمة الأسهم", f"{total_mv:,.2f} EGP")
+    with col_b:
+        st.metric("الكاش المتبقي", f"{cash_left:,.2f} EGP")
+    with col_c:
+        st.metric("إجمالي (أسهم + كاش)", f"{(total_mv + cash_left):,.2f} EGP")
+
+    if "trade_cost" in df.columns:
+        total_cost = df["trade_cost"].sum()
+        st.caption(
+            f"تكاليف التنفيذ المتوقعة (عمولات + رسوم + spread + أثر السوق): {total_cost:,.2f} EGP "
+            f"({total_cost / max(total_mv + cash_left + total_cost, 1e-9) * 100:.2f}% من رأس المال)"
+        )
+
+
+# أعمدة جدول العوامل المعروضة وعناوينها (بالترتيب)
+FACTOR_TABLE_COLUMNS = {
+    "symbol": "السهم",
+    "annual_return_pct": "العائد السنوي (%)",
+    "annual_vol_pct": "التذبذب السنوي (%)",
+    "risk_score": "Risk Score",
+    "fund_score": "Fundamentals Score",
+    "mom_score": "Momentum Score",
+    "total_score": "الدرجة النهائية (Total Score)",
+    "quality_score": "جودة البيانات (Quality)",
+    "stale": "بيانات قديمة",
+}
+
+
+def render_factor_table(factor_table):
+    """
+    factor_table: pyarrow.Table من الـ builder (أو DataFrame لو pyarrow مش متاح).
+    أعمدة النسب المئوية جاية جاهزة من score_factors، واختيار الأعمدة وعناوينها
+    بيحصل في column_config فالجدول بيتعرض من غير أي نسخة pandas.
+    """
+    if factor_table is None:
+        return
+
+    st.markdown("---")
+    st.subheader("🧠 تحليل العوامل لكل سهم (Risk / Fundamentals / Momentum)")
+
+    columns = set(column_names(factor_table))
+    show_cols = [col for col in FACTOR_TABLE_COLUMNS if col in columns]
+
+    if show_cols:
+        st.dataframe(
+            factor_table,
+            column_order=show_cols,
+            column_config={col: FACTOR_TABLE_COLUMNS[col] for col in show_cols},
+            use_container_width=True,
+        )
     else:
-        with st.spinner("جاري تحميل البيانات وبناء المحفظة المتقدمة..."):
-            try:
-                builder = AIPortfolioBuilderV2(
-                    universe=selected_universe,
-                    lookback_days=lookback_days,
-                    auto_suffix=True,
-                    verbose=False
-                )
+        st.info("لا توجد بيانات تفصيلية للعوامل.")
+
+
+def render_risk(builder, df, alpha=0.95):
+    """
+    مخاطر المحفظة: VaR / CVaR + أقصى تراجع + مساهمة كل سهم في المخاطرة
+    """
+    held = df[df["shares"] > 0]
+    if held.empty:
+        return
+
+    returns = builder.get_returns_panel(held["symbol"].tolist())
+    weights = pd.Series(held["weight_real"].values, index=held["symbol"])
+    analyzer = PortfolioRiskAnalyzer(weights, returns, portfolio_value=held["market_value"].sum())
+    summary, contrib = analyzer.report(alpha=alpha, horizon_days=1)
+
+    st.markdown("---")
+    st.subheader("⚠️ مخاطر المحفظة (يوم واحد، ثقة 95%)")
+
+    col_a, col_b, col_c, col_d = st.columns(4)
+    with col_a:
+        st.metric("VaR تاريخي", f"{summary['historical_var_egp']:,.0f} EGP",
+                  f"{summary['historical_var'] * 100:.2f}%", delta_color="off")
+    with col_b:
+        st.metric("CVaR تاريخي", f"{summary['historical_cvar_egp']:,.0f} EGP",
+                  f"{summary['historical_cvar'] * 100:.2f}%", delta_color="off")
+    with col_c:
+        st.metric("VaR (Parametric)", f"{summary['parametric_var_egp']:,.0f} EGP",
+                  f"{summary['parametric_var'] * 100:.2f}%", delta_color="off")
+    with col_d:
+        st.metric("أقصى تراجع تاريخي", f"{summary['max_drawdown'] * 100:.2f}%")
+
+    st.caption(
+        f"VaR بالمحاكاة (Bootstrap): {summary['simulated_var'] * 100:.2f}% – "
+        f"CVaR: {summary['simulated_cvar'] * 100:.2f}% – "
+        f"التذبذب السنوي: {summary['annual_vol'] * 100:.2f}%"
+    )
+    st.dataframe(contrib, use_container_width=True)
+
+
+def render_scenarios(builder, df, cash_left, months, n_paths=5000):
+    """
+    قيمة المحفظة المتوقعة بعد months شهر (Monte Carlo بـ covariance بعد shrinkage)
+    """
+    held = df[df["shares"] > 0]
+    if held.empty:
+        return
+
+    returns = builder.get_returns_panel(held["symbol"].tolist())
+    engine = ScenarioEngine(held, returns, cash=cash_left)
+    result = engine.simulate(horizon_days=21 * months, n_paths=n_paths, method="normal", seed=0)
+
+    st.markdown("---")
+    st.subheader(f"🔮 سيناريوهات قيمة المحفظة بعد {months} شهر")
+
+    terminal = result["terminal"].set_index("percentile")
+    col_a, col_b, col_c, col_d = st.columns(4)
+    with col_a:
+        st.metric("سيناريو متشائم (5%)", f"{terminal.loc[5, 'value']:,.0f} EGP",
+                  f"{terminal.loc[5, 'return'] * 100:.1f}%")
+    with col_b:
+        st.metric("السيناريو الوسيط (50%)", f"{terminal.loc[50, 'value']:,.0f} EGP",
+                  f"{terminal.loc[50, 'return'] * 100:.1f}%")
+    with col_c:
+        st.metric("سيناريو متفائل (95%)", f"{terminal.loc[95, 'value']:,.0f} EGP",
+                  f"{terminal.loc[95, 'return'] * 100:.1f}%")
+    with col_d:
+        st.metric("احتمال الخسارة", f"{result['prob_loss'] * 100:.1f}%")
+
+    st.line_chart(result["bands"])
+    st.caption(
+        "أقصى تراجع خلال الفترة (الوسيط): "
+        f"{result['drawdown'].set_index('percentile').loc[50, 'max_drawdown'] * 100:.1f}% – "
+        f"عدد المسارات: {result['n_paths']:,}"
+    )
+
+
+def render_rebalance(builder, df, holdings_file, max_weight_per_stock, no_trade_band):
+    """
+    أقل قائمة صفقات من المحفظة الحالية للمحفظة المستهدفة
+    """
+    shares, cash = load_holdings(holdings_file)
+    planner = RebalancePlanner.from_portfolio(
+        df,
+        max_weight_per_stock=max_weight_per_stock,
+        no_trade_band=no_trade_band,
+        price_lookup=builder.egx.get_last_price,
+        cost_model=getattr(builder, "cost_model", None),
+    )
+    trades, summary = planner.plan(shares, cash=cash)
+
+    st.markdown("---")
+    st.subheader("🔁 إعادة التوازن من محفظتك الحالية")
+
+    col_a, col_b, col_c = st.columns(3)
+    with col_a:
+        st.metric("قيمة المحفظة الحالية", f"{summary['portfolio_value']:,.2f} EGP")
+    with col_b:
+        st.metric("عدد الصفقات", f"{summary['n_trades']}")
+    with col_c:
+        st.metric("حجم التداول (Turnover)", f"{summary['turnover_pct'] * 100:.1f}%")
+    if summary["costs"]:
+        st.caption(f"تكاليف التنفيذ المتوقعة: {summary['costs']:,.2f} EGP")
+
+    if trades.empty:
+        st.info("المحفظة الحالية داخل نطاق عدم التداول – لا حاجة لصفقات.")
+    else:
+        st.dataframe(trades, use_container_width=True)
+
+
+def save_build(df, factor_df, cash_left, universe, params):
+    """
+    حفظ الـ build في المخزن التاريخي + الاحتفاظ بيه في الجلسة عشان السجل والتصدير
+    يفضلوا ظاهرين في الـ reruns اللي بعده
+    """
+    results = get_data_context()["results"]
+    try:
+        results.save_build(df, cash_left, factor_df, universe=universe, params=params)
+    except OSError as e:
+        st.warning(f"تعذر حفظ النتيجة في السجل التاريخي: {e}")
+
+    st.session_state.v2_last_build = {"df": df, "factor_df": factor_df, "universe": universe}
+
+
+def render_history(last_build):
+    """
+    تصدير آخر build + مقارنة بالـ builds السابقة لنفس الكون.
+    بيترسم برا زرار البناء: تغيير صيغة التصدير بيعمل rerun من غير ضغط الزرار
+    """
+    results = get_data_context()["results"]
+    df, factor_df, universe = last_build["df"], last_build["factor_df"], last_build["universe"]
+
+    st.markdown("---")
+    st.subheader("🗂️ السجل والتصدير")
+
+    fmt = st.selectbox("صيغة التصدير", options=list(EXPORT_FORMATS), key="v2_export_format")
+    try:
+        data, file_name, mime = export_frames({"portfolio": df, "factors": factor_df}, fmt)
+        st.download_button("⬇️ تحميل المحفظة وجدول العوامل", data, file_name=file_name, mime=mime)
+    except ValueError as e:
+        st.info(str(e))
+
+    drift = results.weight_drift(universe, last_n=10)
+    if len(drift) > 1:
+        st.caption(f"تغير الأوزان عبر آخر {len(drift)} build لنفس الأسهم")
+        st.line_chart(drift)
 
-                # بناء المحفظة
-                df, cash_left = builder.build_portfolio(
-                    capital=capital,
-                    max_stocks=max_stocks,
-                    max_weight_per_stock=max_weight_per_stock
+
+# ---------------------------------------------------------
+# نقطة الدخول للصفحة (render) - تتنادى مع كل rerun
+# ---------------------------------------------------------
+def render():
+    """
+    يرسم منصة V2 بالكامل. لا يستدعي st.set_page_config ولا يتحقق من الدخول،
+    عشان يتنادى من app.py أو من main() مع كل rerun.
+    """
+    st.title("📊 EGX AI Portfolio Builder V2")
+    st.markdown(
+        "هذه النسخة المتقدمة تستخدم نموذج **متعدد العوامل**: "
+        "عائد/مخاطرة + أساسيات (Fundamentals) + زخم (Momentum)"
+    )
+
+    settings = render_sidebar()
+
+    if not settings["build_button"]:
+        live = st.session_state.get("v2_live")
+        last_build = st.session_state.get("v2_last_build")
+        if live is None and last_build is None:
+            st.info("اضبط الإعدادات من اليسار ثم اضغط على زر (🚀 كوّن محفظة V2 متعددة العوامل).")
+            return
+        if live is not None:
+            render_live(live)
+        if last_build is not None:
+            render_history(last_build)
+        return
+
+    if settings["full_market"]:
+        with st.spinner("جاري فلترة كل أسهم السوق..."):
+            screener = UniverseScreener(verbose=False, store=get_data_context()["store"])
+            settings["selected_universe"] = screener.survivors()
+        st.caption(
+            f"🌐 عدد الأسهم بعد الفلترة: {len(settings['selected_universe'])} "
+            f"من {len(screener.symbols)}"
+        )
+
+    if not settings["selected_universe"]:
+        st.error("من فضلك اختر أسهماً أولاً.")
+        return
+
+    with st.spinner("جاري تحميل البيانات وبناء المحفظة المتقدمة..."):
+        try:
+            builder = get_builder(
+                settings["selected_universe"],
+                settings["lookback_days"],
+                settings["normalization"],
+            )
+
+            # لو فيه snapshot محسوب بعد إغلاق آخر جلسة، نستخدمه بدل الحساب المباشر
+            snapshot = load_latest_snapshot(
+                lookback_days=settings["lookback_days"],
+                max_age_days=SNAPSHOT_MAX_AGE_DAYS,
+                as_arrow=True,
+            )
+            factor_snapshot = snapshot[0] if snapshot is not None else None
+
+            # بناء المحفظة
+            df, cash_left = builder.build_portfolio(
+                capital=settings["capital"],
+                max_stocks=settings["max_stocks"],
+                max_weight_per_stock=settings["max_weight_per_stock"],
+                factor_snapshot=factor_snapshot,
+                max_adv_fraction=settings["max_adv_fraction"],
+                sector_caps=settings["sector_caps"],
+            )
+
+            if snapshot is not None:
+                st.caption(f"📦 العوامل من snapshot بتاريخ {snapshot[1]['as_of']}")
+
+            stale_symbols = getattr(builder, "last_stale_symbols", [])
+            dropped_symbols = getattr(builder, "last_dropped_symbols", [])
+            if stale_symbols:
+                st.warning(f"⏱️ أسعار لم تتحدث في الوقت – استخدمنا آخر بيانات مخزنة: {', '.join(stale_symbols)}")
+            if dropped_symbols:
+                st.warning(f"⏱️ أسهم مستبعدة لعدم وصول بياناتها: {', '.join(dropped_symbols)}")
+
+            render_portfolio(df, cash_left)
+            start_live_revaluation(df, cash_left)
+
+            # -------- جدول العوامل (Factors) --------
+            render_factor_table(getattr(builder, "last_factor_table", None))
+
+            # -------- مخاطر المحفظة --------
+            render_risk(builder, df)
+
+            # -------- سيناريوهات مستقبلية --------
+            render_scenarios(builder, df, cash_left, settings["scenario_months"])
+
+            # -------- السجل والتصدير --------
+            save_build(
+                df,
+                builder.last_factor_df,
+                cash_left,
+                settings["selected_universe"],
+                {
+                    key: settings[key]
+                    for key in ("capital", "lookback_days", "max_stocks", "max_weight_per_stock",
+                                "normalization", "max_adv_fraction", "sector_caps")
+                },
+            )
+            render_history(st.session_state.v2_last_build)
+
+            # -------- إعادة التوازن --------
+            if settings["holdings_file"] is not None:
+                render_rebalance(
+                    builder,
+                    df,
+                    settings["holdings_file"],
+                    settings["max_weight_per_stock"],
+                    settings["no_trade_band"],
                 )
 
-                st.success("✅ تم تكوين المحفظة المتقدمة V2 بنجاح")
-
-                col1, col2 = st.columns(2)
-
-                # -------- جدول المحفظة --------
-                with col1:
-                    st.subheader("📊 تفاصيل المحفظة (V2)")
-                    st.dataframe(df, use_container_width=True)
-
-                # -------- رسم الأوزان --------
-                with col2:
-                    st.subheader("🎯 أوزان المحفظة (بعد التقريب)")
-                    if "weight_real" in df.columns:
-                        weights_series = pd.Series(
-                            df["weight_real"].values,
-                            index=df["symbol"]
-                        )
-                        st.bar_chart(weights_series)
-                    else:
-                        st.info("لا توجد أوزان محسوبة.")
-
-                # -------- ملخص المحفظة --------
-                st.markdown("---")
-                total_mv = df["market_value"].sum()
-
-                st.subheader("📘 ملخص المحفظة المتقدمة")
-                col_a, col_b, col_c = st.columns(3)
-                with col_a:
-                    st.metric("قيمة الأسهم", f"{total_mv:,.2f} EGP")
-                with col_b:
-                    st.metric("الكاش المتبقي", f"{cash_left:,.2f} EGP")
-                with col_c:
-                    st.metric("إجمالي (أسهم + كاش)", f"{(total_mv + cash_left):,.2f} EGP")
-
-                # -------- جدول العوامل (Factors) --------
-                if hasattr(builder, "last_factor_df") and builder.last_factor_df is not None:
-                    st.markdown("---")
-                    st.subheader("🧠 تحليل العوامل لكل سهم (Risk / Fundamentals / Momentum)")
-
-                    fact = builder.last_factor_df.copy()
-
-                    # تحويل العائد والتذبذب إلى نسب مئوية
-                    if "annual_return" in fact.columns:
-                        fact["annual_return_pct"] = (fact["annual_return"] * 100).round(2)
-                    if "annual_vol" in fact.columns:
-                        fact["annual_vol_pct"] = (fact["annual_vol"] * 100).round(2)
-
-                    show_cols = []
-                    col_map = {}
-
-                    if "symbol" in fact.columns:
-                        show_cols.append("symbol")
-                        col_map["symbol"] = "السهم"
-
-                    if "annual_return_pct" in fact.columns:
-                        show_cols.append("annual_return_pct")
-                        col_map["annual_return_pct"] = "العائد السنوي (%)"
-
-                    if "annual_vol_pct" in fact.columns:
-                        show_cols.append("annual_vol_pct")
-                        col_map["annual_vol_pct"] = "التذبذب السنوي (%)"
-
-                    if "risk_score" in fact.columns:
-                        show_cols.append("risk_score")
-                        col_map["risk_score"] = "Risk Score"
-
-                    if "fund_score" in fact.columns:
-                        show_cols.append("fund_score")
-                        col_map["fund_score"] = "Fundamentals Score"
-
-                    if "mom_score" in fact.columns:
-                        show_cols.append("mom_score")
-                        col_map["mom_score"] = "Momentum Score"
-
-                    if "total_score" in fact.columns:
-                        show_cols.append("total_score")
-                        col_map["total_score"] = "الدرجة النهائية (Total Score)"
-
-                    if show_cols:
-                        fact = fact[show_cols].rename(columns=col_map)
-                        st.dataframe(fact, use_container_width=True)
-                    else:
-                        st.info("لا توجد بيانات تفصيلية للعوامل.")
-
-            except Exception as e:
-                st.error(f"حدث خطأ أثناء بناء المحفظة المتقدمة: {e}")
-else:
-    st.info("اضبط الإعدادات من اليسار ثم اضغط على زر (🚀 كوّن محفظة V2 متعددة العوامل).")
+        except Exception as e:
+            st.error(f"حدث خطأ أثناء بناء المحفظة المتقدمة: {e}")
+
+
+# ---------------------------------------------------------
+# تشغيل الصفحة مستقلة: streamlit run egx_ai_portfolio_app_v2.py
+# ---------------------------------------------------------
+def main():
+    st.set_page_config(page_title="EGX AI Portfolio V2", layout="wide")
+
+    # أول حاجة نتحقق من اللوجين
+    check_login()
+
+    # لو وصلنا هنا يبقى الدخول صحيح – نعرض المنصة V2
+    render()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import csv
+import os
+from functools import lru_cache
+
+# الكون الافتراضي لأسهم البورصة المصرية
+# ملف خفيف بدون أي imports ثقيلة عشان صفحة الدخول تقدر تستخدمه في الـ warm-up
+DEFAULT_UNIVERSE = [
+    "COMI", "ETEL", "EKHO", "AMOC", "CIEB", "SWDY",
+    "ORHD", "ESRS", "FWRY", "HRHO", "EFIH", "ADIB",
+    "DICE", "CCAP", "ABUK"
+]
+
+# قائمة مدمجة بأهم الأسهم المقيدة في البورصة المصرية.
+# القائمة الكاملة للسوق (~250 سهم) تتقري من ملف CSV فيه عمود symbol
+# عن طريق المتغير EGX_LISTING_FILE أو باراميتر path في load_egx_listing.
+EGX_LISTING = DEFAULT_UNIVERSE + [
+    # بنوك وخدمات مالية
+    "HDBK", "CANA", "FAIT", "SAUD", "EXPA", "BTFH", "CICH",
+    # عقارات
+    "TMGH", "PHDC", "MNHD", "HELI", "OCDI", "EMFD", "AMER", "PORT",
+    # صناعة وكيماويات وأسمدة
+    "MFPC", "SKPC", "EGAL", "EGCH", "KZPC", "ARCC", "MCQE", "ASCM", "ELEC",
+    # أغذية ومشروبات وسلع استهلاكية
+    "EAST", "JUFO", "EFID", "SUGR", "POUL", "OLFI", "ORWE",
+    # سيارات وتجارة
+    "AUTO", "MTIE", "RAYA",
+    # رعاية صحية
+    "CLHO", "ISPH", "RMDA", "SPMD",
+    # تعليم
+    "TALM", "CIRA",
+    # نقل وشحن
+    "ALCN", "CSAG", "ETRS",
+    # سياحة وقابضة
+    "EGTS", "PIOH", "ACGC",
+]
+
+EGX_LISTING_FILE = os.environ.get("EGX_LISTING_FILE")
+
+
+def load_egx_listing(path=None):
+    """
+    يرجّع قائمة كل رموز السوق: من ملف CSV (عمود symbol) لو موجود، وإلا EGX_LISTING
+    """
+    path = path or EGX_LISTING_FILE
+    if not path or not os.path.exists(path):
+        return list(EGX_LISTING)
+
+    symbols = []
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            sym = (row.get("symbol") or "").strip().upper()
+            if sym and sym not in symbols:
+                symbols.append(sym)
+
+    return symbols or list(EGX_LISTING)
+
+
+# ----------------------------------------------------------------------
+# بيانات وصفية لكل سهم: القطاع، عضوية EGX30، وشريحة القيمة السوقية
+# (تقريبية – عضوية المؤشر بتتراجع كل 6 شهور، والملف الكامل يتقري من
+# EGX_METADATA_FILE: CSV بأعمدة symbol, sector, egx30, cap_bucket)
+# ----------------------------------------------------------------------
+SYMBOL_METADATA = {
+    # symbol: (sector, egx30, cap_bucket)
+    "COMI": ("Financials", True, "large"),
+    "CIEB": ("Financials", True, "mid"),
+    "ADIB": ("Financials", True, "mid"),
+    "HRHO": ("Financials", True, "large"),
+    "EFIH": ("Financials", True, "large"),
+    "CCAP": ("Financials", True, "mid"),
+    "HDBK": ("Financials", False, "mid"),
+    "CANA": ("Financials", False, "small"),
+    "FAIT": ("Financials", True, "mid"),
+    "SAUD": ("Financials", False, "small"),
+    "EXPA": ("Financials", False, "small"),
+    "BTFH": ("Financials", True, "mid"),
+    "CICH": ("Financials", False, "small"),
+    "ETEL": ("Telecom & Tech", True, "large"),
+    "FWRY": ("Telecom & Tech", True, "large"),
+    "RAYA": ("Telecom & Tech", False, "small"),
+    "EKHO": ("Industrials", True, "large"),
+    "SWDY": ("Industrials", True, "large"),
+    "ELEC": ("Industrials", False, "small"),
+    "AMOC": ("Energy", True, "mid"),
+    "ESRS": ("Basic Resources", True, "large"),
+    "ABUK": ("Basic Resources", True, "large"),
+    "MFPC": ("Basic Resources", True, "large"),
+    "SKPC": ("Basic Resources", True, "mid"),
+    "EGAL": ("Basic Resources", True, "large"),
+    "EGCH": ("Basic Resources", False, "small"),
+    "KZPC": ("Basic Resources", False, "small"),
+    "ARCC": ("Basic Resources", False, "small"),
+    "MCQE": ("Basic Resources", False, "small"),
+    "ASCM": ("Basic Resources", False, "small"),
+    "ORHD": ("Real Estate", True, "mid"),
+    "TMGH": ("Real Estate", True, "large"),
+    "PHDC": ("Real Estate", True, "mid"),
+    "MNHD": ("Real Estate", True, "small"),
+    "HELI": ("Real Estate", True, "mid"),
+    "OCDI": ("Real Estate", False, "mid"),
+    "EMFD": ("Real Estate", True, "mid"),
+    "AMER": ("Real Estate", False, "small"),
+    "PORT": ("Real Estate", False, "small"),
+    "DICE": ("Consumer", False, "small"),
+    "EAST": ("Consumer", True, "large"),
+    "JUFO": ("Consumer", True, "mid"),
+    "EFID": ("Consumer", True, "mid"),
+    "SUGR": ("Consumer", False, "small"),
+    "POUL": ("Consumer", False, "small"),
+    "OLFI": ("Consumer", False, "small"),
+    "ORWE": ("Consumer", True, "mid"),
+    "AUTO": ("Consumer", True, "mid"),
+    "MTIE": ("Consumer", False, "small"),
+    "CLHO": ("Healthcare", True, "mid"),
+    "ISPH": ("Healthcare", False, "small"),
+    "RMDA": ("Healthcare", False, "small"),
+    "SPMD": ("Healthcare", False, "small"),
+    "TALM": ("Education", False, "mid"),
+    "CIRA": ("Education", True, "mid"),
+    "ALCN": ("Transport", True, "mid"),
+    "CSAG": ("Transport", False, "small"),
+    "ETRS": ("Transport", False, "small"),
+    "EGTS": ("Tourism & Holding", False, "small"),
+    "PIOH": ("Tourism & Holding", False, "small"),
+    "ACGC": ("Tourism & Holding", False, "small"),
+}
+
+UNKNOWN_SECTOR = "UNKNOWN"
+
+EGX_METADATA_FILE = os.environ.get("EGX_METADATA_FILE")
+
+
+@lru_cache(maxsize=None)
+def load_symbol_metadata(path=None):
+    """
+    يرجّع dict {symbol: {"sector", "egx30", "cap_bucket"}} – بيتحمل مرة واحدة ويتخزن.
+    الملف (لو موجود) بيكمّل/يغيّر القيم المدمجة في SYMBOL_METADATA.
+    """
+    meta = {
+        sym: {"sector": sector, "egx30": egx30, "cap_bucket": bucket}
+        for sym, (sector, egx30, bucket) in SYMBOL_METADATA.items()
+    }
+
+    path = path or EGX_METADATA_FILE
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                sym = (row.get("symbol") or "").strip().upper()
+                if not sym:
+                    continue
+                entry = meta.setdefault(
+                    sym, {"sector": UNKNOWN_SECTOR, "egx30": False, "cap_bucket": "small"}
+                )
+                if row.get("sector"):
+                    entry["sector"] = row["sector"].strip()
+                if row.get("egx30"):
+                    entry["egx30"] = row["egx30"].strip().lower() in ("1", "true", "yes")
+                if row.get("cap_bucket"):
+                    entry["cap_bucket"] = row["cap_bucket"].strip().lower()
+
+    return meta
+
+
+def symbol_groups(symbols, field="sector"):
+    """
+    قيمة field (sector / egx30 / cap_bucket) لكل سهم بنفس الترتيب – للقيود وللتطبيع حسب القطاع
+    """
+    meta = load_symbol_metadata()
+    default = {"sector": UNKNOWN_SECTOR, "egx30": False, "cap_bucket": "small"}[field]
+    return [meta.get(str(sym).upper().replace(".CA", ""), {}).get(field, default) for sym in symbols]
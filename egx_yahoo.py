@@ -1,15 +1,119 @@
-import yfinance as yf
+import contextlib
+import threading
+import time
+
+import numpy as np
 import pandas as pd
 
+from circuit_breaker import get_default_breaker
+from corporate_actions import adjustment_factors, apply_factors, empty_actions, extract_actions
+from price_store import get_default_store, slice_as_of
+
+# أقصى عدد طلبات متوازية في prefetch بمهلة (timeout)
+PREFETCH_THREADS = 4
+# عدد الأسهم في الطلب المجمع الواحد في prefetch بمهلة
+PREFETCH_BATCH_SYMBOLS = 8
+# الدفعة اللي ما خلصتش بعد النسبة دي من الوقت الباقي بتتقسم لطلب لكل سهم
+PREFETCH_SPLIT_FRACTION = 0.5
+
+
+def _yf():
+    """
+    استيراد yfinance عند الحاجة فقط (lazy import)
+    عشان صفحة تسجيل الدخول ما تدفعش تكلفة تحميل yfinance/requests
+    """
+    import yfinance as yf
+    return yf
+
+
+# أعمدة OHLCV اللي بنحتفظ بيها في المخزن وأنواعها المضغوطة:
+# Close بدقة float64 عشان حسابات العوائد، والباقي float32 لتوفير الذاكرة
+OHLCV_DTYPES = {
+    "Open": "float32",
+    "High": "float32",
+    "Low": "float32",
+    "Close": "float64",
+    "Volume": "float32",
+}
+
+
+def _ticker_frame(data, sym):
+    """
+    إطار سهم واحد من ناتج yf.download
+    سواء كانت الأعمدة عادية أو MultiIndex (حسب إصدار yfinance و group_by)
+    """
+    if isinstance(data.columns, pd.MultiIndex):
+        if sym in data.columns.get_level_values(0):
+            return data[sym]
+        if sym in data.columns.get_level_values(1):
+            return data.xs(sym, axis=1, level=1)
+        if "Close" in data.columns.get_level_values(0):
+            return data.droplevel(1, axis=1)
+        return None
+    return data
+
+
+def _extract_ohlcv(data, sym):
+    """
+    يستخرج إطار OHLCV لسهم واحد من ناتج yf.download
+    ويحوّله للأنواع المضغوطة في OHLCV_DTYPES
+    """
+    frame = _ticker_frame(data, sym)
+    if frame is None or "Close" not in frame.columns:
+        return None
+
+    cols = [c for c in OHLCV_DTYPES if c in frame.columns]
+    frame = frame[cols].dropna(subset=["Close"])
+    if frame.empty:
+        return None
+
+    frame = frame.sort_index().astype({c: OHLCV_DTYPES[c] for c in cols})
+    frame.columns.name = sym
+    return frame
+
+
+def _extract_actions(data, sym):
+    frame = _ticker_frame(data, sym)
+    if frame is None:
+        return empty_actions()
+    return extract_actions(frame)
+
+
+def _download(symbols, **kwargs):
+    """
+    تحميل أسعار خام + الإجراءات المؤسسية (الشكل المعدّل بيتحسب محلياً)
+    """
+    return _yf().download(
+        symbols,
+        interval="1d",
+        auto_adjust=False,
+        actions=True,
+        progress=False,
+        **kwargs,
+    )
+
+
+def _close_of(frame, sym):
+    close = frame["Close"].copy()
+    close.name = sym
+    return close
+
+
 class EGXYahoo:
-    def __init__(self, tickers, auto_suffix=True, verbose=True):
+    def __init__(self, tickers, auto_suffix=True, verbose=True, store=None, breaker=None):
         """
         tickers: قائمة رموز EGX (مثلاً: ["COMI", "EKHO", "AMOC"])
         auto_suffix: لو True يضيف .CA تلقائيًا لو مش موجودة
+        store: مخزن الأسعار (PriceStore) - الافتراضي مشترك على مستوى العملية
+        breaker: CircuitBreaker للأسهم اللي تحميلها بيفشل بشكل متكرر - الافتراضي مشترك
         """
         self.tickers = tickers
         self.auto_suffix = auto_suffix
         self.verbose = verbose
+        self.store = store if store is not None else get_default_store()
+        self.breaker = breaker if breaker is not None else get_default_breaker()
+        # (cached_only, allow_stale) – انظر cached_only()
+        self._read_mode = (False, False)
 
     def _log(self, *args, **kwargs):
         if self.verbose:
@@ -17,38 +121,351 @@ class EGXYahoo:
 
     def _format_symbol(self, symbol):
         sym = str(symbol).strip().upper()
-        if self.auto_suffix and not sym.endswith(".CA"):
+        # المؤشرات (مثل ^CASE30) ليس لها لاحقة .CA
+        if self.auto_suffix and not sym.endswith(".CA") and not sym.startswith("^"):
             sym = sym + ".CA"
         return sym
 
-    def get_price(self, symbol, start=None, end=None, adjusted=False):
+    def get_price(self, symbol, start=None, end=None, adjusted=False, as_of=None):
         """
         يرجّع Series فيها أسعار الإغلاق لسهم واحد
         """
+        frame = self.get_ohlcv(symbol, start=start, end=end, adjusted=adjusted, as_of=as_of)
+        if frame is None:
+            return None
+        return _close_of(frame, self._format_symbol(symbol))
+
+    def get_volume(self, symbol, adjusted=False, as_of=None):
+        """
+        يرجّع Series فيها حجم التداول اليومي لسهم واحد (من نفس البيانات المخزنة)
+        """
+        frame = self.get_ohlcv(symbol, adjusted=adjusted, as_of=as_of)
+        if frame is None or "Volume" not in frame.columns:
+            return None
+        volume = frame["Volume"].copy()
+        volume.name = self._format_symbol(symbol)
+        return volume
+
+    @contextlib.contextmanager
+    def cached_only(self, allow_stale=True):
+        """
+        جوه الـ with: get_* بيقرا من المخزن بس ومفيش تحميل لأي سهم ناقص (prefetch بس
+        هو اللي بيحمّل). allow_stale: البيانات اللي عدّت عمرها الأقصى بتتقرا بدل ما تتعتبر ناقصة.
+        """
+        previous = self._read_mode
+        self._read_mode = (True, allow_stale)
+        try:
+            yield self
+        finally:
+            self._read_mode = previous
+
+    def data_status(self, symbols=None):
+        """
+        {رمز: "fresh" / "stale" / "missing"} حسب حالة بياناته في المخزن
+        """
+        symbols = self.tickers if symbols is None else symbols
+        status = {}
+        for s in symbols:
+            sym = self._format_symbol(s)
+            if self.store.has(sym):
+                status[s] = "fresh"
+            elif self.store.is_stale(sym):
+                status[s] = "stale"
+            else:
+                status[s] = "missing"
+        return status
+
+    def evict(self, symbols):
+        """
+        يشيل الأسهم من المخزن (انظر PriceStore.evict)
+        """
+        self.store.evict([self._format_symbol(s) for s in symbols])
+
+    def get_ohlcv(self, symbol, start=None, end=None, adjusted=False, as_of=None):
+        """
+        يرجّع DataFrame بأعمدة Open/High/Low/Close/Volume لسهم واحد.
+        لو الطلب على التاريخ الكامل (بدون start/end) بنستخدم المخزن لو السهم موجود فيه.
+        adjusted: أسعار معدّلة للتوزيعات والتجزئة – بتتحسب من الأسعار الخام
+        (الطلبات بفترة محددة معدّلة بالإجراءات اللي جوه الفترة بس)
+        as_of: البيانات زي ما كانت متاحة في التاريخ ده (شموع لحد as_of بس، من المخزن
+        بدون تحميل جديد لو السهم موجود فيه) – انظر PriceStore.get
+        """
         sym = self._format_symbol(symbol)
+        use_store = start is None and end is None
+        cached_only, allow_stale = self._read_mode
+
+        if use_store and self.store.has(sym, allow_stale=allow_stale):
+            return self.store.get(sym, adjusted=adjusted, as_of=as_of, allow_stale=allow_stale)
+        if cached_only:
+            return None
+        if not self.breaker.allow(sym):
+            self._log(f"⏭️ تم تخطي السهم {sym} (فشل التحميل أكتر من مرة مؤخراً)")
+            return None
+        if use_store and self.store.is_stale(sym):
+            # بيانات قديمة في المخزن: تحديث تدريجي من آخر تاريخ بدل التاريخ كله
+            if self._load([sym]):
+                return self.store.get(sym, adjusted=adjusted, as_of=as_of)
+            return None
 
         try:
-            data = yf.download(
-                sym,
-                start=start,
-                end=end,
-                interval="1d",
-                auto_adjust=adjusted,
-                progress=False,
-            )
+            data = _download(sym, start=start, end=end)
 
             if data.empty:
                 self._log(f"⚠️ لا توجد بيانات للسهم: {sym}")
+                self.breaker.record_failure(sym)
                 return None
 
-            data = data.sort_index()
-            close_series = data["Close"].copy()
-            close_series.name = sym
-            return close_series
+            frame = _extract_ohlcv(data, sym)
+            if frame is None:
+                self._log(f"⚠️ لا توجد بيانات للسهم: {sym}")
+                self.breaker.record_failure(sym)
+                return None
+
+            self.breaker.record_success(sym)
+            actions = _extract_actions(data, sym)
+            if use_store:
+                self.store.put(sym, frame, actions=actions)
+                return self.store.get(sym, adjusted=adjusted, as_of=as_of)
+            frame = slice_as_of(frame, as_of)
+            if frame is None:
+                return None
+            if adjusted:
+                return apply_factors(frame, adjustment_factors(frame["Close"], actions))
+            return frame
         except Exception as e:
             self._log(f"❌ حدث خطأ أثناء تحميل البيانات للسهم {sym}: {e}")
+            self.breaker.record_failure(sym)
             return None
 
+    def prefetch(self, symbols=None, timeout=None):
+        """
+        تحميل التاريخ الكامل لمجموعة أسهم في طلب واحد (batched) وتخزينه في المخزن.
+        الأسهم الموجودة بالفعل في المخزن لا يعاد تحميلها
+        (المخزن بيخدم الشكل الخام والمعدّل من نفس البيانات)، والأسهم اللي بياناتها
+        قديمة (stale) بتتحدث تدريجياً عن طريق refresh. الأسهم المقفولة في
+        الـ circuit breaker بتتخطى.
+        timeout: أقصى وقت انتظار بالثواني. في الحالة دي الأسهم بتتطلب على دفعات من
+        PREFETCH_BATCH_SYMBOLS سهم من طابور مشترك على PREFETCH_THREADS thread. الدفعة
+        اللي ما خلصتش بعد PREFETCH_SPLIT_FRACTION من الوقت الباقي بتتقسم لطلب لكل سهم
+        (قبل باقي الطابور)، فالسهم البطيء بيعطل طلبه هو بس من غير ما الكون كله يدفع
+        تكلفة طلب لكل سهم. الطلبات اللي ما خلصتش في الوقت بتكمل في الخلفية (نتيجتها
+        بتدخل المخزن لما توصل) وأسهمها بس اللي بتتسجل فشل في الـ breaker؛ الأسهم اللي
+        ما لحقتش تتطلب أصلاً ما بتتسجلش.
+        يرجّع قائمة الرموز اللي تم تحميلها فعلاً.
+        """
+        symbols = self.tickers if symbols is None else symbols
+        missing = []
+        for s in symbols:
+            sym = self._format_symbol(s)
+            if sym not in missing and not self.store.has(sym):
+                missing.append(sym)
+
+        skipped = [sym for sym in missing if not self.breaker.allow(sym)]
+        if skipped:
+            self._log("⏭️ Skipping (circuit open):", ", ".join(skipped))
+            missing = [sym for sym in missing if sym not in skipped]
+
+        if not missing:
+            return []
+        if timeout is None:
+            return self._load(missing)
+        if timeout <= 0:
+            return []
+
+        deadline = time.monotonic() + timeout
+        # الطابور stack: الدفعات بترتيبها، وأسهم الدفعة المتقسمة بتتطلب قبل الباقي
+        pending = [missing[i:i + PREFETCH_BATCH_SYMBOLS]
+                   for i in range(0, len(missing), PREFETCH_BATCH_SYMBOLS)][::-1]
+        requested = set()
+        split = set()
+        settled = set()
+        loaded = []
+        cond = threading.Condition()
+        closed = [False]
+
+        def _request(batch, finished):
+            done = []
+            try:
+                done = self._load(batch, record=False)
+            finally:
+                # الطلب اللي خلص بعد الـ deadline اتسجل فشل خلاص – نتيجته للمخزن بس.
+                # سهم ناقص من دفعة اتقسمت بيستنى نتيجة طلبه لوحده
+                with cond:
+                    if not closed[0]:
+                        for sym in batch:
+                            if sym in settled:
+                                continue
+                            if sym in done:
+                                settled.add(sym)
+                                loaded.append(sym)
+                                self.breaker.record_success(sym)
+                            elif len(batch) == 1 or sym not in split:
+                                settled.add(sym)
+                                self.breaker.record_failure(sym)
+                        cond.notify_all()
+                finished.set()
+
+        def _worker():
+            while True:
+                with cond:
+                    while not closed[0] and not pending and requested - settled:
+                        # مفيش طلبات جديدة لسه، بس دفعة شغالة ممكن تتقسم
+                        cond.wait(max(deadline - time.monotonic(), 0.0))
+                        if time.monotonic() >= deadline:
+                            return
+                    if closed[0] or not pending:
+                        return
+                    batch = [sym for sym in pending.pop() if sym not in settled]
+                    requested.update(batch)
+                if not batch:
+                    continue
+
+                finished = threading.Event()
+                threading.Thread(target=_request, args=(batch, finished), daemon=True,
+                                 name="egx-prefetch-request").start()
+                remaining = max(deadline - time.monotonic(), 0.0)
+                if len(batch) == 1:
+                    finished.wait(remaining)
+                elif not finished.wait(remaining * PREFETCH_SPLIT_FRACTION):
+                    # الدفعة متأخرة: طلب لكل سهم فيها، والطلب المجمع بيكمل في الخلفية
+                    with cond:
+                        late = [sym for sym in batch if sym not in settled]
+                        split.update(late)
+                        pending.extend([sym] for sym in reversed(late))
+                        cond.notify_all()
+
+        threads = [threading.Thread(target=_worker, daemon=True, name="egx-prefetch")
+                   for _ in range(min(PREFETCH_THREADS, len(missing)))]
+        for thread in threads:
+            thread.start()
+
+        with cond:
+            while pending or requested - settled:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                cond.wait(remaining)
+            closed[0] = True
+            cond.notify_all()
+            late = sorted(requested - settled)
+            loaded = list(loaded)
+        if late:
+            self._log("⏱️ انتهى وقت التحميل قبل وصول:", ", ".join(late))
+            for sym in late:
+                self.breaker.record_failure(sym)
+        return loaded
+
+    def _load(self, symbols, record=True):
+        """
+        الأسهم اللي ليها بيانات قديمة في المخزن بتتحدث تدريجياً (refresh)، والباقي بيتحمل
+        بالكامل في طلب مجمع. يرجّع الرموز اللي بقت بياناتها حديثة.
+        record: تسجيل النتيجة في الـ circuit breaker
+        """
+        stale = [sym for sym in symbols if self.store.is_stale(sym)]
+        loaded = []
+        if stale:
+            self.refresh(stale)
+            for sym in stale:
+                ok = self.store.has(sym)
+                if ok:
+                    loaded.append(sym)
+                if record:
+                    if ok:
+                        self.breaker.record_success(sym)
+                    else:
+                        self.breaker.record_failure(sym)
+
+        missing = [sym for sym in symbols if sym not in stale]
+        if missing:
+            loaded.extend(self._fetch_batch(missing, record=record))
+        return loaded
+
+    def _fetch_batch(self, missing, record=True):
+        """
+        طلب مجمع واحد لأسهم ناقصة + تسجيله في المخزن
+        record: تسجيل النتيجة في الـ circuit breaker
+        """
+        self._log("Prefetching:", ", ".join(missing))
+        try:
+            data = _download(missing, group_by="ticker")
+        except Exception as e:
+            self._log(f"❌ حدث خطأ أثناء التحميل المجمع: {e}")
+            data = None
+
+        if data is None or data.empty:
+            if record:
+                for sym in missing:
+                    self.breaker.record_failure(sym)
+            return []
+
+        loaded = []
+        for sym in missing:
+            frame = _extract_ohlcv(data, sym)
+            if frame is None:
+                if record:
+                    self.breaker.record_failure(sym)
+                continue
+            self.store.put(sym, frame, actions=_extract_actions(data, sym))
+            if record:
+                self.breaker.record_success(sym)
+            loaded.append(sym)
+
+        return loaded
+
+    def data_fingerprint(self, symbols=None):
+        """
+        {رمز: بصمة البيانات المخزنة} – بتتغير مع أي تحديث للأسعار أو الإجراءات (None = مش موجود)
+        """
+        symbols = self.tickers if symbols is None else symbols
+        return {self._format_symbol(s): self.store.fingerprint(self._format_symbol(s)) for s in symbols}
+
+    def refresh(self, symbols=None, overlap_days=7):
+        """
+        تحديث تدريجي للأسهم الموجودة في المخزن: طلب مجمع واحد من آخر تاريخ مخزن
+        (ناقص overlap_days) بدل إعادة تحميل التاريخ كله.
+        الشموع الجديدة بتتضاف للمخزن، ولو ظهر إجراء مؤسسي جديد معامل التعديل
+        بيتحسب تاني محلياً على التاريخ المخزن (backfill بدون تحميل).
+        الأسهم اللي مش في المخزن بتتحمل بالكامل عن طريق prefetch.
+        يرجّع قائمة الرموز اللي ظهر لها إجراء جديد.
+        """
+        symbols = self.tickers if symbols is None else symbols
+        cached = {}
+        missing = []
+        for s in symbols:
+            sym = self._format_symbol(s)
+            last = self.store.last_date(sym)
+            if last is None:
+                missing.append(sym)
+            else:
+                cached[sym] = last
+
+        if missing:
+            self.prefetch(missing)
+        if not cached:
+            return []
+
+        start = (min(cached.values()) - pd.Timedelta(days=overlap_days)).date()
+        self._log("Refreshing since", start, ":", ", ".join(cached))
+        try:
+            data = _download(list(cached), start=start, group_by="ticker")
+        except Exception as e:
+            self._log(f"❌ حدث خطأ أثناء التحديث المجمع: {e}")
+            return []
+
+        if data is None or data.empty:
+            return []
+
+        with_actions = []
+        for sym in cached:
+            frame = _extract_ohlcv(data, sym)
+            if frame is not None:
+                self.store.append(sym, frame)
+            if self.store.put_actions(sym, _extract_actions(data, sym)):
+                self._log(f"📌 إجراء مؤسسي جديد للسهم {sym} – تم إعادة حساب معامل التعديل")
+                with_actions.append(sym)
+
+        return with_actions
+
     def get_all(self, start=None, end=None, adjusted=False):
         """
         يرجّع DataFrame لأسعار الإغلاق لكل الأسهم في self.tickers
@@ -70,11 +487,61 @@ class EGXYahoo:
         df = df.sort_index()
         return df
 
-    def get_last_price(self, symbol, adjusted=False):
+    def get_last_price(self, symbol, adjusted=False, as_of=None):
         """
         يرجّع آخر سعر إغلاق للسهم (float) أو None لو مفيش بيانات
+        as_of: آخر إغلاق لحد التاريخ ده
         """
-        s = self.get_price(symbol, adjusted=adjusted)
+        s = self.get_price(symbol, adjusted=adjusted, as_of=as_of)
         if s is None or s.empty:
             return None
         return float(s.iloc[-1])
+
+    def get_last_prices(self, symbols=None, adjusted=False, quotes=None):
+        """
+        آخر سعر لمجموعة أسهم في استدعاء واحد: الأسهم الناقصة من المخزن بتتحمل
+        في طلب مجمع واحد (prefetch) والباقي قراءة من المخزن.
+        quotes: dict {symbol: price} اختياري (مثلاً QuoteService.latest) – له الأولوية.
+        يرجّع np.ndarray بنفس ترتيب symbols (NaN للسهم اللي مالوش بيانات)
+        """
+        symbols = self.tickers if symbols is None else list(symbols)
+        quotes = quotes or {}
+        self.prefetch([s for s in symbols if s not in quotes])
+
+        prices = np.full(len(symbols), np.nan)
+        for i, sym in enumerate(symbols):
+            if sym in quotes:
+                prices[i] = quotes[sym]
+                continue
+            frame = self.store.get(self._format_symbol(sym), adjusted=adjusted)
+            if frame is not None and not frame.empty:
+                prices[i] = frame["Close"].iloc[-1]
+        return prices
+
+
+# ----------------------------------------------------------------------
+# Warm-up: تحميل الكون الافتراضي في الخلفية بعد تسجيل الدخول
+# ----------------------------------------------------------------------
+_WARMUP_THREAD = None
+_WARMUP_LOCK = threading.Lock()
+
+
+def start_warmup(symbols, auto_suffix=True):
+    """
+    يبدأ thread في الخلفية يحمّل أسعار symbols في المخزن المشترك.
+    آمن للاستدعاء مع كل rerun: لو فيه warm-up شغال بالفعل مش هيبدأ واحد جديد.
+    يرجّع الـ thread.
+    """
+    global _WARMUP_THREAD
+    with _WARMUP_LOCK:
+        if _WARMUP_THREAD is not None and _WARMUP_THREAD.is_alive():
+            return _WARMUP_THREAD
+
+        egx = EGXYahoo(list(symbols), auto_suffix=auto_suffix, verbose=False)
+        _WARMUP_THREAD = threading.Thread(
+            target=egx.prefetch,
+            name="egx-warmup",
+            daemon=True,
+        )
+        _WARMUP_THREAD.start()
+        return _WARMUP_THREAD
@@ -0,0 +1,149 @@
+"""
+تطبيع العوامل عبر المقطع العرضي (cross-sectional) لكل الأسهم.
+
+كل الدوال بتشتغل على مصفوفة بالشكل (..., n_symbols, n_factors)
+والتطبيع بيتم على محور الأسهم (axis=-2) لكل العوامل مرة واحدة.
+أي أبعاد إضافية في الأول (مثلاً تواريخ الـ rebalance في backtest) بتتعامل كـ batch.
+الناتج دايماً بين 0 و 1 عشان أوزان العوامل تفضل قابلة للمقارنة.
+
+الطرق المتاحة:
+- "minmax"  : min-max عادي (السلوك القديم)
+- "rank"    : ترتيب مئوي (percentile) مع متوسط الترتيب للقيم المتساوية
+- "zscore"  : z-score بعد winsorization عند quantiles ثم قص عند ±z_clip
+- "sector"  : z-score داخل كل قطاع (sector-neutral) ثم نفس تحويل الـ zscore
+"""
+import numpy as np
+
+NORMALIZATION_METHODS = ("minmax", "rank", "zscore", "sector")
+
+
+def _to_batch(values):
+    """
+    (..., n, f) -> (B, n) بحيث كل صف = عامل واحد في مقطع عرضي واحد
+    """
+    arr = np.asarray(values, dtype=float)
+    if arr.ndim == 1:
+        arr = arr[:, None]
+    lead_shape = arr.shape[:-2]
+    n, f = arr.shape[-2], arr.shape[-1]
+    batch = np.moveaxis(arr, -1, -2).reshape(-1, n)
+    return batch, lead_shape, n, f
+
+
+def _from_batch(batch, lead_shape, n, f, squeeze):
+    out = np.moveaxis(batch.reshape(lead_shape + (f, n)), -1, -2)
+    return out[..., 0] if squeeze else out
+
+
+def _minmax(x):
+    with np.errstate(invalid="ignore"):
+        min_v = np.min(np.where(np.isnan(x), np.inf, x), axis=1, keepdims=True)
+        max_v = np.max(np.where(np.isnan(x), -np.inf, x), axis=1, keepdims=True)
+        rng = max_v - min_v
+        degenerate = ~np.isfinite(rng) | (rng == 0)
+        out = (x - min_v) / np.where(degenerate, 1.0, rng)
+    # نفس سلوك _min_max_normalize: لو كل القيم متساوية (أو NaN) → 0.5 للكل
+    return np.where(degenerate, 0.5, out)
+
+
+def _average_rank(x):
+    """
+    ترتيب يبدأ من 0 لكل صف، القيم المتساوية تاخد متوسط ترتيبها، و NaN تفضل NaN
+    """
+    b, n = x.shape
+    order = np.argsort(x, axis=1, kind="stable")
+    xs = np.take_along_axis(x, order, axis=1)
+    pos = np.broadcast_to(np.arange(n), (b, n))
+
+    new_group = np.ones((b, n), dtype=bool)
+    new_group[:, 1:] = xs[:, 1:] != xs[:, :-1]
+    is_last = np.ones((b, n), dtype=bool)
+    is_last[:, :-1] = new_group[:, 1:]
+
+    start = np.maximum.accumulate(np.where(new_group, pos, 0), axis=1)
+    end = np.minimum.accumulate(np.where(is_last, pos, n - 1)[:, ::-1], axis=1)[:, ::-1]
+
+    ranks = np.empty((b, n), dtype=float)
+    np.put_along_axis(ranks, order, (start + end) / 2.0, axis=1)
+    ranks[np.isnan(x)] = np.nan
+    return ranks
+
+
+def _rank(x):
+    n_valid = np.sum(~np.isnan(x), axis=1, keepdims=True)
+    ranks = _average_rank(x)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = ranks / (n_valid - 1)
+    return np.where(n_valid > 1, pct, np.where(np.isnan(x), np.nan, 0.5))
+
+
+def _z_to_unit(z, z_clip):
+    z = np.clip(z, -z_clip, z_clip)
+    return (z + z_clip) / (2.0 * z_clip)
+
+
+def _winsorized_zscore(x, winsor_quantile, z_clip):
+    all_nan = np.all(np.isnan(x), axis=1, keepdims=True)
+    safe = np.where(all_nan, 0.0, x)
+
+    lo = np.nanquantile(safe, winsor_quantile, axis=1, keepdims=True)
+    hi = np.nanquantile(safe, 1.0 - winsor_quantile, axis=1, keepdims=True)
+    xw = np.clip(x, lo, hi)
+
+    mean = np.nanmean(np.where(all_nan, 0.0, xw), axis=1, keepdims=True)
+    std = np.nanstd(np.where(all_nan, 0.0, xw), axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(std > 0, (xw - mean) / np.where(std > 0, std, 1.0), 0.0)
+    return np.where(np.isnan(x), np.nan, _z_to_unit(z, z_clip))
+
+
+def _sector_zscore(x, groups, z_clip):
+    """
+    z-score داخل كل مجموعة (قطاع) باستخدام ضرب مصفوفات مع one-hot للمجموعات
+    بدل loop على القطاعات
+    """
+    _, codes = np.unique(np.asarray(groups).astype(str), return_inverse=True)
+    onehot = np.zeros((x.shape[1], codes.max() + 1))
+    onehot[np.arange(x.shape[1]), codes] = 1.0
+
+    valid = ~np.isnan(x)
+    xv = np.where(valid, x, 0.0)
+    counts = valid.astype(float) @ onehot
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (xv @ onehot) / counts
+        mean_b = np.nan_to_num(mean) @ onehot.T
+        dev = np.where(valid, x - mean_b, 0.0)
+        var = ((dev ** 2) @ onehot) / counts
+        std_b = np.sqrt(np.nan_to_num(var)) @ onehot.T
+        z = np.where(std_b > 0, dev / np.where(std_b > 0, std_b, 1.0), 0.0)
+    return np.where(valid, _z_to_unit(z, z_clip), np.nan)
+
+
+def normalize_cross_section(values, method="minmax", groups=None,
+                            winsor_quantile=0.05, z_clip=3.0):
+    """
+    values: مصفوفة (n_symbols,) أو (..., n_symbols, n_factors)
+    method: واحدة من NORMALIZATION_METHODS
+    groups: قطاع كل سهم (طوله n_symbols) - مطلوب لطريقة "sector"
+    يرجّع مصفوفة بنفس الشكل قيمها بين 0 و 1
+    """
+    if method not in NORMALIZATION_METHODS:
+        raise ValueError(f"طريقة تطبيع غير معروفة: {method}")
+
+    squeeze = np.ndim(values) == 1
+    x, lead_shape, n, f = _to_batch(values)
+    if n == 0:
+        return np.asarray(values, dtype=float)
+
+    if method == "minmax":
+        out = _minmax(x)
+    elif method == "rank":
+        out = _rank(x)
+    elif method == "zscore":
+        out = _winsorized_zscore(x, winsor_quantile, z_clip)
+    else:
+        if groups is None or len(groups) != n:
+            raise ValueError("التطبيع المحايد للقطاعات يحتاج قطاع لكل سهم.")
+        out = _sector_zscore(x, groups, z_clip)
+
+    return _from_batch(out, lead_shape, n, f, squeeze)
@@ -0,0 +1,397 @@
+"""
+سجل العوامل (Factor Registry) لنموذج V2.
+
+كل عامل بيعلن:
+- المدخلات اللي محتاجها (inputs) زي "close" أو "returns" أو "volume"
+- النافذة الزمنية (window) والمعاملات (params)
+- عمود الناتج الخام (output) وعمود الـ score بعد التطبيع (score_column)
+
+المدخلات المشتركة (مصفوفة الأسعار، مصفوفة العوائد، ...) بتتحسب مرة واحدة بس
+داخل FactorContext وبتتشارك بين كل العوامل اللي محتاجاها،
+فإضافة عوامل جديدة ما بتضاعفش تكلفة الـ build.
+
+كل عامل ناتجه الخام متوجّه بحيث "الأعلى = أفضل".
+"""
+import numpy as np
+import pandas as pd
+
+from fast_kernels import max_drawdown, nan_mean_std
+
+TRADING_DAYS = 250
+
+# أوزان العوامل الافتراضية (نفس أوزان V2 الأصلية)
+DEFAULT_FACTOR_WEIGHTS = {
+    "risk": 0.20,
+    "fund": 0.50,
+    "mom": 0.30,
+}
+
+# رمز مؤشر EGX30 على Yahoo
+BENCHMARK_SYMBOL = "^CASE30"
+
+# نوافذ مزيج الزخم كنسبة من نافذة العامل (126 → 21 / 63 / 126 جلسة) وأسماء أعمدتها
+MOM_WINDOW_FRACTIONS = (1 / 6, 1 / 2, 1.0)
+MOM_LABELS = {21: "1m", 63: "3m", 126: "6m"}
+
+# أعمدة العرض كنسب مئوية (بتتحسب مرة واحدة في score_factors مش في الواجهة)
+PERCENT_COLUMNS = {
+    "annual_return": "annual_return_pct",
+    "annual_vol": "annual_vol_pct",
+}
+
+
+# ----------------------------------------------------------------------
+# أدوات على مصفوفة (dates x symbols) فيها NaN
+# ----------------------------------------------------------------------
+def nth_last_valid(values, n):
+    """
+    لكل عمود: القيمة رقم n من آخر قيمة صالحة (n=1 هي آخر قيمة).
+    بيطابق s.dropna().iloc[-n] لكل سهم لوحده بدون loop على الأسهم.
+    """
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=0)
+    rank_from_end = counts - np.cumsum(valid, axis=0) + 1
+    mask = valid & (rank_from_end == n)
+    out = np.where(mask, values, 0.0).sum(axis=0)
+    return np.where(mask.any(axis=0), out, np.nan)
+
+
+# ----------------------------------------------------------------------
+# المدخلات المشتركة
+# ----------------------------------------------------------------------
+def _input_close(ctx):
+    return pd.DataFrame(ctx.history).sort_index()
+
+
+def _input_returns(ctx):
+    # ffill قبل pct_change عشان العائد بعد فجوة يطابق s.dropna().pct_change()
+    # ثم نرجّع NaN في أيام الفجوة نفسها
+    close = ctx.get("close")
+    returns = close.ffill().pct_change(fill_method=None)
+    return returns.where(close.notna())
+
+
+def _input_volume(ctx):
+    volume_history = ctx.volume_loader(list(ctx.history.keys())) if ctx.volume_loader else None
+    if not volume_history:
+        raise ValueError("هذا العامل يحتاج بيانات حجم التداول (Volume).")
+    close = ctx.get("close")
+    return pd.DataFrame(volume_history).reindex(index=close.index, columns=close.columns)
+
+
+def _input_traded_value(ctx):
+    return ctx.get("close") * ctx.get("volume")
+
+
+def _input_benchmark_returns(ctx):
+    if ctx.benchmark_loader is None:
+        raise ValueError("هذا العامل يحتاج سلسلة أسعار المؤشر (EGX30).")
+    bench = ctx.benchmark_loader()
+    if bench is None or len(bench) < 2:
+        raise ValueError("تعذر تحميل أسعار المؤشر (EGX30).")
+    close = ctx.get("close")
+    bench = bench.reindex(close.index).ffill()
+    return bench.pct_change(fill_method=None)
+
+
+def _input_fundamentals(ctx):
+    if ctx.fundamentals_loader is None:
+        return {}
+    return ctx.fundamentals_loader(list(ctx.history.keys()))
+
+
+INPUTS = {
+    "close": _input_close,
+    "returns": _input_returns,
+    "volume": _input_volume,
+    "traded_value": _input_traded_value,
+    "benchmark_returns": _input_benchmark_returns,
+    "fundamentals": _input_fundamentals,
+}
+
+
+class FactorContext:
+    """
+    يحمل تاريخ الأسعار ويحسب المدخلات المشتركة عند الطلب (lazy) مرة واحدة فقط.
+    close: مصفوفة إغلاق جاهزة (مثلاً بعد فحص الجودة) بدل بناءها من history
+    """
+
+    def __init__(self, history, volume_loader=None, fundamentals_loader=None, benchmark_loader=None,
+                 close=None):
+        self.history = history
+        self.volume_loader = volume_loader
+        self.fundamentals_loader = fundamentals_loader
+        self.benchmark_loader = benchmark_loader
+        self._cache = {}
+        if close is not None:
+            self._cache["close"] = close
+
+    def get(self, name):
+        if name not in self._cache:
+            if name not in INPUTS:
+                raise ValueError(f"مدخل غير معروف للعوامل: {name}")
+            self._cache[name] = INPUTS[name](self)
+        return self._cache[name]
+
+    def computed_inputs(self):
+        return list(self._cache.keys())
+
+
+# ----------------------------------------------------------------------
+# تعريف العامل والسجل
+# ----------------------------------------------------------------------
+class Factor:
+    def __init__(self, name, inputs, compute, output, score_column, window=None,
+                 params=None, empty_error=None, default_value=None):
+        """
+        compute(ctx, window, **params) -> DataFrame (index=symbol) فيه عمود output
+        وأي أعمدة إضافية للعرض.
+        default_value: لو محدد، الأسهم اللي مالهاش قيمة تاخد القيمة دي بدل الاستبعاد.
+        """
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.compute = compute
+        self.output = output
+        self.score_column = score_column
+        self.window = window
+        self.params = dict(params or {})
+        self.empty_error = empty_error or f"تعذر حساب العامل: {name}"
+        self.default_value = default_value
+
+    def run(self, ctx, params=None):
+        kwargs = dict(self.params)
+        kwargs.update(params or {})
+        window = kwargs.pop("window", self.window)
+        return self.compute(ctx, window, **kwargs)
+
+
+FACTOR_REGISTRY = {}
+
+
+def register_factor(factor):
+    FACTOR_REGISTRY[factor.name] = factor
+    return factor
+
+
+def get_factor(name):
+    if name not in FACTOR_REGISTRY:
+        raise ValueError(f"عامل غير مسجل: {name}")
+    return FACTOR_REGISTRY[name]
+
+
+# ----------------------------------------------------------------------
+# العوامل المدمجة
+# ----------------------------------------------------------------------
+def _compute_risk(ctx, window):
+    returns = ctx.get("returns")
+    if window is not None:
+        returns = returns.iloc[-window:]
+
+    mean_daily, daily_vol = nan_mean_std(returns.to_numpy(dtype=float))
+    mean_daily = pd.Series(mean_daily, index=returns.columns)
+    daily_vol = pd.Series(daily_vol, index=returns.columns)
+
+    annual_return = (1 + mean_daily) ** TRADING_DAYS - 1
+    annual_vol = daily_vol * np.sqrt(TRADING_DAYS)
+
+    df = pd.DataFrame({
+        "annual_return": annual_return,
+        "annual_vol": annual_vol,
+        "risk_score_raw": annual_return / (annual_vol + 1e-6),
+    })
+    ok = df["annual_return"].notna() & df["annual_vol"].notna() & (df["annual_vol"] != 0)
+    return df[ok]
+
+
+def _compute_momentum(ctx, window, windows=None, blend=(0.5, 0.3, 0.2), labels=None, min_history=22):
+    """
+    windows: نوافذ المزيج صراحةً، والافتراضي مشتق من window (MOM_WINDOW_FRACTIONS)
+    labels: أسماء الأعمدة mom_<label>، والافتراضي 1m/3m/6m أو عدد الجلسات (مثلاً 40d)
+    """
+    if windows is None:
+        windows = tuple(max(int(round(window * f)), 1) for f in MOM_WINDOW_FRACTIONS)
+    if labels is None:
+        labels = tuple(MOM_LABELS.get(w, f"{w}d") for w in windows)
+    close = ctx.get("close")
+    values = close.values
+    counts = (~np.isnan(values)).sum(axis=0)
+    last = nth_last_valid(values, 1)
+
+    df = pd.DataFrame(index=close.columns)
+    score = np.zeros(len(close.columns))
+    any_valid = np.zeros(len(close.columns), dtype=bool)
+
+    for w, b, label in zip(windows, blend, labels):
+        prev = nth_last_valid(values, w)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mom = np.where((counts > w) & (prev != 0), last / prev - 1.0, np.nan)
+        df[f"mom_{label}"] = mom
+        # استخدام قيمة بديلة (0) إذا كانت القيم غير موجودة
+        score += b * np.nan_to_num(mom, nan=0.0)
+        any_valid |= ~np.isnan(mom)
+
+    df["mom_score_raw"] = score
+    return df[(counts >= min_history) & any_valid]
+
+
+def _compute_fund(ctx, window):
+    scores = ctx.get("fundamentals")
+    symbols = list(ctx.history.keys())
+    return pd.DataFrame(
+        {"fund_score_raw": [scores.get(sym, 0.5) for sym in symbols]},
+        index=symbols,
+    )
+
+
+def _compute_rsi(ctx, window):
+    close = ctx.get("close").ffill().iloc[-(window + 1) * 4:]
+    delta = close.diff()
+    gain = delta.clip(lower=0).ewm(alpha=1.0 / window, adjust=False).mean()
+    loss = (-delta.clip(upper=0)).ewm(alpha=1.0 / window, adjust=False).mean()
+    rs = gain.iloc[-1] / loss.iloc[-1].replace(0, np.nan)
+    rsi = 100 - 100 / (1 + rs)
+    rsi = rsi.where(loss.iloc[-1] != 0, 100.0)
+    return pd.DataFrame({"rsi": rsi, "rsi_score_raw": rsi}).dropna()
+
+
+def _compute_volume_trend(ctx, window, short_window=20):
+    volume = ctx.get("volume").iloc[-window:]
+    short = volume.iloc[-short_window:].mean()
+    long_ = volume.mean()
+    trend = short / long_.replace(0, np.nan) - 1.0
+    return pd.DataFrame({"volume_trend_raw": trend}).dropna()
+
+
+def _compute_drawdown(ctx, window):
+    close = ctx.get("close").ffill().iloc[-window:]
+    max_dd = pd.Series(max_drawdown(close.to_numpy(dtype=float)), index=close.columns)
+    # أقل هبوط = أفضل (قيمة أقرب للصفر)
+    return pd.DataFrame({"max_drawdown": max_dd, "drawdown_score_raw": max_dd}).dropna()
+
+
+def _compute_beta(ctx, window):
+    returns = ctx.get("returns").iloc[-window:]
+    bench = ctx.get("benchmark_returns").iloc[-window:]
+
+    valid = returns.notna() & bench.notna().values[:, None]
+    r = returns.where(valid)
+    b = pd.DataFrame(
+        np.where(valid, bench.values[:, None], np.nan),
+        index=returns.index,
+        columns=returns.columns,
+    )
+    cov = ((r - r.mean()) * (b - b.mean())).sum() / (valid.sum() - 1)
+    var_b = ((b - b.mean()) ** 2).sum() / (valid.sum() - 1)
+    beta = cov / var_b.replace(0, np.nan)
+    # بيتا أقل = مخاطرة سوقية أقل
+    return pd.DataFrame({"beta": beta, "beta_score_raw": -beta}).dropna()
+
+
+def _compute_liquidity(ctx, window):
+    traded_value = ctx.get("traded_value").iloc[-window:]
+    adtv = traded_value.mean()
+    return pd.DataFrame({
+        "avg_traded_value": adtv,
+        "liquidity_score_raw": np.log1p(adtv),
+    }).dropna()
+
+
+register_factor(Factor(
+    "risk", inputs=("returns",), compute=_compute_risk,
+    output="risk_score_raw", score_column="risk_score",
+    empty_error="تعذر حساب العائد/المخاطرة للأسهم.",
+))
+register_factor(Factor(
+    "fund", inputs=("fundamentals",), compute=_compute_fund,
+    output="fund_score_raw", score_column="fund_score", default_value=0.5,
+))
+register_factor(Factor(
+    "mom", inputs=("close",), compute=_compute_momentum, window=126,
+    output="mom_score_raw", score_column="mom_score",
+    empty_error="تعذر حساب الزخم السعري للأسهم.",
+))
+register_factor(Factor(
+    "rsi", inputs=("close",), compute=_compute_rsi, window=14,
+    output="rsi_score_raw", score_column="rsi_score",
+))
+register_factor(Factor(
+    "volume_trend", inputs=("volume",), compute=_compute_volume_trend, window=120,
+    output="volume_trend_raw", score_column="volume_trend_score",
+))
+register_factor(Factor(
+    "drawdown", inputs=("close",), compute=_compute_drawdown, window=126,
+    output="drawdown_score_raw", score_column="drawdown_score",
+))
+register_factor(Factor(
+    "beta", inputs=("returns", "benchmark_returns"), compute=_compute_beta, window=126,
+    output="beta_score_raw", score_column="beta_score",
+))
+register_factor(Factor(
+    "liquidity", inputs=("traded_value",), compute=_compute_liquidity, window=20,
+    output="liquidity_score_raw", score_column="liquidity_score",
+))
+
+
+# ----------------------------------------------------------------------
+# إعدادات العوامل الفعّالة
+# ----------------------------------------------------------------------
+class FactorConfig:
+    """
+    weights: dict {factor_name: weight} - العوامل ذات الوزن 0 مش بتتحسب أصلاً
+    params: dict {factor_name: {param: value}} لتعديل النافذة أو معاملات العامل
+        مثال: {"mom": {"window": 252}} (مزيج 42 / 126 / 252 جلسة)
+        أو {"mom": {"windows": (21, 63), "blend": (0.6, 0.4), "labels": ("1m", "3m")}}
+    """
+
+    def __init__(self, weights=None, params=None):
+        self.weights = dict(DEFAULT_FACTOR_WEIGHTS if weights is None else weights)
+        self.params = {k: dict(v) for k, v in (params or {}).items()}
+        for name in self.weights:
+            get_factor(name)
+
+    def active_factors(self):
+        return [get_factor(name) for name, w in self.weights.items() if w != 0]
+
+    def required_inputs(self):
+        needed = []
+        for factor in self.active_factors():
+            for name in factor.inputs:
+                if name not in needed:
+                    needed.append(name)
+        return needed
+
+    def key(self):
+        """
+        تمثيل ثابت للإعدادات (يستخدم كمفتاح للـ cache أو المقارنة)
+        """
+        return (
+            tuple(sorted(self.weights.items())),
+            tuple(sorted((k, tuple(sorted(v.items()))) for k, v in self.params.items())),
+        )
+
+
+def compute_factors(ctx, config):
+    """
+    يحسب العوامل الفعّالة فقط ويرجّع جدول واحد (عمود symbol + أعمدة كل عامل).
+    الأسهم اللي ناقصها عامل (بدون default_value) بتتستبعد - زي الـ inner merge القديم.
+    """
+    frames = []
+    for factor in config.active_factors():
+        df = factor.run(ctx, config.params.get(factor.name))
+        if df is None or df.empty:
+            raise ValueError(factor.empty_error)
+        frames.append((factor, df))
+
+    symbols = list(ctx.history.keys())
+    factor_df = pd.DataFrame(index=pd.Index(symbols, name="symbol"))
+    for factor, df in frames:
+        factor_df = factor_df.join(df, how="left")
+        if factor.default_value is not None:
+            factor_df[factor.output] = factor_df[factor.output].fillna(factor.default_value)
+
+    outputs = [factor.output for factor, _ in frames]
+    factor_df = factor_df.dropna(subset=outputs)
+    if factor_df.empty:
+        raise ValueError("لم يتبق أسهم مشتركة بين العوامل المختارة.")
+
+    return factor_df.reset_index()
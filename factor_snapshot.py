@@ -0,0 +1,281 @@
+"""
+Snapshot يومي محسوب مسبقاً لجدول العوامل لكل الكون.
+
+الـ job بيشتغل بعد إغلاق البورصة المصرية (الأحد – الخميس، 14:30 بتوقيت القاهرة):
+- يحمّل أسعار كل الأسهم (طلب مجمع واحد)
+- يحسب جدول العوامل الكامل (risk / fund / momentum / total_score)
+- يكتب ملف snapshot بإصدار (schema version) وتاريخ (as_of)
+
+التطبيق و AIPortfolioBuilderV2 بيقروا آخر snapshot ويفلتروه على الكون المختار فقط.
+
+صيغة الملف: Arrow IPC (عمودية) لو pyarrow متاح – بتتفتح memory-mapped فالقراءة
+ما بتنسخش البيانات، والفلترة على الكون بتحصل على الجدول قبل التحويل لـ pandas.
+من غير pyarrow بنكتب ونقرا CSV زي الأول.
+
+تشغيل مرة واحدة (مثلاً من cron: 45 14 * * 0-4):
+    python factor_snapshot.py
+تشغيل كـ daemon ينتظر إغلاق كل يوم تداول:
+    python factor_snapshot.py --loop
+"""
+import argparse
+import datetime as dt
+import glob
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR = os.environ.get("EGX_SNAPSHOT_DIR", "snapshots")
+
+# مواعيد البورصة المصرية
+EGX_TIMEZONE = "Africa/Cairo"
+EGX_CLOSE_TIME = dt.time(14, 30)
+EGX_TRADING_WEEKDAYS = (6, 0, 1, 2, 3)  # الأحد .. الخميس
+SNAPSHOT_DELAY_MINUTES = 15
+
+SNAPSHOT_FORMATS = ("arrow", "csv")
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ----------------------------------------------------------------------
+# جداول Arrow (مع fallback لـ DataFrame لو pyarrow مش متاح)
+# ----------------------------------------------------------------------
+def to_arrow(factor_df):
+    """
+    جدول العوامل كـ pyarrow.Table (أو نفس الـ DataFrame لو pyarrow مش متاح)
+    """
+    if factor_df is None or not _has_pyarrow():
+        return factor_df
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(factor_df, preserve_index=False)
+
+
+def column_names(table):
+    """
+    أسماء الأعمدة لـ pyarrow.Table أو DataFrame
+    """
+    if isinstance(table, pd.DataFrame):
+        return list(table.columns)
+    return list(table.column_names)
+
+
+def snapshot_rows(snapshot, symbols):
+    """
+    صفوف الأسهم المطلوبة من snapshot (DataFrame أو pyarrow.Table) كـ DataFrame بنفس ترتيب الـ snapshot
+    """
+    if isinstance(snapshot, pd.DataFrame):
+        return snapshot[snapshot["symbol"].isin(symbols)]
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    value_set = pa.array(list(symbols), type=snapshot.schema.field("symbol").type)
+    return snapshot.filter(pc.is_in(snapshot["symbol"], value_set=value_set)).to_pandas()
+
+
+def _write_arrow(factor_df, path):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(factor_df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_arrow(path):
+    """
+    جدول Arrow memory-mapped: الأعمدة بتشاور على صفحات الملف مباشرة من غير نسخ
+    """
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _snapshot_paths(as_of, out_dir, fmt="csv"):
+    base = os.path.join(out_dir, f"factors_v{SNAPSHOT_VERSION}_{as_of}")
+    return f"{base}.{fmt}", base + ".json"
+
+
+def write_snapshot(factor_df, as_of, lookback_days, out_dir=SNAPSHOT_DIR, fmt=None):
+    """
+    يكتب الـ snapshot (Arrow أو CSV + ملف meta JSON) بشكل atomic:
+    نكتب في ملف مؤقت ثم os.replace عشان التطبيق ما يقراش ملف نصه مكتوب.
+    fmt: "arrow" / "csv" (الافتراضي arrow لو pyarrow متاح)
+    """
+    fmt = fmt or ("arrow" if _has_pyarrow() else "csv")
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError(f"صيغة snapshot غير معروفة: {fmt}")
+    if fmt == "arrow" and not _has_pyarrow():
+        raise ValueError("صيغة Arrow تحتاج pyarrow.")
+
+    os.makedirs(out_dir, exist_ok=True)
+    data_path, meta_path = _snapshot_paths(as_of, out_dir, fmt)
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "as_of": str(as_of),
+        "lookback_days": int(lookback_days),
+        "format": fmt,
+        "created_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "symbols": factor_df["symbol"].tolist(),
+    }
+
+    tmp_data = data_path + ".tmp"
+    if fmt == "arrow":
+        _write_arrow(factor_df, tmp_data)
+    else:
+        factor_df.to_csv(tmp_data, index=False)
+    os.replace(tmp_data, data_path)
+
+    tmp_meta = meta_path + ".tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_meta, meta_path)
+
+    return data_path
+
+
+def load_latest_snapshot(out_dir=SNAPSHOT_DIR, lookback_days=None, max_age_days=None, as_arrow=False):
+    """
+    يرجّع (factor_df, meta) لآخر snapshot بنفس الإصدار أو None.
+    lookback_days: لو محدد، لازم الـ snapshot يكون محسوب بنفس عدد الأيام.
+    max_age_days: لو محدد، نتجاهل snapshot أقدم من كده.
+    as_arrow: لو الـ snapshot بصيغة Arrow نرجّع الـ pyarrow.Table الممسوح في الذاكرة
+    زي ما هو (AIPortfolioBuilderV2 بيفلتره من غير تحويل الجدول كله لـ pandas).
+    النتيجة بتتخزن في الذاكرة ومفتاحها (المسار + mtime) فالقراءة التانية مجانية.
+    """
+    pattern = os.path.join(out_dir, f"factors_v{SNAPSHOT_VERSION}_*.json")
+    meta_paths = sorted(glob.glob(pattern), reverse=True)
+
+    for meta_path in meta_paths:
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        if lookback_days is not None and int(meta.get("lookback_days", -1)) != int(lookback_days):
+            continue
+
+        if max_age_days is not None:
+            as_of = dt.date.fromisoformat(meta["as_of"])
+            if (dt.date.today() - as_of).days > max_age_days:
+                return None
+
+        fmt = meta.get("format", "csv")
+        data_path = meta_path[:-len(".json")] + "." + fmt
+        if not os.path.exists(data_path) or (fmt == "arrow" and not _has_pyarrow()):
+            continue
+
+        key = (data_path, os.path.getmtime(data_path), fmt == "arrow" and not as_arrow)
+        with _CACHE_LOCK:
+            factor_df = _CACHE.get(key)
+            if factor_df is None:
+                if fmt == "arrow":
+                    factor_df = _read_arrow(data_path)
+                    if not as_arrow:
+                        factor_df = factor_df.to_pandas()
+                else:
+                    factor_df = pd.read_csv(data_path, float_precision="round_trip")
+                # نحتفظ بآخر snapshot بس (بالشكلين لو اتطلب كـ Arrow و DataFrame)
+                for old in [k for k in _CACHE if k[:2] != key[:2]]:
+                    del _CACHE[old]
+                _CACHE[key] = factor_df
+
+        return factor_df, meta
+
+    return None
+
+
+def run_snapshot_job(universe=None, lookback_days=180, out_dir=SNAPSHOT_DIR, verbose=True):
+    """
+    يحسب جدول العوامل الكامل للكون ويكتبه كـ snapshot.
+    يرجّع مسار ملف الـ snapshot.
+    """
+    from ai_portfolio_builder_v2 import AIPortfolioBuilderV2
+    from egx_universe import DEFAULT_UNIVERSE
+
+    universe = DEFAULT_UNIVERSE if universe is None else list(universe)
+    builder = AIPortfolioBuilderV2(universe, lookback_days=lookback_days, verbose=verbose)
+
+    # طلب مجمع واحد لكل الأسهم بدل طلب لكل سهم
+    builder.egx.prefetch(universe)
+
+    factor_df = builder.compute_factor_table()
+    factor_df = builder.score_factors(factor_df).reset_index(drop=True)
+
+    as_of = _last_bar_date(builder, factor_df)
+    path = write_snapshot(factor_df, as_of, lookback_days, out_dir=out_dir)
+    if verbose:
+        print(f"✅ snapshot written: {path} ({len(factor_df)} symbols)")
+    return path
+
+
+def _last_bar_date(builder, factor_df):
+    """
+    تاريخ آخر شمعة في البيانات (وليس تاريخ تشغيل الـ job)
+    """
+    last_dates = []
+    for sym in factor_df["symbol"]:
+        s = builder.egx.get_price(sym)
+        if s is not None and not s.empty:
+            last_dates.append(pd.Timestamp(s.index[-1]).date())
+    return max(last_dates) if last_dates else dt.date.today()
+
+
+def seconds_until_next_run(now=None):
+    """
+    عدد الثواني لحد ميعاد الـ job القادم (إغلاق EGX + SNAPSHOT_DELAY_MINUTES)
+    """
+    from zoneinfo import ZoneInfo
+
+    tz = ZoneInfo(EGX_TIMEZONE)
+    now = now.astimezone(tz) if now is not None else dt.datetime.now(tz)
+    run_time = (
+        dt.datetime.combine(now.date(), EGX_CLOSE_TIME, tzinfo=tz)
+        + dt.timedelta(minutes=SNAPSHOT_DELAY_MINUTES)
+    )
+
+    candidate = run_time
+    while candidate <= now or candidate.weekday() not in EGX_TRADING_WEEKDAYS:
+        candidate += dt.timedelta(days=1)
+
+    return (candidate - now).total_seconds()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EGX daily factor snapshot job")
+    parser.add_argument("--out-dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--lookback-days", type=int, default=180)
+    parser.add_argument("--loop", action="store_true", help="run after every EGX close")
+    args = parser.parse_args()
+
+    if not args.loop:
+        run_snapshot_job(lookback_days=args.lookback_days, out_dir=args.out_dir)
+        return
+
+    while True:
+        wait = seconds_until_next_run()
+        print(f"next snapshot in {wait / 3600:.1f}h")
+        time.sleep(wait)
+        try:
+            run_snapshot_job(lookback_days=args.lookback_days, out_dir=args.out_dir)
+        except Exception as e:
+            print(f"❌ snapshot job failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Kernels للحلقات المتسلسلة اللي NumPy ما يقدرش يعملها vectorized بالكامل على محور الزمن:
+- إحصاءات النافذة (mean/std مع تجاهل NaN) لكل سهم: على النافذة الأخيرة بس
+  (nan_mean_std) أو نافذة متحركة على كل التاريخ (rolling_mean_std)
+- أقصى تراجع (running max) لكل سلسلة
+- water-filling لحدود الأوزان
+- الـ greedy لتوزيع الـ lots الإضافية في تخصيص الأسهم
+
+لو numba متاح كل kernel بيتعمله JIT (مع cache على الديسك) عند أول استخدام، وإلا
+بنستخدم نسخة NumPy (أو pandas rolling للنافذة المتحركة، أو الحلقة نفسها في Python
+للـ kernels اللي ما ينفعش تتعمل vectorized). numba اختياري: pip install -r requirements-optional.txt
+الاستيراد نفسه خفيف: numba ما بيتحملش غير مع أول kernel.
+EGX_NUMBA=0 بيقفل numba حتى لو متاح.
+
+المقارنة بين الاتنين: python bench_kernels.py
+"""
+import os
+import threading
+
+import numpy as np
+
+BACKENDS = ("numba", "numpy")
+
+USE_NUMBA = os.environ.get("EGX_NUMBA", "1") != "0"
+
+_NUMBA = None
+_COMPILED = {}
+_LOCK = threading.Lock()
+
+
+def _numba():
+    """
+    module الـ numba أو False لو مش متاح (بيتحمل مرة واحدة)
+    """
+    global _NUMBA
+    if _NUMBA is None:
+        try:
+            import numba
+        except ImportError:
+            numba = False
+        _NUMBA = numba if USE_NUMBA else False
+    return _NUMBA
+
+
+def has_numba():
+    return bool(_numba())
+
+
+def default_backend():
+    return "numba" if has_numba() else "numpy"
+
+
+# ----------------------------------------------------------------------
+# الحلقات (مكتوبة بشكل يقدر numba يعمله compile في nopython mode)
+# ----------------------------------------------------------------------
+def _mean_std_loop(values, ddof):
+    n_rows, n_cols = values.shape
+    count = np.zeros(n_cols)
+    total = np.zeros(n_cols)
+    for i in range(n_rows):
+        for j in range(n_cols):
+            v = values[i, j]
+            if v == v:
+                count[j] += 1.0
+                total[j] += v
+
+    mean = np.full(n_cols, np.nan)
+    for j in range(n_cols):
+        if count[j] > 0:
+            mean[j] = total[j] / count[j]
+
+    sq = np.zeros(n_cols)
+    for i in range(n_rows):
+        for j in range(n_cols):
+            v = values[i, j]
+            if v == v:
+                d = v - mean[j]
+                sq[j] += d * d
+
+    std = np.full(n_cols, np.nan)
+    for j in range(n_cols):
+        if count[j] - ddof > 0:
+            std[j] = np.sqrt(sq[j] / (count[j] - ddof))
+    return mean, std
+
+
+def _rolling_mean_std_loop(values, window, min_periods, ddof):
+    # Welford بإضافة القيمة الداخلة وشيل الخارجة من النافذة (زي pandas rolling)
+    n_rows, n_cols = values.shape
+    mean = np.full((n_rows, n_cols), np.nan)
+    std = np.full((n_rows, n_cols), np.nan)
+    for j in range(n_cols):
+        count = 0.0
+        avg = 0.0
+        m2 = 0.0
+        for i in range(n_rows):
+            v = values[i, j]
+            if v == v:
+                count += 1.0
+                delta = v - avg
+                avg += delta / count
+                m2 += delta * (v - avg)
+            if i >= window:
+                old = values[i - window, j]
+                if old == old:
+                    count -= 1.0
+                    if count > 0:
+                        delta = old - avg
+                        avg -= delta / count
+                        m2 -= delta * (old - avg)
+                    else:
+                        avg = 0.0
+                        m2 = 0.0
+            if count > 0 and count >= min_periods:
+                mean[i, j] = avg
+                if count - ddof > 0:
+                    std[i, j] = np.sqrt(max(m2 / (count - ddof), 0.0))
+    return mean, std
+
+
+def _max_drawdown_loop(values, start):
+    n_rows, n_cols = values.shape
+    running = np.full(n_cols, start)
+    worst = np.full(n_cols, np.nan)
+    for i in range(n_rows):
+        for j in range(n_cols):
+            v = values[i, j]
+            if v != v:
+                continue
+            if not running[j] >= v:
+                running[j] = v
+            dd = v / running[j] - 1.0
+            if not worst[j] <= dd:
+                worst[j] = dd
+    return worst
+
+
+def _cap_weights_loop(w, caps, tol):
+    n = w.shape[0]
+    fixed = np.zeros(n, dtype=np.bool_)
+    for _ in range(n):
+        excess = 0.0
+        any_over = False
+        for i in range(n):
+            if w[i] > caps[i] + tol:
+                excess += w[i] - caps[i]
+                w[i] = caps[i]
+                fixed[i] = True
+                any_over = True
+        if not any_over:
+            break
+
+        free_sum = 0.0
+        for i in range(n):
+            if not fixed[i] and w[i] < caps[i] - tol:
+                free_sum += w[i]
+        if free_sum <= 0:
+            break
+
+        ratio = excess / free_sum
+        for i in range(n):
+            if not fixed[i] and w[i] < caps[i] - tol:
+                w[i] += w[i] * ratio
+    return w
+
+
+def _greedy_lots_loop(order, shortfall, lot_cost, max_values, n_lots, cash):
+    for k in range(order.shape[0]):
+        i = order[k]
+        if shortfall[i] <= 0:
+            break
+        if lot_cost[i] <= cash and (n_lots[i] + 1) * lot_cost[i] <= max_values[i] + 1e-9:
+            n_lots[i] += 1
+            cash -= lot_cost[i]
+    return n_lots
+
+
+# ----------------------------------------------------------------------
+# نسخ NumPy
+# ----------------------------------------------------------------------
+def _mean_std_numpy(values, ddof):
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, values, 0.0).sum(axis=0) / count
+        dev = np.where(valid, values - mean, 0.0)
+        var = (dev * dev).sum(axis=0) / (count - ddof)
+    return mean, np.where(count - ddof > 0, np.sqrt(var), np.nan)
+
+
+def _rolling_mean_std_numpy(values, window, min_periods, ddof):
+    # pandas rolling (Cython) أسرع من أي صياغة vectorized بالـ cumsum وبنفس النتيجة
+    import pandas as pd
+
+    rolling = pd.DataFrame(values).rolling(window, min_periods=int(min_periods))
+    return rolling.mean().to_numpy(), rolling.std(ddof=int(ddof)).to_numpy()
+
+
+def _max_drawdown_numpy(values, start):
+    with np.errstate(invalid="ignore"):
+        running = np.fmax.accumulate(np.vstack([np.full((1, values.shape[1]), start), values]), axis=0)[1:]
+        dd = values / running - 1.0
+    dd = np.where(np.isnan(dd), np.inf, dd).min(axis=0)
+    return np.where(np.isinf(dd), np.nan, dd)
+
+
+def _cap_weights_numpy(w, caps, tol):
+    fixed = np.zeros(w.shape, dtype=bool)
+
+    for _ in range(len(w)):
+        over = w > caps + tol
+        if not over.any():
+            break
+
+        excess = float((w[over] - caps[over]).sum())
+        w[over] = caps[over]
+        fixed |= over
+
+        free = ~fixed & (w < caps - tol)
+        free_sum = float(w[free].sum())
+        if free_sum <= 0:
+            break
+
+        w[free] += excess * w[free] / free_sum
+
+    return w
+
+
+_KERNELS = {
+    "mean_std": (_mean_std_loop, _mean_std_numpy),
+    "rolling_mean_std": (_rolling_mean_std_loop, _rolling_mean_std_numpy),
+    "max_drawdown": (_max_drawdown_loop, _max_drawdown_numpy),
+    "cap_weights": (_cap_weights_loop, _cap_weights_numpy),
+    # ما لهاش نسخة vectorized: الـ fallback هو نفس الحلقة في Python
+    "greedy_lots": (_greedy_lots_loop, _greedy_lots_loop),
+}
+
+
+def get_kernel(name, backend=None):
+    """
+    الدالة الفعلية للـ kernel على backend معين ("numba" / "numpy").
+    لو numba مش متاح بنرجع نسخة NumPy.
+    """
+    backend = backend or default_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"backend غير معروف: {backend}")
+
+    loop, fallback = _KERNELS[name]
+    if backend == "numpy" or not has_numba():
+        return fallback
+
+    with _LOCK:
+        compiled = _COMPILED.get(name)
+        if compiled is None:
+            compiled = _COMPILED[name] = _numba().njit(cache=True)(loop)
+    return compiled
+
+
+# ----------------------------------------------------------------------
+# الواجهة العامة
+# ----------------------------------------------------------------------
+def nan_mean_std(values, ddof=1, backend=None):
+    """
+    متوسط وانحراف معياري لكل عمود في مصفوفة (time x series) مع تجاهل NaN
+    (زي DataFrame.mean() / DataFrame.std()). العمود بدون قيم كفاية = NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    return get_kernel("mean_std", backend)(values, float(ddof))
+
+
+def rolling_mean_std(values, window, min_periods=None, ddof=1, backend=None):
+    """
+    متوسط وانحراف معياري متحرك (نافذة window صف) لكل عمود في مصفوفة (time x series)
+    مع تجاهل NaN، زي DataFrame.rolling(window, min_periods).mean() / .std().
+    يرجّع (mean, std) بنفس شكل values. min_periods: أقل عدد قيم صالحة (الافتراضي window).
+    """
+    values = np.asarray(values, dtype=float)
+    window = int(window)
+    if window < 1:
+        raise ValueError("النافذة لازم تكون 1 أو أكتر.")
+    min_periods = window if min_periods is None else int(min_periods)
+    return get_kernel("rolling_mean_std", backend)(values, window, float(min_periods), float(ddof))
+
+
+def max_drawdown(values, start=-np.inf, backend=None):
+    """
+    أقصى تراجع لكل عمود في مصفوفة قيم (time x series) أو لسلسلة واحدة (1D).
+    NaN بيتساب (الـ running max بيكمل من آخر قيمة صالحة). start: قيمة بداية
+    بتدخل في الـ running max (مثلاً قيمة المحفظة الابتدائية في المحاكاة).
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        return float(max_drawdown(values[:, None], start, backend)[0])
+    return get_kernel("max_drawdown", backend)(values, float(start))
+
+
+def cap_weights(weights, caps, tol=1e-12, backend=None):
+    """
+    Water-filling: انظر portfolio_allocation.cap_weights
+    """
+    w = np.array(weights, dtype=float)
+    caps = np.ascontiguousarray(np.broadcast_to(np.asarray(caps, dtype=float), w.shape))
+    return get_kernel("cap_weights", backend)(w, caps, float(tol))
+
+
+def greedy_lots(order, shortfall, lot_cost, max_values, n_lots, cash, backend=None):
+    """
+    يشتري lot إضافي لكل سهم بترتيب order طالما فيه كاش وما اتعداش max_values.
+    n_lots بيتعدل في مكانه وبيترجع.
+    """
+    return get_kernel("greedy_lots", backend)(
+        np.asarray(order, dtype=np.int64),
+        np.asarray(shortfall, dtype=float),
+        np.ascontiguousarray(lot_cost, dtype=float),
+        np.ascontiguousarray(max_values, dtype=float),
+        n_lots,
+        float(cash),
+    )
@@ -0,0 +1,202 @@
+"""
+تنفيذ مرحلة العوامل على أكتر من عملية (process) للأكوان الكبيرة والتاريخ الطويل.
+
+- مصفوفات الإغلاق والحجم (dates x symbols) بتتكتب مرة واحدة في shared memory،
+  وكل worker بيقرأ الجزء بتاعه منها بدون نسخ أو pickling للبيانات
+- الأسهم بتتقسم شرائح (shards) متصلة بنفس ترتيب الكون، ونتايج الشرائح بتتجمع بنفس
+  الترتيب، فالجدول النهائي مطابق bit-for-bit للحساب المتسلسل (كل العوامل بتتحسب
+  عمود عمود، والتطبيع عبر الكون بيحصل بعد التجميع في score_factors)
+- execution="auto" بيختار التوازي بس لما حجم المسألة يستاهل تكلفة تشغيل العمليات
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from factor_registry import FactorContext, compute_factors
+
+# "stream" (انظر streaming_factors) بيتحسب على دفعات متسلسلة، فهنا بيتعامل زي serial
+EXECUTION_MODES = ("auto", "serial", "parallel", "stream")
+
+# أقل حجم مسألة (عدد خلايا المصفوفات اللي هتتحسب) يستاهل التوازي في وضع auto
+PARALLEL_MIN_CELLS = 2_000_000
+# أقل عدد أسهم في الشريحة الواحدة (تقسيم الكون)
+MIN_SHARD_SYMBOLS = 64
+# أقل عدد تواريخ rebalance في الشريحة الواحدة (تقسيم الـ backtest)
+MIN_SHARD_DATES = 4
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def choose_execution(n_cells, n_items, execution="auto", workers=None, min_shard=MIN_SHARD_SYMBOLS):
+    """
+    يرجّع ("serial" أو "parallel", عدد الشرائح)
+    n_cells: حجم المسألة الكلي، n_items: عدد العناصر اللي بتتقسم (أسهم أو تواريخ)
+    """
+    if execution not in EXECUTION_MODES:
+        raise ValueError(f"طريقة تنفيذ غير معروفة: {execution}")
+
+    workers = workers or default_workers()
+    n_shards = min(workers, max(n_items // min_shard, 1))
+
+    if execution in ("serial", "stream") or n_shards < 2:
+        return "serial", 1
+    if execution == "auto" and n_cells < PARALLEL_MIN_CELLS:
+        return "serial", 1
+    return "parallel", n_shards
+
+
+def shard_bounds(n, n_shards):
+    """
+    حدود شرائح متصلة ومتقاربة الحجم [(lo, hi), ...] لـ n عنصر
+    """
+    edges = np.linspace(0, n, n_shards + 1).astype(int)
+    return [(int(lo), int(hi)) for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
+
+
+# ----------------------------------------------------------------------
+# المصفوفات المشتركة
+# ----------------------------------------------------------------------
+class SharedPanel:
+    """
+    نسخة واحدة من DataFrame (dates x symbols) في shared memory.
+    الـ spec بيتبعت للـ workers (اسم الـ block والأبعاد والـ index والأعمدة بس).
+    """
+
+    def __init__(self, frame):
+        values = frame.to_numpy(dtype=float)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=float, buffer=self._shm.buf)[:] = values
+        self.spec = {
+            "name": self._shm.name,
+            "shape": values.shape,
+            "index": frame.index,
+            "columns": list(frame.columns),
+        }
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_panel(spec, lo=0, hi=None):
+    """
+    يفتح المصفوفة المشتركة ويرجّع (shm, DataFrame للأعمدة من lo لـ hi).
+    لازم shm.close() بعد ما الشغل يخلص.
+    """
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    values = np.ndarray(spec["shape"], dtype=float, buffer=shm.buf)
+    hi = spec["shape"][1] if hi is None else hi
+    frame = pd.DataFrame(values[:, lo:hi], index=spec["index"], columns=spec["columns"][lo:hi])
+    return shm, frame
+
+
+# ----------------------------------------------------------------------
+# جدول العوامل (مشترك بين الحساب المتسلسل والـ workers)
+# ----------------------------------------------------------------------
+def factor_table(ctx, config):
+    """
+    compute_factors + متوسط قيمة التداول اليومي (لمرحلة السيولة) لو عامل السيولة مش فعّال
+    """
+    factor_df = compute_factors(ctx, config)
+    if "avg_traded_value" not in factor_df.columns:
+        try:
+            adtv = ctx.get("traded_value").mean()
+        except ValueError:
+            adtv = pd.Series(dtype=float)
+        factor_df["avg_traded_value"] = factor_df["symbol"].map(adtv).astype(float)
+    return factor_df
+
+
+def _shard_context(close, volume, fundamentals, benchmark):
+    history = {sym: close[sym] for sym in close.columns}
+    return FactorContext(
+        history,
+        volume_loader=(lambda symbols: {sym: volume[sym] for sym in symbols}) if volume is not None else None,
+        fundamentals_loader=(lambda symbols: fundamentals) if fundamentals is not None else None,
+        benchmark_loader=(lambda: benchmark) if benchmark is not None else None,
+        close=close,
+    )
+
+
+def _score_shard(close_spec, volume_spec, lo, hi, config, fundamentals, benchmark):
+    """
+    داخل الـ worker: جدول العوامل للأسهم [lo, hi) من المصفوفات المشتركة.
+    يرجّع (factor_df, None) أو (None, رسالة الخطأ).
+    """
+    handles = []
+    try:
+        shm, close = attach_panel(close_spec, lo, hi)
+        handles.append(shm)
+        volume = None
+        if volume_spec is not None:
+            shm, volume = attach_panel(volume_spec, lo, hi)
+            handles.append(shm)
+
+        ctx = _shard_context(close, volume, fundamentals, benchmark)
+        try:
+            return factor_table(ctx, config), None
+        except ValueError as e:
+            return None, str(e)
+    finally:
+        for shm in handles:
+            shm.close()
+
+
+def run_sharded(func, panels, shard_args, n_workers, executor=None):
+    """
+    ينفذ func(*specs, *args) لكل args في shard_args على process pool ويرجّع النتايج بنفس الترتيب.
+    panels: قائمة DataFrames (أو None) بتتكتب في shared memory مرة واحدة وتتشارك بين كل الشرائح.
+    """
+    shared = [SharedPanel(p) if p is not None else None for p in panels]
+    specs = [p.spec if p is not None else None for p in shared]
+    own_executor = executor is None
+    executor = executor or ProcessPoolExecutor(max_workers=n_workers)
+    try:
+        futures = [executor.submit(func, *specs, *args) for args in shard_args]
+        return [future.result() for future in futures]
+    finally:
+        if own_executor:
+            executor.shutdown()
+        for p in shared:
+            if p is not None:
+                p.close()
+
+
+def compute_factor_table_sharded(close, config, volume=None, fundamentals=None, benchmark=None,
+                                 n_shards=None, executor=None):
+    """
+    نفس factor_table(FactorContext(...), config) لكن مقسّم على process pool.
+
+    close / volume: DataFrame (dates x symbols) بنفس الأعمدة (volume ممكن يكون None)
+    fundamentals: dict {symbol: score} أو None، benchmark: Series أسعار المؤشر أو None
+    الشريحة اللي ما فضلش فيها أسهم بعد العوامل بتتساب (زي dropna في الحساب المتسلسل)،
+    ولو كل الشرائح فشلت بنرفع نفس رسالة الخطأ.
+    """
+    n_shards = n_shards or default_workers()
+    bounds = shard_bounds(close.shape[1], n_shards)
+    if volume is not None:
+        volume = volume.reindex(index=close.index, columns=close.columns)
+
+    results = run_sharded(
+        _score_shard,
+        [close, volume],
+        [(lo, hi, config, fundamentals, benchmark) for lo, hi in bounds],
+        n_workers=len(bounds),
+        executor=executor,
+    )
+
+    frames = [df for df, _ in results if df is not None]
+    if not frames:
+        raise ValueError(results[0][1])
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,122 @@
+"""
+أدوات تخصيص الأوزان المشتركة بين الـ builders.
+"""
+import numpy as np
+
+import fast_kernels
+
+
+def cap_weights(weights, caps, tol=1e-12):
+    """
+    Water-filling: يقص كل وزن عند الحد الأقصى بتاعه (caps) ويعيد توزيع الزيادة
+    على الأسهم اللي لسه تحت حدها بنسبة أوزانها، لحد ما مفيش سهم يتعدى حده.
+    لو مجموع الحدود أقل من مجموع الأوزان، الباقي يفضل كاش (المجموع يقل).
+    الـ loop عدد مراته على الأكثر بعدد الأسهم (kernel في fast_kernels).
+    """
+    return fast_kernels.cap_weights(weights, caps, tol)
+
+
+def _group_matrix(labels, group_caps):
+    """
+    one-hot (n, g) للمجموعات + حد كل مجموعة (inf للمجموعات بدون حد)
+    group_caps: رقم (نفس الحد لكل المجموعات) أو dict {group: cap}
+    """
+    names, codes = np.unique(np.asarray(labels).astype(str), return_inverse=True)
+    onehot = np.zeros((len(codes), len(names)))
+    onehot[np.arange(len(codes)), codes] = 1.0
+
+    if isinstance(group_caps, dict):
+        caps = np.array([float(group_caps.get(name, np.inf)) for name in names])
+    else:
+        caps = np.full(len(names), float(group_caps))
+    return onehot, caps
+
+
+def constrain_weights(weights, caps=np.inf, groups=(), tol=1e-12, max_iter=100):
+    """
+    نفس فكرة cap_weights (قص + إعادة توزيع نسبية) لكن مع قيود مجموعات مع بعض:
+    - caps: حد أقصى لكل سهم
+    - groups: قائمة (labels, group_caps) – مثلاً [(sectors, 0.35), (buckets, {"small": 0.2})]
+      كل سهم في مجموعة واحدة من كل تقسيم
+    في كل خطوة: المجموعات اللي فوق حدها بتتقلص بنسبة واحدة لحد الحد، الأسهم بتتقص
+    عند حدها، والزيادة بتتوزع بنسبة الأوزان على الأسهم اللي لسه هي ومجموعاتها تحت الحد.
+    weights ممكن تكون (n,) أو (batch, n) – كل الخطوات vectorized على الـ batch
+    (مثلاً تواريخ الـ rebalance في backtest). الزيادة اللي مالهاش مكان تفضل كاش.
+    """
+    w = np.array(weights, dtype=float)
+    squeeze = w.ndim == 1
+    w = np.atleast_2d(w)
+    caps = np.broadcast_to(np.asarray(caps, dtype=float), w.shape)
+    mats = [_group_matrix(labels, gcaps) for labels, gcaps in groups]
+
+    for _ in range(max_iter):
+        total = w.sum(axis=1)
+        new_w = w
+        for onehot, gcaps in mats:
+            sums = new_w @ onehot
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scale = np.where(sums > gcaps + tol, gcaps / sums, 1.0)
+            new_w = new_w * (scale @ onehot.T)
+        new_w = np.minimum(new_w, caps)
+
+        excess = total - new_w.sum(axis=1)
+        if not (excess > tol).any():
+            w = new_w
+            break
+
+        free = new_w < caps - tol
+        for onehot, gcaps in mats:
+            full = (new_w @ onehot) >= gcaps - tol
+            free &= (full.astype(float) @ onehot.T) == 0
+
+        free_sum = np.where(free, new_w, 0.0).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.where(free_sum > 0, excess / free_sum, 0.0)
+        w = new_w + np.where(free, new_w, 0.0) * ratio[:, None]
+
+        if not (free_sum > 0).any():
+            break
+
+    return w[0] if squeeze else w
+
+
+def liquidity_caps(capital, avg_traded_value, max_adv_fraction):
+    """
+    الحد الأقصى لوزن كل سهم = (نسبة من متوسط قيمة التداول اليومي) / رأس المال.
+    الأسهم اللي مالهاش بيانات حجم (NaN) ما عليهاش حد.
+    """
+    adtv = np.asarray(avg_traded_value, dtype=float)
+    caps = max_adv_fraction * adtv / float(capital)
+    return np.where(np.isnan(caps), np.inf, caps)
+
+
+def allocate_shares(budget, target_values, prices, lot_sizes=1, max_values=None):
+    """
+    تخصيص منفصل (discrete) لعدد الأسهم:
+    1) floor لكل سهم لأقرب lot تحت القيمة المستهدفة (vectorized)
+    2) الكاش المتبقي يشتري lot إضافي للأسهم الأبعد عن هدفها (greedy) بشرط ما نتعداش
+       الميزانية ولا max_values (أقصى قيمة مسموحة لكل سهم، مثلاً حد الوزن × قيمة المحفظة)
+    يرجّع مصفوفة عدد الأسهم (int)
+    """
+    target_values = np.asarray(target_values, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    lots = np.broadcast_to(np.asarray(lot_sizes, dtype=float), prices.shape)
+    lot_cost = prices * lots
+    if max_values is None:
+        max_values = np.full(prices.shape, np.inf)
+    else:
+        max_values = np.broadcast_to(np.asarray(max_values, dtype=float), prices.shape)
+
+    n_lots = np.floor(np.maximum(target_values, 0.0) / lot_cost)
+    spent = float((n_lots * lot_cost).sum())
+
+    # لو الأهداف أكبر من الميزانية، نقلل بنفس النسبة
+    if spent > budget and spent > 0:
+        n_lots = np.floor(n_lots * budget / spent)
+        spent = float((n_lots * lot_cost).sum())
+
+    cash = budget - spent
+    shortfall = target_values - n_lots * lot_cost
+    n_lots = fast_kernels.greedy_lots(np.argsort(-shortfall), shortfall, lot_cost, max_values, n_lots, cash)
+
+    return (n_lots * lots).astype(int)
@@ -0,0 +1,243 @@
+"""
+Backtest مبسّط (walk-forward) لنموذج V2 على الأسعار التاريخية المخزنة.
+
+كل rebalance_days جلسة:
+- بنحسب جدول العوامل من آخر lookback_days جلسة قبل التاريخ ده بس (مفيش نظر للمستقبل)
+- بنختار أعلى max_stocks بنفس منطق build_portfolio (target_weights)
+- بنمسك الأوزان (buy & hold) لحد الـ rebalance اللي بعده
+
+الأساسيات (Fundamentals) مش متاحة تاريخياً (point-in-time) فبتاخد قيمة محايدة 0.5
+لكل الأسهم، يعني الترتيب بيتحدد من عوامل الأسعار والحجم بس.
+
+جداول العوامل لتواريخ الـ rebalance مستقلة عن بعض، فللتاريخ الطويل بتتقسم التواريخ
+على process pool (نفس execution/workers بتوع الـ builder، انظر parallel_factors).
+
+لو فيه cost_model (transaction_costs)، تكلفة صفقات كل rebalance بتتخصم من قيمة المحفظة
+في يومها. الـ spread ومتوسط قيمة التداول والتذبذب بيتقدّروا من آخر lookback_days جلسة
+قبل التاريخ بس، مرة واحدة vectorized على المصفوفة كلها.
+"""
+import numpy as np
+import pandas as pd
+
+from fast_kernels import max_drawdown, rolling_mean_std
+from transaction_costs import corwin_schultz
+from factor_registry import BENCHMARK_SYMBOL, TRADING_DAYS, FactorContext, compute_factors
+from parallel_factors import MIN_SHARD_DATES, attach_panel, choose_execution, run_sharded, shard_bounds
+
+
+def window_factors(close, volume, bench, end, lookback, config):
+    """
+    جدول العوامل الخام باستخدام البيانات لحد الجلسة end (شاملة) بس، أو None
+    """
+    window = close.iloc[max(0, end + 1 - lookback):end + 1]
+    history = {sym: s.dropna() for sym, s in window.items()}
+    history = {sym: s for sym, s in history.items() if len(s) >= 2}
+    if not history:
+        return None
+
+    vol_window = volume.loc[window.index]
+    ctx = FactorContext(
+        history,
+        volume_loader=lambda symbols: {sym: vol_window[sym] for sym in symbols},
+        benchmark_loader=(lambda: bench) if bench is not None else None,
+    )
+    try:
+        return compute_factors(ctx, config)
+    except ValueError:
+        return None
+
+
+def _window_factors_shard(close_spec, volume_spec, ends, bench, lookback, config):
+    """
+    داخل الـ worker: جداول العوامل لمجموعة تواريخ rebalance من المصفوفات المشتركة
+    """
+    close_shm, close = attach_panel(close_spec)
+    volume_shm, volume = attach_panel(volume_spec)
+    try:
+        return [window_factors(close, volume, bench, end, lookback, config) for end in ends]
+    finally:
+        close_shm.close()
+        volume_shm.close()
+
+
+class PortfolioBacktester:
+    """
+    builder: AIPortfolioBuilderV2 (بيتاخد منه الكون، الـ lookback، العوامل والتطبيع والمخزن)
+    cost_model: CostModel لتكاليف التنفيذ (الافتراضي cost_model بتاع الـ builder)
+    """
+
+    def __init__(self, builder, rebalance_days=21, max_stocks=8, max_weight_per_stock=0.2, cost_model=None):
+        self.builder = builder
+        self.rebalance_days = rebalance_days
+        self.max_stocks = max_stocks
+        self.max_weight_per_stock = max_weight_per_stock
+        self.cost_model = cost_model if cost_model is not None else getattr(builder, "cost_model", None)
+
+    def _load_panels(self):
+        """
+        مصفوفات كاملة (dates x symbols) للإغلاق والحجم + سلسلة المؤشر، من المخزن
+        """
+        builder = self.builder
+        builder.egx.prefetch(builder.universe)
+
+        closes = {}
+        for sym in builder.universe:
+            s = builder.egx.get_price(sym, adjusted=builder.adjusted)
+            if s is not None and not s.empty:
+                closes[sym] = s
+        if not closes:
+            raise ValueError("لا توجد بيانات تاريخية صالحة لأي سهم من الكون المختار.")
+
+        close = pd.DataFrame(closes).sort_index()
+        volume = pd.DataFrame(builder._get_volume_history(list(close.columns)))
+        volume = volume.reindex(index=close.index, columns=close.columns)
+
+        bench = builder.egx.get_price(BENCHMARK_SYMBOL, adjusted=builder.adjusted)
+        return close, volume, bench
+
+    def _cost_panels(self, close, volume):
+        """
+        مدخلات نموذج التكاليف لكل (تاريخ، سهم) من آخر lookback_days جلسة لحد التاريخ ده:
+        (spread, متوسط قيمة التداول اليومي, التذبذب اليومي) كمصفوفات numpy
+        """
+        builder = self.builder
+        highs, lows = {}, {}
+        for sym in close.columns:
+            frame = builder.egx.get_ohlcv(sym, adjusted=builder.adjusted)
+            if frame is not None and not frame.empty:
+                highs[sym] = frame["High"]
+                lows[sym] = frame["Low"]
+        high = pd.DataFrame(highs).reindex(index=close.index, columns=close.columns)
+        low = pd.DataFrame(lows).reindex(index=close.index, columns=close.columns)
+
+        lookback = builder.lookback_days
+        spread = corwin_schultz(high.to_numpy(dtype=float), low.to_numpy(dtype=float))
+        daily_returns = close.ffill().pct_change(fill_method=None).where(close.notna())
+        return (
+            rolling_mean_std(spread, lookback, min_periods=2)[0],
+            rolling_mean_std((close * volume).to_numpy(dtype=float), lookback, min_periods=1)[0],
+            rolling_mean_std(daily_returns.to_numpy(dtype=float), lookback, min_periods=2)[1],
+        )
+
+    def _factor_tables(self, close, volume, bench, ends):
+        """
+        جداول العوامل الخام لكل تاريخ rebalance (متسلسل أو مقسّم على عمليات)
+        """
+        builder = self.builder
+        lookback = builder.lookback_days
+        mode, n_shards = choose_execution(
+            lookback * close.shape[1] * len(ends), len(ends),
+            builder.execution, builder.workers, min_shard=MIN_SHARD_DATES,
+        )
+        if mode == "serial":
+            return [window_factors(close, volume, bench, end, lookback, builder.factor_config) for end in ends]
+
+        bounds = shard_bounds(len(ends), n_shards)
+        results = run_sharded(
+            _window_factors_shard,
+            [close, volume],
+            [(ends[lo:hi], bench, lookback, builder.factor_config) for lo, hi in bounds],
+            n_workers=len(bounds),
+        )
+        return [df for shard in results for df in shard]
+
+    def _weights_from_factors(self, factor_df):
+        """
+        أوزان المحفظة المستهدفة من جدول العوامل الخام
+        """
+        if factor_df is None:
+            return pd.Series(dtype=float)
+
+        factor_df = self.builder.score_factors(factor_df)
+        top_df, weights = self.builder.target_weights(
+            factor_df, self.max_stocks, self.max_weight_per_stock
+        )
+        return pd.Series(weights, index=top_df["symbol"].values)
+
+    def run(self, capital=100000.0, min_history=None):
+        """
+        يرجّع dict فيه:
+        - equity: Series قيمة المحفظة اليومية
+        - returns: Series العائد اليومي للمحفظة
+        - weights: DataFrame (تاريخ الـ rebalance x symbol) للأوزان المستهدفة
+        - stats: ملخص (العائد الكلي/السنوي، التذبذب، Sharpe، أقصى تراجع، الـ turnover،
+          وإجمالي تكاليف التنفيذ لو فيه cost_model)
+        """
+        close, volume, bench = self._load_panels()
+        returns = close.ffill().pct_change(fill_method=None).fillna(0.0)
+
+        min_history = self.builder.lookback_days if min_history is None else min_history
+        rebalance_idx = list(range(min_history - 1, len(close) - 1, self.rebalance_days))
+        if not rebalance_idx:
+            raise ValueError("عدد الأيام التاريخية غير كاف للـ backtest.")
+
+        symbols = list(close.columns)
+        weight_rows = []
+        daily = np.zeros(len(close))
+        prev_w = np.zeros(len(symbols))
+        turnover = []
+
+        factor_tables = self._factor_tables(close, volume, bench, rebalance_idx)
+
+        cost_model = self.cost_model
+        if cost_model is not None:
+            spread, adtv, daily_vol = self._cost_panels(close, volume)
+        nav = float(capital)
+        costs = []
+
+        for k, start in enumerate(rebalance_idx):
+            end = rebalance_idx[k + 1] if k + 1 < len(rebalance_idx) else len(close) - 1
+            target = self._weights_from_factors(factor_tables[k])
+            w = target.reindex(symbols).fillna(0.0).values
+            weight_rows.append(w)
+            turnover.append(0.5 * float(np.abs(w - prev_w).sum()))
+
+            # تكلفة صفقات الـ rebalance (كل الأوامر مرة واحدة) كنسبة من قيمة المحفظة
+            cost_frac = 0.0
+            if cost_model is not None:
+                order_costs = cost_model.order_costs(
+                    np.abs(w - prev_w) * nav, spread[start], adtv[start], daily_vol[start]
+                )
+                costs.append(float(order_costs.sum()))
+                cost_frac = min(costs[-1] / nav, 1.0) if nav > 0 else 0.0
+
+            # buy & hold بين الـ rebalances: قيمة كل مركز بتتحرك مع سعره
+            growth = np.cumprod(1.0 + returns.values[start + 1:end + 1], axis=0)
+            value = growth @ w + (1.0 - w.sum())
+            period = np.diff(np.concatenate([[1.0], value])) / np.concatenate([[1.0], value[:-1]])
+            if cost_frac:
+                period[0] = (1.0 + period[0]) * (1.0 - cost_frac) - 1.0
+            daily[start + 1:end + 1] = period
+            nav *= (1.0 - cost_frac) * (value[-1] if len(value) else 1.0)
+
+            # الأوزان الفعلية في آخر الفترة (للـ turnover في الـ rebalance اللي بعده)
+            prev_w = (growth[-1] * w) / value[-1] if len(value) else w
+
+        port = pd.Series(daily, index=close.index).iloc[rebalance_idx[0]:]
+        equity = capital * (1.0 + port).cumprod()
+
+        n_days = max(len(port) - 1, 1)
+        total_return = float(equity.iloc[-1] / capital - 1.0)
+        vol = float(port.iloc[1:].std() * np.sqrt(TRADING_DAYS)) if len(port) > 2 else 0.0
+        annual_return = (1.0 + total_return) ** (TRADING_DAYS / n_days) - 1.0
+
+        stats = {
+            "total_return": total_return,
+            "annual_return": float(annual_return),
+            "annual_vol": vol,
+            "sharpe": float(annual_return / vol) if vol > 0 else 0.0,
+            "max_drawdown": max_drawdown(equity.values),
+            "avg_turnover": float(np.mean(turnover)),
+            "n_rebalances": len(rebalance_idx),
+        }
+        if cost_model is not None:
+            stats["total_costs"] = float(np.sum(costs))
+            stats["cost_drag"] = stats["total_costs"] / float(capital)
+
+        weights = pd.DataFrame(weight_rows, index=close.index[rebalance_idx], columns=symbols)
+        return {
+            "equity": equity,
+            "returns": port,
+            "weights": weights.loc[:, (weights != 0).any(axis=0)],
+            "stats": stats,
+        }
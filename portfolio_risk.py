@@ -0,0 +1,156 @@
+"""
+تحليل مخاطر المحفظة بعد البناء:
+- VaR / CVaR (parametric و historical)
+- أقصى تراجع (Max Drawdown) لعائد المحفظة التاريخي
+- مساهمة كل سهم في المخاطرة (marginal / component contribution)
+- وضع Monte Carlo / Bootstrap بآلاف المسارات بشكل vectorized
+
+كل الحسابات عمليات مصفوفات على نفس مصفوفة العوائد المشتركة (dates x symbols).
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from fast_kernels import max_drawdown
+
+TRADING_DAYS = 250
+
+
+def _var_cvar_from_samples(samples, alpha):
+    """
+    VaR و CVaR كخسارة موجبة من عينة عوائد (على آخر محور)
+    """
+    q = np.quantile(samples, 1.0 - alpha, axis=-1)
+    tail = np.where(samples <= q[..., None], samples, np.nan)
+    cvar = -np.nanmean(tail, axis=-1)
+    return -q, cvar
+
+
+class PortfolioRiskAnalyzer:
+    """
+    weights: Series (index=symbol) بأوزان المحفظة النهائية (مثلاً weight_real من pf_df)
+    returns: DataFrame عوائد يومية (dates x symbols) - نفس مصفوفة الـ builder
+    """
+
+    def __init__(self, weights, returns, portfolio_value=None):
+        weights = pd.Series(weights, dtype=float)
+        symbols = [sym for sym in weights.index if sym in returns.columns]
+        if not symbols:
+            raise ValueError("لا توجد عوائد تاريخية لأسهم المحفظة.")
+
+        w = weights.loc[symbols]
+        self.symbols = symbols
+        self.weights = (w / w.sum()).values
+        # يوم بدون بيانات لسهم = عائد صفر لهذا السهم في المحفظة
+        self.returns = returns[symbols].dropna(how="all").fillna(0.0).values
+        self.portfolio_value = portfolio_value
+
+        self.mean = self.returns.mean(axis=0)
+        self.cov = np.cov(self.returns, rowvar=False).reshape(len(symbols), len(symbols))
+
+    # ------------------------------------------------------------------
+    # عائد المحفظة التاريخي
+    # ------------------------------------------------------------------
+    def portfolio_returns(self):
+        return self.returns @ self.weights
+
+    def portfolio_vol(self):
+        return float(np.sqrt(self.weights @ self.cov @ self.weights))
+
+    # ------------------------------------------------------------------
+    # VaR / CVaR
+    # ------------------------------------------------------------------
+    def parametric_var(self, alpha=0.95, horizon_days=1):
+        """
+        VaR و CVaR بافتراض توزيع طبيعي (خسارة موجبة كنسبة من قيمة المحفظة)
+        """
+        mu = float(self.weights @ self.mean) * horizon_days
+        sigma = self.portfolio_vol() * np.sqrt(horizon_days)
+        z = NormalDist().inv_cdf(1.0 - alpha)
+        var = -(mu + z * sigma)
+        cvar = -(mu - sigma * NormalDist().pdf(z) / (1.0 - alpha))
+        return float(var), float(cvar)
+
+    def historical_var(self, alpha=0.95):
+        var, cvar = _var_cvar_from_samples(self.portfolio_returns(), alpha)
+        return float(var), float(cvar)
+
+    def simulated_var(self, alpha=0.95, horizon_days=1, n_paths=20000, method="bootstrap", seed=None):
+        """
+        VaR / CVaR من محاكاة n_paths مسار في خطوة vectorized واحدة:
+        - "bootstrap": سحب أيام تاريخية كاملة (بيحافظ على الارتباط بين الأسهم)
+        - "normal": عوائد طبيعية متعددة المتغيرات عن طريق Cholesky للـ covariance
+        """
+        rng = np.random.default_rng(seed)
+
+        if method == "bootstrap":
+            port = self.portfolio_returns()
+            idx = rng.integers(0, len(port), size=(n_paths, horizon_days))
+            daily = port[idx]
+        elif method == "normal":
+            n = len(self.symbols)
+            chol = np.linalg.cholesky(self.cov + 1e-12 * np.eye(n))
+            z = rng.standard_normal((n_paths, horizon_days, n))
+            daily = (self.mean + z @ chol.T) @ self.weights
+        else:
+            raise ValueError(f"طريقة محاكاة غير معروفة: {method}")
+
+        horizon_returns = np.prod(1.0 + daily, axis=1) - 1.0
+        var, cvar = _var_cvar_from_samples(horizon_returns, alpha)
+        return float(var), float(cvar)
+
+    # ------------------------------------------------------------------
+    # التراجع
+    # ------------------------------------------------------------------
+    def max_drawdown(self):
+        wealth = np.cumprod(1.0 + self.portfolio_returns())
+        return max_drawdown(wealth)
+
+    # ------------------------------------------------------------------
+    # مساهمة كل سهم في المخاطرة
+    # ------------------------------------------------------------------
+    def risk_contributions(self):
+        sigma = self.portfolio_vol()
+        marginal = self.cov @ self.weights / sigma if sigma > 0 else np.zeros(len(self.symbols))
+        component = self.weights * marginal
+
+        return pd.DataFrame({
+            "symbol": self.symbols,
+            "weight": self.weights,
+            "marginal_risk": marginal * np.sqrt(TRADING_DAYS),
+            "component_risk": component * np.sqrt(TRADING_DAYS),
+            "risk_share": component / sigma if sigma > 0 else 0.0,
+        }).sort_values("risk_share", ascending=False).reset_index(drop=True)
+
+    # ------------------------------------------------------------------
+    # تقرير مجمّع
+    # ------------------------------------------------------------------
+    def report(self, alpha=0.95, horizon_days=1, n_paths=20000, seed=None):
+        """
+        يرجّع (summary: dict, contributions: DataFrame)
+        القيم كنسب من قيمة المحفظة، ولو portfolio_value محدد بنضيف القيم بالجنيه.
+        """
+        p_var, p_cvar = self.parametric_var(alpha, horizon_days)
+        h_var, h_cvar = self.historical_var(alpha)
+        s_var, s_cvar = self.simulated_var(alpha, horizon_days, n_paths=n_paths, seed=seed)
+
+        summary = {
+            "alpha": alpha,
+            "horizon_days": horizon_days,
+            "annual_vol": float(self.portfolio_vol() * np.sqrt(TRADING_DAYS)),
+            "parametric_var": p_var,
+            "parametric_cvar": p_cvar,
+            "historical_var": h_var,
+            "historical_cvar": h_cvar,
+            "simulated_var": s_var,
+            "simulated_cvar": s_cvar,
+            "max_drawdown": self.max_drawdown(),
+        }
+
+        if self.portfolio_value:
+            for key in ("parametric_var", "parametric_cvar", "historical_var",
+                        "historical_cvar", "simulated_var", "simulated_cvar"):
+                summary[key + "_egp"] = summary[key] * self.portfolio_value
+
+        return summary, self.risk_contributions()
@@ -0,0 +1,246 @@
+import hashlib
+import threading
+import time
+
+import pandas as pd
+
+from corporate_actions import adjustment_factors, apply_factors, merge_actions
+
+
+def as_of_position(index, as_of):
+    """
+    عدد الشموع اللي تاريخها <= as_of في index مرتب (binary search)
+    """
+    ts = pd.Timestamp(as_of)
+    tz = getattr(index, "tz", None)
+    if tz is not None and ts.tz is None:
+        ts = ts.tz_localize(tz)
+    elif tz is None and ts.tz is not None:
+        ts = ts.tz_localize(None)
+    return int(index.searchsorted(ts, side="right"))
+
+
+def slice_as_of(frame, as_of):
+    """
+    الشموع لحد as_of (شامل) بس – None لو مفيش شموع قبله
+    """
+    if as_of is None:
+        return frame
+    frame = frame.iloc[:as_of_position(frame.index, as_of)]
+    return frame if not frame.empty else None
+
+
+class PriceStore:
+    """
+    مخزن أسعار داخل الذاكرة مشترك بين كل الـ builders في نفس العملية (process):
+    - يحتفظ بآخر إطار OHLCV خام تم تحميله لكل سهم (بأنواع مضغوطة، انظر egx_yahoo.OHLCV_DTYPES)
+      + جدول الإجراءات المؤسسية (توزيعات/تجزئة) للسهم
+    - الشكل المعدّل (adjusted=True) بيتحسب محلياً من الخام × معامل التعديل،
+      والمعامل بيتحسب مرة واحدة ويتخزن لحد ما الأسعار أو الإجراءات تتغير
+    - آمن للاستخدام من أكثر من thread (مثلاً thread الـ warm-up بعد تسجيل الدخول)
+    - كل عنصر له عمر أقصى (max_age_seconds) وبعده يعتبر قديم (stale) ويتحدث تدريجياً
+      (EGXYahoo.refresh بيكمّله من last_date بـ append)، لكن بيفضل محفوظ عشان يتقرا
+      بـ allow_stale=True لو التحديث ما وصلش
+    - fingerprint(symbol): بصمة محتوى البيانات المخزنة (لمفاتيح الـ memoization)،
+      و add_listener بيبلّغ المهتمين لما بيانات سهم تتحدث
+    """
+
+    def __init__(self, max_age_seconds=6 * 60 * 60):
+        self.max_age_seconds = max_age_seconds
+        self._items = {}
+        self._actions = {}
+        self._factors = {}
+        self._fingerprints = {}
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    def _changed(self, symbol):
+        """
+        بيانات السهم اتغيرت: المعامل والبصمة المحسوبين مبقوش صالحين
+        """
+        self._factors.pop(symbol, None)
+        self._fingerprints.pop(symbol, None)
+        for callback in list(self._listeners):
+            callback(symbol)
+
+    def _expired(self, stored_at):
+        return self.max_age_seconds is not None and time.time() - stored_at > self.max_age_seconds
+
+    def _raw(self, symbol, allow_stale=False):
+        item = self._items.get(symbol)
+        if item is None:
+            return None
+
+        stored_at, value = item
+        if not allow_stale and self._expired(stored_at):
+            return None
+
+        return value
+
+    def get(self, symbol, adjusted=False, as_of=None, allow_stale=False):
+        """
+        يرجّع البيانات المخزنة للسهم (خام أو معدّلة) أو None لو مش موجودة أو قديمة
+        as_of: الشموع لحد التاريخ ده (شامل) بس، والتعديل بالإجراءات اللي كانت معروفة
+        وقتها بس (آخر شمعة في الفترة معاملها 1) – يعني نفس اللي كان متاح في اليوم ده.
+        None لو مفيش شموع قبل as_of.
+        allow_stale: يرجّع البيانات حتى لو عدّت max_age_seconds (آخر شموع متاحة)
+        """
+        symbol = str(symbol)
+        with self._lock:
+            raw = self._raw(symbol, allow_stale)
+            if raw is None:
+                return None
+
+            if as_of is not None:
+                pos = as_of_position(raw.index, as_of)
+                if pos == 0:
+                    return None
+                if pos < len(raw):
+                    raw = raw.iloc[:pos]
+                    if not adjusted:
+                        return raw
+                    actions = self._actions.get(symbol)
+                    return apply_factors(raw, adjustment_factors(raw["Close"], actions))
+
+            if not adjusted:
+                return raw
+
+            factors = self._factors.get(symbol)
+            if factors is None:
+                factors = adjustment_factors(raw["Close"], self._actions.get(symbol))
+                self._factors[symbol] = factors
+
+        return apply_factors(raw, factors)
+
+    def put(self, symbol, value, actions=None):
+        """
+        يخزن إطار OHLCV خام للسهم (ويدمج جدول الإجراءات لو موجود)
+        """
+        symbol = str(symbol)
+        with self._lock:
+            self._items[symbol] = (time.time(), value)
+            self._changed(symbol)
+            if actions is not None:
+                self.put_actions(symbol, actions)
+
+    def append(self, symbol, value):
+        """
+        يضيف شموع جديدة (بعد آخر تاريخ مخزن) للإطار الخام للسهم بدل إعادة تحميله.
+        الشموع المتداخلة مع المخزن بتتحدث بالقيم الجديدة.
+        """
+        symbol = str(symbol)
+        with self._lock:
+            # الإطار القديم (stale) هو بالظبط اللي التحديث التدريجي بيكمّله
+            raw = self._raw(symbol, allow_stale=True)
+            if raw is None:
+                self.put(symbol, value)
+                return
+
+            first_new = value.index.min()
+            merged = pd.concat([raw[raw.index < first_new], value[raw.columns.intersection(value.columns)]])
+            merged = merged.astype(raw.dtypes.to_dict())
+            merged.columns.name = raw.columns.name
+            self._items[symbol] = (time.time(), merged)
+            self._changed(symbol)
+
+    def put_actions(self, symbol, actions):
+        """
+        يدمج إجراءات مؤسسية للسهم. يرجّع True لو فيه إجراء جديد
+        (ووقتها معامل التعديل بيتحسب تاني من الأسعار المخزنة بدون تحميل)
+        """
+        symbol = str(symbol)
+        with self._lock:
+            merged, added = merge_actions(self._actions.get(symbol), actions)
+            if added or symbol not in self._actions:
+                self._actions[symbol] = merged
+            if added:
+                self._changed(symbol)
+            return added
+
+    def get_actions(self, symbol):
+        with self._lock:
+            return self._actions.get(str(symbol))
+
+    def fingerprint(self, symbol):
+        """
+        hash لمحتوى الإطار الخام + الإجراءات المؤسسية للسهم، أو None لو مش موجود.
+        بيتحسب مرة واحدة لحد ما بيانات السهم تتغير.
+        """
+        symbol = str(symbol)
+        with self._lock:
+            raw = self._raw(symbol, allow_stale=True)
+            if raw is None:
+                return None
+
+            fp = self._fingerprints.get(symbol)
+            if fp is None:
+                h = hashlib.sha1(pd.util.hash_pandas_object(raw, index=True).values.tobytes())
+                actions = self._actions.get(symbol)
+                if actions is not None and not actions.empty:
+                    h.update(pd.util.hash_pandas_object(actions, index=True).values.tobytes())
+                fp = self._fingerprints[symbol] = h.hexdigest()[:16]
+            return fp
+
+    def add_listener(self, callback):
+        """
+        callback(symbol) بيتنادى بعد أي تحديث لبيانات سهم (symbol=None بعد clear)
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def last_date(self, symbol):
+        """
+        آخر تاريخ مخزن للسهم (حتى لو البيانات قديمة) أو None
+        """
+        with self._lock:
+            raw = self._raw(str(symbol), allow_stale=True)
+            return None if raw is None or raw.empty else raw.index[-1]
+
+    def has(self, symbol, allow_stale=False):
+        with self._lock:
+            return self._raw(str(symbol), allow_stale) is not None
+
+    def is_stale(self, symbol):
+        """
+        True لو السهم موجود لكن عدّى max_age_seconds
+        """
+        with self._lock:
+            item = self._items.get(str(symbol))
+            return item is not None and self._expired(item[0])
+
+    def symbols(self):
+        with self._lock:
+            return list(self._items)
+
+    def evict(self, symbols):
+        """
+        يشيل بيانات أسهم معينة من المخزن (لما اللي حمّلها مش محتاجها تاني)
+        """
+        with self._lock:
+            for symbol in symbols:
+                symbol = str(symbol)
+                if self._items.pop(symbol, None) is not None:
+                    self._actions.pop(symbol, None)
+                    self._changed(symbol)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._actions.clear()
+            self._factors.clear()
+            self._fingerprints.clear()
+            for callback in list(self._listeners):
+                callback(None)
+
+
+# مخزن افتراضي واحد لكل العملية
+_DEFAULT_STORE = None
+_DEFAULT_STORE_LOCK = threading.Lock()
+
+
+def get_default_store():
+    global _DEFAULT_STORE
+    with _DEFAULT_STORE_LOCK:
+        if _DEFAULT_STORE is None:
+            _DEFAULT_STORE = PriceStore()
+        return _DEFAULT_STORE
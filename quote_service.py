@@ -0,0 +1,321 @@
+"""
+أسعار لحظية (intraday) خفيفة لإعادة تقييم المحفظة المعروضة بدون إعادة بناءها.
+
+- YahooQuoteFeed: آخر سعر لمجموعة أسهم في طلب مجمع واحد (شموع دقيقة لآخر يوم فقط)
+  بدل تحميل التاريخ اليومي الكامل لكل سهم زي get_last_price
+- FakeQuoteFeed: feed محلي (random walk قابل للتكرار) للتجربة بدون إنترنت
+- QuoteService: بيعمل poll للـ feed كل interval_seconds في thread في الخلفية
+  وبيبعت الأسعار اللي اتغيرت بس للمشتركين (subscribers). خدمة واحدة بتكفي لكل
+  المحافظ: كل مشترك بيضيف أسهمه للـ polling لحد ما يلغي اشتراكه أو يتمسح
+- PortfolioRevaluer: بيحدّث market_value و weight_real والربح/الخسارة
+  للأسهم اللي سعرها اتغير بس، على مصفوفات NumPy
+"""
+import inspect
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from egx_yahoo import _yf
+
+
+class YahooQuoteFeed:
+    """
+    آخر سعر متاح لكل سهم من شموع interval لآخر period (طلب مجمع واحد)
+    """
+
+    def __init__(self, auto_suffix=True, interval="1m", period="1d", verbose=False):
+        self.auto_suffix = auto_suffix
+        self.interval = interval
+        self.period = period
+        self.verbose = verbose
+
+    def _format_symbol(self, symbol):
+        sym = str(symbol).strip().upper()
+        if self.auto_suffix and not sym.endswith(".CA") and not sym.startswith("^"):
+            sym = sym + ".CA"
+        return sym
+
+    def fetch(self, symbols):
+        """
+        يرجّع dict {symbol: آخر سعر} للأسهم اللي ليها بيانات (بنفس صيغة الرموز المدخلة)
+        """
+        names = {self._format_symbol(s): s for s in symbols}
+        if not names:
+            return {}
+
+        try:
+            data = _yf().download(
+                list(names),
+                period=self.period,
+                interval=self.interval,
+                progress=False,
+                group_by="ticker",
+            )
+        except Exception as e:
+            if self.verbose:
+                print(f"❌ حدث خطأ أثناء تحميل الأسعار اللحظية: {e}")
+            return {}
+
+        if data is None or data.empty:
+            return {}
+
+        quotes = {}
+        for sym, original in names.items():
+            if isinstance(data.columns, pd.MultiIndex):
+                if sym not in data.columns.get_level_values(0):
+                    continue
+                close = data[sym]["Close"]
+            else:
+                close = data["Close"]
+            close = close.dropna()
+            if not close.empty:
+                quotes[original] = float(close.iloc[-1])
+        return quotes
+
+
+class FakeQuoteFeed:
+    """
+    feed محلي للتجربة: كل fetch بيحرّك الأسعار random walk صغير (قابل للتكرار بـ seed).
+    set_price بيثبت سعر سهم معين للتجارب.
+    """
+
+    def __init__(self, prices, volatility=0.002, seed=None):
+        self.prices = {sym: float(p) for sym, p in dict(prices).items()}
+        self.volatility = volatility
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def set_price(self, symbol, price):
+        with self._lock:
+            self.prices[symbol] = float(price)
+
+    def fetch(self, symbols):
+        with self._lock:
+            known = [s for s in symbols if s in self.prices]
+            if self.volatility:
+                moves = self._rng.normal(0.0, self.volatility, size=len(known))
+                for sym, move in zip(known, moves):
+                    self.prices[sym] *= 1.0 + move
+            return {sym: self.prices[sym] for sym in known}
+
+
+def _subscriber_ref(callback):
+    """
+    دالة object (زي revaluer.update) بتتخزن weak: الخدمة مش بتمنع مسحه، فلو
+    صاحبه اتمسح (جلسة اتقفلت من غير unsubscribe) بيقع هو وأسهمه من الـ polling.
+    أي دالة تانية (function أو lambda) مالهاش صاحب فبتتخزن عادي لحد unsubscribe.
+    """
+    if inspect.ismethod(callback):
+        return weakref.WeakMethod(callback)
+    return lambda: callback
+
+
+class QuoteService:
+    """
+    poll دوري للأسعار اللحظية لمجموعة أسهم وإرسال التحديثات للمشتركين.
+    subscriber: دالة بتاخد dict {symbol: price} فيه الأسعار اللي اتغيرت بس.
+    الأسهم المطلوبة = symbols + أسهم كل المشتركين الحاليين (اللي لسه موجودين).
+    """
+
+    def __init__(self, symbols=(), feed=None, interval_seconds=60):
+        self._base_symbols = list(symbols)
+        self.symbols = list(self._base_symbols)
+        self.feed = feed if feed is not None else YahooQuoteFeed()
+        self.interval_seconds = interval_seconds
+
+        self.latest = {}
+        self.last_poll_at = None
+        # [ref للمشترك, أسهمه أو None]
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # بيصحّي الـ polling قبل معاده (لما مشترك يضيف أسهم جديدة أو عند stop)
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _update_symbols(self):
+        symbols = list(self._base_symbols)
+        seen = set(symbols)
+        for _, watched in self._subscribers:
+            for sym in watched or ():
+                if sym not in seen:
+                    seen.add(sym)
+                    symbols.append(sym)
+        added = seen - set(self.symbols)
+        self.symbols = symbols
+        return added
+
+    def _live_subscribers(self):
+        """
+        المشتركين اللي لسه موجودين (بيتنادي تحت الـ lock). المشترك اللي اتمسح
+        بيتشال من القايمة وأسهمه بتتشال من الـ polling
+        """
+        live, entries = [], []
+        for entry in self._subscribers:
+            callback = entry[0]()
+            if callback is not None:
+                live.append(callback)
+                entries.append(entry)
+        if len(entries) != len(self._subscribers):
+            self._subscribers = entries
+            self._update_symbols()
+        return live
+
+    def subscribe(self, callback, symbols=None):
+        """
+        symbols: الأسهم اللي المشترك محتاجها (بتتضاف للـ polling لحد unsubscribe).
+        لو فيها أسهم جديدة الـ poll الجاي بيحصل فوراً.
+        """
+        with self._lock:
+            watched = list(symbols) if symbols is not None else None
+            self._subscribers.append([_subscriber_ref(callback), watched])
+            if watched is not None and self._update_symbols():
+                self._wake.set()
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [
+                entry for entry in self._subscribers
+                if entry[0]() is not None and entry[0]() != callback
+            ]
+            self._update_symbols()
+
+    def poll_once(self):
+        """
+        طلب واحد للـ feed. يرجّع الأسعار اللي اتغيرت (وبيبعتها للمشتركين لو فيه تغيير)
+        """
+        with self._lock:
+            self._live_subscribers()
+            symbols = list(self.symbols)
+        if not symbols:
+            return {}
+        quotes = self.feed.fetch(symbols)
+
+        with self._lock:
+            changed = {
+                sym: price for sym, price in quotes.items()
+                if self.latest.get(sym) != price
+            }
+            self.latest.update(changed)
+            self.last_poll_at = time.time()
+            subscribers = self._live_subscribers()
+
+        if changed:
+            for callback in subscribers:
+                callback(changed)
+        return changed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"❌ حدث خطأ أثناء تحديث الأسعار اللحظية: {e}")
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+
+    def start(self):
+        """
+        يبدأ الـ polling في thread في الخلفية (لو مش شغال بالفعل)
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+
+        self._stop.clear()
+        self._wake.clear()
+        self._thread = threading.Thread(target=self._run, name="egx-quotes", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+
+class PortfolioRevaluer:
+    """
+    إعادة تقييم تدريجية للمحفظة المعروضة:
+    pf_df من build_portfolio (أعمدة symbol, shares, last_price)
+    سعر البناء (last_price) هو سعر التكلفة للربح/الخسارة.
+    """
+
+    def __init__(self, pf_df, cash=0.0):
+        self.symbols = list(pf_df["symbol"])
+        self._index = {sym: i for i, sym in enumerate(self.symbols)}
+
+        self.shares = pf_df["shares"].to_numpy(dtype=float)
+        self.cost_price = pf_df["last_price"].to_numpy(dtype=float)
+        self.price = self.cost_price.copy()
+        self.market_value = self.shares * self.price
+        self.total_mv = float(self.market_value.sum())
+        self.cash = float(cash)
+
+        self.updated_at = None
+        self._lock = threading.Lock()
+
+    def update(self, quotes):
+        """
+        quotes: dict {symbol: price}. بيحدّث الأسهم اللي في المحفظة بس
+        ويعدّل إجمالي القيمة بفرق القيم بدل إعادة الجمع.
+        يرجّع عدد الأسهم اللي اتحدثت.
+        """
+        idx = [self._index[s] for s in quotes if s in self._index]
+        if not idx:
+            return 0
+
+        idx = np.asarray(idx)
+        new_prices = np.array([quotes[self.symbols[i]] for i in idx], dtype=float)
+
+        with self._lock:
+            new_mv = self.shares[idx] * new_prices
+            self.total_mv += float(new_mv.sum() - self.market_value[idx].sum())
+            self.market_value[idx] = new_mv
+            self.price[idx] = new_prices
+            self.updated_at = time.time()
+        return len(idx)
+
+    def summary(self):
+        with self._lock:
+            cost = float(self.shares @ self.cost_price)
+            return {
+                "market_value": self.total_mv,
+                "cash": self.cash,
+                "total_value": self.total_mv + self.cash,
+                "pnl": self.total_mv - cost,
+                "pnl_pct": self.total_mv / cost - 1.0 if cost > 0 else 0.0,
+                "updated_at": self.updated_at,
+            }
+
+    def frame(self):
+        """
+        DataFrame بالقيم الحالية (نفس ترتيب pf_df)
+        """
+        with self._lock:
+            mv = self.market_value.copy()
+            price = self.price.copy()
+            total = self.total_mv
+
+        pnl = mv - self.shares * self.cost_price
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pnl_pct = np.where(self.cost_price > 0, price / self.cost_price - 1.0, 0.0)
+
+        return pd.DataFrame({
+            "symbol": self.symbols,
+            "shares": self.shares.astype(int),
+            "cost_price": self.cost_price,
+            "price": price,
+            "market_value": mv,
+            "weight_real": mv / total if total > 0 else 0.0,
+            "pnl": pnl,
+            "pnl_pct": pnl_pct,
+        })
@@ -0,0 +1,249 @@
+"""
+مخطط إعادة التوازن (Rebalance) لعملاء عندهم محافظ قائمة.
+
+بدل ما نبني المحفظة من الكاش كل مرة، بنحسب أقل قائمة صفقات توصّل المحفظة الحالية
+للأوزان المستهدفة (weight_target من build_portfolio) مع احترام:
+- حد الوزن الأقصى لكل سهم (max_weight_per_stock)
+- حجم الـ lot لكل سهم
+- نطاق عدم التداول (no_trade_band): لو الفرق بين الوزن الحالي والمستهدف أقل منه ما بنتداولش
+- تكاليف التنفيذ (cost_model اختياري): التكلفة المتوقعة بتتحجز من الميزانية قبل التخصيص،
+  وتكلفة كل صفقة بتتسجل وبتتخصم من الكاش
+
+ملف المحفظة الحالية CSV بعمودين symbol و shares، وصف اختياري symbol=CASH لقيمة الكاش.
+وضع الـ batch بيشتغل على مئات الملفات بنفس المحفظة المستهدفة (نفس الـ factor snapshot).
+"""
+import argparse
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from portfolio_allocation import allocate_shares
+
+CASH_SYMBOL = "CASH"
+
+
+def load_holdings(path):
+    """
+    يرجّع (Series عدد الأسهم index=symbol, cash)
+    """
+    df = pd.read_csv(path)
+    df["symbol"] = df["symbol"].astype(str).str.strip().str.upper()
+
+    cash_rows = df["symbol"] == CASH_SYMBOL
+    cash = float(df.loc[cash_rows, "shares"].sum())
+
+    shares = df.loc[~cash_rows].groupby("symbol")["shares"].sum().astype(int)
+    return shares, cash
+
+
+class RebalancePlanner:
+    """
+    target_weights: Series (index=symbol) بالأوزان المستهدفة
+    prices: Series (index=symbol) بآخر سعر لكل سهم مستهدف
+    price_lookup: دالة اختيارية ترجع سعر سهم محتفظ به وغير موجود في prices
+    cost_model: CostModel من transaction_costs (None = بدون تكاليف)
+    market: DataFrame اختياري (index=symbol) فيه spread_est و/أو avg_traded_value لنموذج التكاليف
+    """
+
+    def __init__(self, target_weights, prices, max_weight_per_stock=0.2, no_trade_band=0.02,
+                 lot_sizes=None, price_lookup=None, cost_model=None, market=None):
+        target_weights = pd.Series(target_weights, dtype=float)
+        self.target_weights = target_weights.clip(upper=max_weight_per_stock)
+        self.prices = pd.Series(prices, dtype=float)
+        self.max_weight_per_stock = max_weight_per_stock
+        self.no_trade_band = no_trade_band
+        self.lot_sizes = lot_sizes or {}
+        self.price_lookup = price_lookup
+        self.cost_model = cost_model
+        self.market = market
+
+    @classmethod
+    def from_portfolio(cls, pf_df, **kwargs):
+        """
+        من ناتج build_portfolio مباشرة (weight_target + last_price، وبيانات التكاليف لو موجودة)
+        """
+        pf = pf_df.set_index("symbol")
+        market_cols = [col for col in ("spread_est", "avg_traded_value") if col in pf.columns]
+        if market_cols:
+            kwargs.setdefault("market", pf[market_cols])
+        return cls(pf["weight_target"], pf["last_price"], **kwargs)
+
+    def _order_costs(self, symbols, order_values):
+        """
+        تكلفة الأوامر (جنيه) لكل سهم، أو أصفار لو مافيش cost_model
+        """
+        if self.cost_model is None:
+            return np.zeros(len(symbols))
+
+        def column(name):
+            if self.market is None or name not in self.market.columns:
+                return None
+            return self.market[name].reindex(symbols).to_numpy(dtype=float)
+
+        return self.cost_model.order_costs(
+            order_values, spread=column("spread_est"), adtv=column("avg_traded_value")
+        )
+
+    def _price_of(self, sym):
+        if sym in self.prices.index:
+            return float(self.prices[sym])
+        if self.price_lookup is not None:
+            p = self.price_lookup(sym)
+            if p is not None:
+                self.prices[sym] = float(p)
+                return float(p)
+        return np.nan
+
+    def plan(self, holdings, cash=0.0):
+        """
+        holdings: Series أو dict {symbol: shares}
+        يرجّع (trades: DataFrame, summary: dict)
+        """
+        holdings = pd.Series(holdings, dtype=float)
+        symbols = list(dict.fromkeys(list(self.target_weights.index) + list(holdings.index)))
+
+        prices = np.array([self._price_of(sym) for sym in symbols], dtype=float)
+        unpriced = [sym for sym, p in zip(symbols, prices) if np.isnan(p) or p <= 0]
+        if unpriced:
+            raise ValueError(f"لا يوجد سعر للأسهم: {unpriced}")
+
+        cur_shares = holdings.reindex(symbols).fillna(0).values.astype(int)
+        w_tgt = self.target_weights.reindex(symbols).fillna(0.0).values
+        lots = np.array([self.lot_sizes.get(sym, 1) for sym in symbols], dtype=float)
+
+        cur_values = cur_shares * prices
+        total = float(cur_values.sum() + cash)
+        if total <= 0:
+            raise ValueError("قيمة المحفظة الحالية (أسهم + كاش) تساوي صفر.")
+
+        w_cur = cur_values / total
+
+        # 1) نطاق عدم التداول: الأسهم القريبة من هدفها تفضل زي ما هي
+        # (بشرط ما تكونش فوق الحد الأقصى للوزن)
+        keep = (np.abs(w_cur - w_tgt) <= self.no_trade_band) & (w_cur <= self.max_weight_per_stock)
+
+        # 2) الباقي يتخصص بالـ discrete allocator من الميزانية المتاحة
+        budget = total - float(cur_values[keep].sum())
+        trade_idx = np.where(~keep)[0]
+
+        # التكلفة المتوقعة للوصول للهدف بتتحجز من الميزانية قبل التخصيص
+        trade_syms = [symbols[i] for i in trade_idx]
+        expected = np.abs(w_tgt[trade_idx] * total - cur_values[trade_idx])
+        budget = max(budget - float(self._order_costs(trade_syms, expected).sum()), 0.0)
+        new_shares = cur_shares.copy()
+        if len(trade_idx):
+            new_shares[trade_idx] = allocate_shares(
+                budget,
+                w_tgt[trade_idx] * total,
+                prices[trade_idx],
+                lots[trade_idx],
+                max_values=self.max_weight_per_stock * total,
+            )
+
+        delta = new_shares - cur_shares
+        costs = self._order_costs(symbols, np.abs(delta * prices))
+        trades = pd.DataFrame({
+            "symbol": symbols,
+            "price": prices,
+            "current_shares": cur_shares,
+            "target_shares": new_shares,
+            "trade_shares": delta,
+            "side": np.where(delta > 0, "BUY", np.where(delta < 0, "SELL", "HOLD")),
+            "trade_value": delta * prices,
+            "trade_cost": costs,
+            "weight_current": w_cur,
+            "weight_target": w_tgt,
+            "weight_after": new_shares * prices / total,
+        })
+        trades = trades[trades["trade_shares"] != 0].sort_values("trade_value").reset_index(drop=True)
+
+        turnover = float(np.abs(delta * prices).sum())
+        summary = {
+            "portfolio_value": total,
+            "n_trades": int(len(trades)),
+            "turnover": turnover,
+            "turnover_pct": turnover / total,
+            "costs": float(costs.sum()),
+            "cash_after": total - float((new_shares * prices).sum()) - float(costs.sum()),
+        }
+        return trades, summary
+
+    def plan_batch(self, holdings_paths, out_dir=None):
+        """
+        إعادة توازن لمجموعة ملفات محافظ (قائمة مسارات أو glob pattern) بنفس المحفظة المستهدفة.
+        لو out_dir محدد، بنكتب ملف صفقات لكل عميل.
+        يرجّع DataFrame ملخص لكل عميل.
+        """
+        if isinstance(holdings_paths, str):
+            holdings_paths = sorted(glob.glob(holdings_paths))
+
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+        rows = []
+        for path in holdings_paths:
+            client = os.path.splitext(os.path.basename(path))[0]
+            try:
+                shares, cash = load_holdings(path)
+                trades, summary = self.plan(shares, cash=cash)
+            except Exception as e:
+                rows.append({"client": client, "error": str(e)})
+                continue
+
+            if out_dir:
+                trades.to_csv(os.path.join(out_dir, f"{client}_trades.csv"), index=False)
+
+            summary["client"] = client
+            rows.append(summary)
+
+        return pd.DataFrame(rows)
+
+
+def build_target_from_snapshot(universe=None, lookback_days=180, max_stocks=8, max_weight_per_stock=0.2):
+    """
+    المحفظة المستهدفة مرة واحدة من آخر factor snapshot (مشتركة بين كل العملاء).
+    weight_target مش بيعتمد على رأس المال فبنستخدم رأس مال مرجعي.
+    """
+    from ai_portfolio_builder_v2 import AIPortfolioBuilderV2
+    from egx_universe import DEFAULT_UNIVERSE
+    from factor_snapshot import load_latest_snapshot
+
+    universe = DEFAULT_UNIVERSE if universe is None else list(universe)
+    snapshot = load_latest_snapshot(lookback_days=lookback_days)
+    builder = AIPortfolioBuilderV2(universe, lookback_days=lookback_days, verbose=False)
+    pf_df, _ = builder.build_portfolio(
+        capital=1_000_000,
+        max_stocks=max_stocks,
+        max_weight_per_stock=max_weight_per_stock,
+        factor_snapshot=snapshot[0] if snapshot is not None else None,
+    )
+    return pf_df, builder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch rebalance client holdings to the V2 target portfolio")
+    parser.add_argument("holdings", help='glob pattern for holdings CSV files, e.g. "clients/*.csv"')
+    parser.add_argument("--out-dir", default="rebalance_out")
+    parser.add_argument("--max-stocks", type=int, default=8)
+    parser.add_argument("--max-weight", type=float, default=0.2)
+    parser.add_argument("--band", type=float, default=0.02)
+    args = parser.parse_args()
+
+    pf_df, builder = build_target_from_snapshot(
+        max_stocks=args.max_stocks, max_weight_per_stock=args.max_weight
+    )
+    planner = RebalancePlanner.from_portfolio(
+        pf_df,
+        max_weight_per_stock=args.max_weight,
+        no_trade_band=args.band,
+        price_lookup=builder.egx.get_last_price,
+    )
+    summary = planner.plan_batch(args.holdings, out_dir=args.out_dir)
+    summary.to_csv(os.path.join(args.out_dir, "summary.csv"), index=False)
+    print(summary.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+مخزن تاريخي لنتائج بناء المحافظ (append-only) + تصدير النتائج.
+
+كل build بيتكتب مرة واحدة وما بيتعدلش:
+    results/builds.csv                       فهرس صغير: سطر لكل build (الوقت، الكون، المعاملات، الكاش)
+    results/<build_id>/portfolio.<ext>       pf_df
+    results/<build_id>/factors.<ext>         last_factor_df
+الملفات columnar مضغوطة (Parquet/zstd) لو pyarrow متاح، وإلا CSV مضغوط (gzip).
+
+المقارنات التاريخية (آخر N build لنفس الكون، تغير الأوزان/الدرجات مع الوقت)
+بتبقى قراءة محلية للفهرس + ملفات الـ builds المطلوبة بس، بدل إعادة البناء.
+"""
+import csv
+import datetime as dt
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+
+import pandas as pd
+
+RESULTS_DIR = os.environ.get("EGX_RESULTS_DIR", "results")
+
+INDEX_FILE = "builds.csv"
+INDEX_COLUMNS = [
+    "build_id", "built_at", "universe_key", "params_key",
+    "universe", "params", "cash_left", "n_holdings", "market_value",
+]
+
+EXPORT_FORMATS = ("csv", "parquet", "excel")
+
+_INDEX_CACHE = {}
+_LOCK = threading.Lock()
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _key(value):
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def universe_key(universe):
+    """
+    مفتاح ثابت للكون بغض النظر عن ترتيب الأسهم
+    """
+    return _key(sorted(str(s).upper() for s in universe))
+
+
+class ResultsStore:
+    def __init__(self, root=RESULTS_DIR, fmt=None):
+        """
+        fmt: "parquet" أو "csv" – الافتراضي parquet لو pyarrow متاح
+        """
+        self.root = root
+        self.fmt = fmt or ("parquet" if _has_pyarrow() else "csv")
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_FILE)
+
+    # ------------------------------------------------------------------
+    # قراءة/كتابة الجداول
+    # ------------------------------------------------------------------
+    def _write_frame(self, df, path_base):
+        if self.fmt == "parquet":
+            path = path_base + ".parquet"
+            df.to_parquet(path + ".tmp", index=False, compression="zstd")
+        else:
+            path = path_base + ".csv.gz"
+            df.to_csv(path + ".tmp", index=False, compression="gzip")
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _read_frame(path_base):
+        if os.path.exists(path_base + ".parquet"):
+            return pd.read_parquet(path_base + ".parquet")
+        if os.path.exists(path_base + ".csv.gz"):
+            return pd.read_csv(path_base + ".csv.gz", float_precision="round_trip")
+        return None
+
+    # ------------------------------------------------------------------
+    # الكتابة
+    # ------------------------------------------------------------------
+    def save_build(self, pf_df, cash_left, factor_df=None, universe=None, params=None, built_at=None):
+        """
+        يسجل build جديد. يرجّع build_id.
+        params: معاملات الـ build (capital, max_stocks, normalization, ...) – بتتخزن JSON
+        """
+        built_at = built_at or dt.datetime.now()
+        universe = list(universe) if universe is not None else pf_df["symbol"].tolist()
+        params = dict(params or {})
+        u_key = universe_key(universe)
+        p_key = _key(params)
+        build_id = f"{built_at:%Y%m%dT%H%M%S%f}_{u_key[:6]}{p_key[:6]}"
+
+        build_dir = os.path.join(self.root, build_id)
+        os.makedirs(build_dir, exist_ok=True)
+        self._write_frame(pf_df, os.path.join(build_dir, "portfolio"))
+        if factor_df is not None:
+            self._write_frame(factor_df, os.path.join(build_dir, "factors"))
+
+        row = {
+            "build_id": build_id,
+            "built_at": built_at.isoformat(timespec="seconds"),
+            "universe_key": u_key,
+            "params_key": p_key,
+            "universe": " ".join(universe),
+            "params": json.dumps(params, sort_keys=True, ensure_ascii=False, default=str),
+            "cash_left": float(cash_left),
+            "n_holdings": int((pf_df["shares"] > 0).sum()) if "shares" in pf_df.columns else len(pf_df),
+            "market_value": float(pf_df["market_value"].sum()) if "market_value" in pf_df.columns else 0.0,
+        }
+
+        # الفهرس append-only: سطر واحد بعد ما ملفات الـ build اتكتبت بالكامل
+        with _LOCK:
+            new_file = not os.path.exists(self.index_path)
+            with open(self.index_path, "a", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=INDEX_COLUMNS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+
+        return build_id
+
+    # ------------------------------------------------------------------
+    # الاستعلامات
+    # ------------------------------------------------------------------
+    def list_builds(self, universe=None, params=None, last_n=None):
+        """
+        فهرس الـ builds (الأحدث في الآخر)، مع فلترة اختيارية بالكون والمعاملات
+        """
+        if not os.path.exists(self.index_path):
+            return pd.DataFrame(columns=INDEX_COLUMNS)
+
+        key = (os.path.abspath(self.index_path), os.path.getmtime(self.index_path),
+               os.path.getsize(self.index_path))
+        with _LOCK:
+            index = _INDEX_CACHE.get(key)
+            if index is None:
+                index = pd.read_csv(self.index_path, parse_dates=["built_at"])
+                _INDEX_CACHE.clear()
+                _INDEX_CACHE[key] = index
+
+        if universe is not None:
+            index = index[index["universe_key"] == universe_key(universe)]
+        if params is not None:
+            index = index[index["params_key"] == _key(dict(params))]
+
+        index = index.sort_values("built_at", kind="stable")
+        if last_n is not None:
+            index = index.tail(last_n)
+        return index.reset_index(drop=True)
+
+    def load_build(self, build_id):
+        """
+        يرجّع (pf_df, cash_left, factor_df) لـ build محفوظ
+        """
+        index = self.list_builds()
+        match = index[index["build_id"] == build_id]
+        if match.empty:
+            raise ValueError(f"build غير موجود: {build_id}")
+
+        build_dir = os.path.join(self.root, build_id)
+        pf_df = self._read_frame(os.path.join(build_dir, "portfolio"))
+        factor_df = self._read_frame(os.path.join(build_dir, "factors"))
+        return pf_df, float(match["cash_left"].iloc[0]), factor_df
+
+    def _stack(self, builds, table, column):
+        frames = []
+        for build_id, built_at in zip(builds["build_id"], builds["built_at"]):
+            df = self._read_frame(os.path.join(self.root, build_id, table))
+            if df is None or column not in df.columns:
+                continue
+            frames.append(pd.DataFrame({
+                "built_at": built_at,
+                "symbol": df["symbol"].values,
+                column: df[column].values,
+            }))
+
+        if not frames:
+            return pd.DataFrame()
+        long = pd.concat(frames, ignore_index=True)
+        return long.pivot_table(index="built_at", columns="symbol", values=column, aggfunc="last")
+
+    def weight_drift(self, universe, last_n=10, column="weight_target", params=None):
+        """
+        جدول (built_at x symbol) لوزن كل سهم في آخر last_n build لنفس الكون
+        (السهم اللي مش في المحفظة في build معين = 0)
+        """
+        builds = self.list_builds(universe=universe, params=params, last_n=last_n)
+        return self._stack(builds, "portfolio", column).fillna(0.0)
+
+    def score_drift(self, universe, last_n=10, column="total_score", params=None):
+        """
+        جدول (built_at x symbol) لدرجة كل سهم من جدول العوامل في آخر last_n build
+        """
+        builds = self.list_builds(universe=universe, params=params, last_n=last_n)
+        return self._stack(builds, "factors", column)
+
+
+# ----------------------------------------------------------------------
+# التصدير (للـ download button في التطبيق)
+# ----------------------------------------------------------------------
+def export_frames(frames, fmt="csv"):
+    """
+    frames: dict {name: DataFrame}
+    يرجّع (bytes, file_name, mime):
+    - csv: ملف zip فيه CSV لكل جدول
+    - parquet: ملف zip فيه Parquet لكل جدول (يحتاج pyarrow)
+    - excel: ملف xlsx بشيت لكل جدول (يحتاج openpyxl أو xlsxwriter)
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"صيغة تصدير غير معروفة: {fmt}")
+
+    stamp = dt.datetime.now().strftime("%Y%m%d_%H%M")
+    frames = {name: df for name, df in frames.items() if df is not None}
+
+    if fmt == "excel":
+        buf = io.BytesIO()
+        try:
+            with pd.ExcelWriter(buf) as writer:
+                for name, df in frames.items():
+                    df.to_excel(writer, sheet_name=name[:31], index=False)
+        except (ImportError, ValueError) as e:
+            raise ValueError(f"التصدير لـ Excel يحتاج openpyxl أو xlsxwriter: {e}")
+        return (
+            buf.getvalue(),
+            f"egx_portfolio_{stamp}.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+
+    if fmt == "parquet" and not _has_pyarrow():
+        raise ValueError("التصدير لـ Parquet يحتاج pyarrow.")
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, df in frames.items():
+            if fmt == "csv":
+                zf.writestr(f"{name}.csv", df.to_csv(index=False).encode("utf-8-sig"))
+            else:
+                part = io.BytesIO()
+                df.to_parquet(part, index=False)
+                zf.writestr(f"{name}.parquet", part.getvalue())
+    return buf.getvalue(), f"egx_portfolio_{stamp}_{fmt}.zip", "application/zip"
@@ -0,0 +1,154 @@
+"""
+محرك سيناريوهات Monte Carlo لقيمة المحفظة المستقبلية (مثلاً بعد 6 أو 12 شهر).
+
+- "normal": عوائد مترابطة من Cholesky لمصفوفة covariance بعد shrinkage (Ledoit-Wolf)
+- "bootstrap": block bootstrap لأيام تاريخية متتالية (بيحافظ على الارتباط والـ autocorrelation)
+
+المحاكاة vectorized بالكامل في NumPy وبتتولد على دفعات (chunks) عشان الذاكرة تفضل محدودة:
+مسارات الأسهم نفسها مش بتتخزن، بنحتفظ بس بقيمة المحفظة كل band_step يوم.
+مع seed ثابت النتيجة بتتكرر بالظبط (لنفس chunk_size) وده مناسب للـ benchmarks.
+"""
+import numpy as np
+import pandas as pd
+
+from fast_kernels import max_drawdown
+
+TRADING_DAYS = 250
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def shrunk_covariance(returns):
+    """
+    Ledoit-Wolf shrinkage نحو مصفوفة قطرية متساوية (scaled identity).
+    returns: مصفوفة (T x N) بدون NaN
+    يرجّع (covariance, shrinkage_intensity)
+    """
+    x = returns - returns.mean(axis=0)
+    t, n = x.shape
+    sample = x.T @ x / t
+
+    mu = np.trace(sample) / n
+    target = mu * np.eye(n)
+    d2 = np.sum((sample - target) ** 2) / n
+
+    # sum_t ||x_t x_t' - S||^2 = sum_t |x_t|^4 - T ||S||^2
+    row_norms = np.sum(x ** 2, axis=1)
+    b2_bar = (np.sum(row_norms ** 2) - t * np.sum(sample ** 2)) / (t ** 2) / n
+    b2 = min(b2_bar, d2)
+
+    shrinkage = b2 / d2 if d2 > 0 else 1.0
+    return shrinkage * target + (1.0 - shrinkage) * sample, float(shrinkage)
+
+
+class ScenarioEngine:
+    """
+    holdings: pf_df من build_portfolio (أعمدة symbol, shares, last_price)
+    returns: DataFrame عوائد يومية (dates x symbols) لنفس الأسهم
+    cash: الكاش المتبقي (ثابت في كل السيناريوهات)
+    """
+
+    def __init__(self, holdings, returns, cash=0.0):
+        held = holdings[holdings["shares"] > 0]
+        symbols = [sym for sym in held["symbol"] if sym in returns.columns]
+        if not symbols:
+            raise ValueError("لا توجد عوائد تاريخية لأسهم المحفظة.")
+
+        held = held.set_index("symbol").loc[symbols]
+        self.symbols = symbols
+        self.position_values = (held["shares"] * held["last_price"]).values.astype(float)
+        self.cash = float(cash)
+        self.start_value = float(self.position_values.sum() + self.cash)
+
+        self.returns = returns[symbols].dropna(how="all").fillna(0.0).values
+        if len(self.returns) < 2:
+            raise ValueError("عدد الأيام التاريخية غير كاف للمحاكاة.")
+
+        self.mean = self.returns.mean(axis=0)
+        self.cov, self.shrinkage = shrunk_covariance(self.returns)
+
+    # ------------------------------------------------------------------
+    # توليد عوائد يومية لدفعة مسارات: (paths, horizon, N)
+    # ------------------------------------------------------------------
+    def _normal_chunk(self, rng, n_paths, horizon):
+        chol = np.linalg.cholesky(self.cov + 1e-12 * np.eye(len(self.symbols)))
+        z = rng.standard_normal((n_paths, horizon, len(self.symbols)))
+        return self.mean + z @ chol.T
+
+    def _bootstrap_chunk(self, rng, n_paths, horizon, block_size):
+        t = len(self.returns)
+        block_size = max(1, min(block_size, t))
+        n_blocks = -(-horizon // block_size)
+        starts = rng.integers(0, t - block_size + 1, size=(n_paths, n_blocks))
+        idx = (starts[:, :, None] + np.arange(block_size)).reshape(n_paths, -1)[:, :horizon]
+        return self.returns[idx]
+
+    # ------------------------------------------------------------------
+    # المحاكاة
+    # ------------------------------------------------------------------
+    def simulate(self, horizon_days=126, n_paths=10000, method="normal", block_size=10,
+                 chunk_size=2000, seed=None, percentiles=DEFAULT_PERCENTILES, band_step=5):
+        """
+        يرجّع dict فيه:
+        - terminal: DataFrame لقيمة المحفظة النهائية عند كل percentile
+        - drawdown: DataFrame لأقصى تراجع خلال الأفق عند كل percentile
+        - bands: DataFrame (يوم x percentile) لقيمة المحفظة كل band_step يوم
+        - prob_loss: احتمال إن القيمة النهائية أقل من القيمة الحالية
+        """
+        if method not in ("normal", "bootstrap"):
+            raise ValueError(f"طريقة محاكاة غير معروفة: {method}")
+
+        horizon_days = int(horizon_days)
+        band_days = np.arange(band_step, horizon_days + 1, band_step)
+        if len(band_days) == 0 or band_days[-1] != horizon_days:
+            band_days = np.append(band_days, horizon_days)
+
+        terminal = np.empty(n_paths)
+        max_dd = np.empty(n_paths)
+        bands = np.empty((n_paths, len(band_days)))
+
+        # seed لكل chunk مشتق من الـ seed الأساسي → نتيجة قابلة للتكرار
+        n_chunks = -(-n_paths // chunk_size)
+        child_seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+
+        for c, child in enumerate(child_seeds):
+            rng = np.random.default_rng(child)
+            lo = c * chunk_size
+            hi = min(lo + chunk_size, n_paths)
+            m = hi - lo
+
+            if method == "normal":
+                daily = self._normal_chunk(rng, m, horizon_days)
+            else:
+                daily = self._bootstrap_chunk(rng, m, horizon_days, block_size)
+
+            # قيمة كل مركز عبر الزمن ثم قيمة المحفظة (مع الكاش)
+            growth = np.cumprod(1.0 + daily, axis=1)
+            values = growth @ self.position_values + self.cash
+
+            max_dd[lo:hi] = max_drawdown(values.T, start=self.start_value)
+            terminal[lo:hi] = values[:, -1]
+            bands[lo:hi] = values[:, band_days - 1]
+
+        pct = list(percentiles)
+        return {
+            "start_value": self.start_value,
+            "horizon_days": horizon_days,
+            "method": method,
+            "n_paths": n_paths,
+            "shrinkage": self.shrinkage,
+            "terminal": pd.DataFrame({
+                "percentile": pct,
+                "value": np.percentile(terminal, pct),
+                "return": np.percentile(terminal, pct) / self.start_value - 1.0,
+            }),
+            "drawdown": pd.DataFrame({
+                "percentile": pct,
+                "max_drawdown": np.percentile(max_dd, pct),
+            }),
+            "bands": pd.DataFrame(
+                np.percentile(bands, pct, axis=0).T,
+                index=pd.Index(band_days, name="day"),
+                columns=[f"p{p}" for p in pct],
+            ),
+            "prob_loss": float(np.mean(terminal < self.start_value)),
+        }
@@ -0,0 +1,124 @@
+"""
+تنفيذ مرحلة العوامل كـ pipeline متدفق (streaming) للأكوان الكبيرة جداً والتاريخ الطويل.
+
+بدل ما كل الأسعار تتجمع في dict واحد قبل أي حساب، الأسهم بتعدي على مراحل generators:
+    fetch (دفعة أسهم) → validate → عوامل كل سهم → تجميع الصفوف في جدول العوامل
+- الذاكرة محدودة بحجم الدفعة: مصفوفات الإغلاق/الحجم بتتبني لدفعة واحدة بس وبتتساب بعد
+  ما صفوفها (ملخص صغير لكل سهم) تتضاف للجدول. ده بشرط إن fetch ما يحتفظش بالبيانات في
+  مكان تاني (الـ builder بيشيل الأسهم اللي حمّلها من مخزن الأسعار بعد حساب دفعتها)،
+  فأقصى شموع خام في نفس الوقت حوالي (1 + STREAM_PREFETCH_CHUNKS) دفعة. اللي بيفضل لكل
+  سهم بعد دفعته هو اللي المراحل بعد العوامل بتقراه: صفه في الجدول (فيه الـ spread) وعوائده
+  اليومية لفترة الـ lookback (عمود float واحد، أصغر كتير من شموع OHLCV)
+- دفعة ما ينفعش يتحسب لها عوامل بيتعامل معاها score (الـ builder بيسيبها بتقرير جودتها بس)
+- تحميل الدفعة الجاية بيحصل في thread في الخلفية أثناء حساب الدفعة الحالية
+  (طابور محدود بـ STREAM_PREFETCH_CHUNKS دفعة عشان التحميل ما يسبقش الحساب بكتير)
+- التطبيع عبر الكون مش هنا: بيحصل في الآخر في score_factors على جدول الملخص
+
+كل العوامل بتتحسب عمود عمود، فالنتيجة هي نفس الحساب الكامل طالما أسهم الدفعة ليها
+نفس تقويم الجلسات بتاع الكون. العوامل اللي نافذتها بعدد صفوف (rsi, drawdown, beta, ...
+بـ iloc[-window:]) بتتحسب على تقويم الدفعة، فلو تقويم دفعة مختلف (مثلاً كل أسهمها
+موقوفة آخر كام جلسة) قيمها لأسهم الدفعة دي بتختلف عن serial. ده مقصود: المحاذاة على
+تقويم الكون كله محتاجة تحميل كل الأسهم قبل أول حساب، وده عكس فكرة الـ pipeline.
+"""
+import queue
+import threading
+
+import pandas as pd
+
+# عدد الأسهم في الدفعة الواحدة
+STREAM_CHUNK_SYMBOLS = 128
+# أقصى عدد دفعات محمّلة مستنية الحساب
+STREAM_PREFETCH_CHUNKS = 2
+
+_DONE = object()
+
+
+def iter_chunks(symbols, size=STREAM_CHUNK_SYMBOLS):
+    """
+    الأسهم على دفعات متصلة بنفس الترتيب
+    """
+    if size < 1:
+        raise ValueError("حجم الدفعة لازم يكون 1 أو أكتر.")
+    chunk = []
+    for sym in symbols:
+        chunk.append(sym)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def prefetched(chunks, fetch, depth=STREAM_PREFETCH_CHUNKS):
+    """
+    يرجّع fetch(chunk) لكل دفعة بنفس الترتيب، والتحميل شغال في thread في الخلفية
+    بحد أقصى depth دفعة جاهزة. أي خطأ في fetch بيترفع عند الدفعة بتاعته.
+    لو المستهلك وقف بدري (break / close) الـ thread بيقف بعد الدفعة اللي في إيده.
+    """
+    results = queue.Queue(maxsize=max(int(depth), 1))
+    stop = threading.Event()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker():
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    return
+                try:
+                    item = (fetch(chunk), None)
+                except Exception as e:
+                    item = (None, e)
+                if not _put(item):
+                    return
+        finally:
+            _put((_DONE, None))
+
+    thread = threading.Thread(target=_worker, name="factor-stream-fetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            value, error = results.get()
+            if value is _DONE:
+                return
+            if error is not None:
+                raise error
+            yield value
+    finally:
+        stop.set()
+        thread.join()
+
+
+def reduce_tables(parts):
+    """
+    يجمع (factor_df, quality) لكل دفعة في جدول واحد وتقرير جودة واحد.
+    الدفعات الفاضية (None) بتتساب، ولو كلها فاضية بنرجّع (None, None).
+    """
+    factor_frames = []
+    quality_frames = []
+    for factor_df, quality in parts:
+        if quality is not None:
+            quality_frames.append(quality)
+        if factor_df is not None:
+            factor_frames.append(factor_df)
+
+    if not factor_frames:
+        return None, pd.concat(quality_frames, ignore_index=True) if quality_frames else None
+    return pd.concat(factor_frames, ignore_index=True), pd.concat(quality_frames, ignore_index=True)
+
+
+def stream_factor_table(symbols, fetch, score, chunk_size=STREAM_CHUNK_SYMBOLS, depth=STREAM_PREFETCH_CHUNKS):
+    """
+    fetch(chunk) -> history {symbol: Series} لدفعة أسهم (بيشتغل في الخلفية)
+    score(history) -> (factor_df, quality) للدفعة، أو (None, quality) لو مافيش أسهم صالحة فيها
+    يرجّع (factor_df, quality) للكون كله (factor_df = None لو مافيش أي سهم صالح)
+    """
+    histories = prefetched(iter_chunks(symbols, chunk_size), fetch, depth)
+    return reduce_tables(score(history) for history in histories if history)
@@ -0,0 +1,115 @@
+import os
+import sys
+import functools
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# الموديولات في جذر الريبو (مفيش package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_portfolio_builder_v2  # noqa: E402
+import build_memo  # noqa: E402
+import circuit_breaker  # noqa: E402
+import egx_yahoo  # noqa: E402
+import price_store  # noqa: E402
+from ai_portfolio_builder_v2 import AIPortfolioBuilderV2  # noqa: E402
+from streaming_factors import stream_factor_table  # noqa: E402
+
+DATES = pd.bdate_range("2024-01-01", periods=300)
+
+
+def fake_ohlcv(symbol, dates=DATES):
+    """
+    شموع يومية ثابتة لكل رمز (random walk بـ seed من الرمز نفسه)
+    """
+    rng = np.random.default_rng(zlib.crc32(symbol.encode("utf-8")))
+    close = 50.0 * np.cumprod(1.0 + rng.normal(0.0005, 0.02, len(dates)))
+    return pd.DataFrame(
+        {
+            "Open": close,
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": rng.integers(100_000, 1_000_000, len(dates)).astype(float),
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        },
+        index=dates,
+    )
+
+
+class FakeYahoo:
+    """
+    بديل yfinance محلي: download بنفس شكل النتيجة (أعمدة symbol x field).
+    frames: شموع مخصوصة لرمز، delays: تأخير (ثواني) لأي طلب فيه الرمز،
+    missing: رموز مالهاش بيانات، calls: كل الطلبات (الرموز، start).
+    """
+
+    def __init__(self):
+        self.frames = {}
+        self.delays = {}
+        self.missing = set()
+        self.calls = []
+
+    def download(self, symbols, start=None, end=None, **kwargs):
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        self.calls.append((tuple(symbols), start))
+
+        delay = max((self.delays.get(sym, 0.0) for sym in symbols), default=0.0)
+        if delay:
+            time.sleep(delay)
+
+        frames = {}
+        for sym in symbols:
+            if sym in self.missing:
+                continue
+            frame = self.frames[sym] if sym in self.frames else fake_ohlcv(sym)
+            if start is not None:
+                frame = frame[frame.index >= pd.Timestamp(start)]
+            if end is not None:
+                frame = frame[frame.index < pd.Timestamp(end)]
+            frames[sym] = frame
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+
+@pytest.fixture
+def fake_yahoo(monkeypatch):
+    fake = FakeYahoo()
+    monkeypatch.setattr(egx_yahoo, "_yf", lambda: fake)
+    return fake
+
+
+@pytest.fixture(autouse=True)
+def fresh_defaults(monkeypatch):
+    """
+    مخزن الأسعار والـ memo والـ circuit breaker الافتراضيين جداد لكل test
+    """
+    monkeypatch.setattr(price_store, "_DEFAULT_STORE", None)
+    monkeypatch.setattr(build_memo, "_DEFAULT_MEMO", None)
+    monkeypatch.setattr(circuit_breaker, "_DEFAULT_BREAKER", None)
+
+
+@pytest.fixture
+def make_builder(fake_yahoo):
+    def _make(universe=("A1", "A2", "A3", "A4"), **kwargs):
+        kwargs.setdefault("lookback_days", 200)
+        kwargs.setdefault("verbose", False)
+        return AIPortfolioBuilderV2(list(universe), **kwargs)
+
+    return _make
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # دفعات من سهمين عشان الـ stream يعدي على أكتر من دفعة
+    monkeypatch.setattr(
+        ai_portfolio_builder_v2, "stream_factor_table",
+        functools.partial(stream_factor_table, chunk_size=2),
+    )
@@ -0,0 +1,62 @@
+import pandas as pd
+
+from build_memo import BuildMemo, memo_key
+from conftest import fake_ohlcv
+from price_store import PriceStore
+
+
+def test_key_is_content_addressed():
+    assert memo_key(["a", "b"], {"x": 1, "y": 2}) == memo_key(["a", "b"], {"y": 2, "x": 1})
+    assert memo_key(["a", "b"], {"x": 1}) != memo_key(["a", "b"], {"x": 2})
+
+
+def test_lru_and_invalidation():
+    memo = BuildMemo(max_entries=2, disk_dir=None)
+    memo.put("k1", 1, symbols=["A.CA"])
+    memo.put("k2", 2, symbols=["B.CA"])
+    assert memo.get("k1") == 1
+    memo.put("k3", 3)
+    assert memo.get("k2") is None
+
+    memo.invalidate("A.CA")
+    assert memo.get("k1") is None and memo.get("k3") == 3
+    assert memo.stats() == {"entries": 1, "hits": 2, "misses": 2}
+
+
+def test_disk_layer_survives_a_new_memo(tmp_path):
+    BuildMemo(disk_dir=str(tmp_path)).put("k", {"value": 1}, symbols=["A.CA"])
+    assert BuildMemo(disk_dir=str(tmp_path)).get("k") == {"value": 1}
+
+
+def test_repeated_build_is_served_from_memo(make_builder, fake_yahoo):
+    store = PriceStore()
+    memo = BuildMemo(disk_dir=None)
+    params = dict(capital=100_000, max_stocks=3, max_weight_per_stock=0.4)
+
+    first = make_builder(store=store, memo=memo).build_portfolio(**params)
+    calls = len(fake_yahoo.calls)
+    second = make_builder(store=store, memo=memo).build_portfolio(**params)
+
+    pd.testing.assert_frame_equal(first[0], second[0])
+    assert first[1] == second[1]
+    assert len(fake_yahoo.calls) == calls
+    assert memo.stats()["hits"] >= 1
+
+    # قيد مختلف = مفتاح مختلف
+    other, _ = make_builder(store=store, memo=memo).build_portfolio(**dict(params, max_stocks=2))
+    assert len(other) == 2
+
+
+def test_price_update_invalidates_results(make_builder):
+    store = PriceStore()
+    memo = BuildMemo(disk_dir=None)
+    builder = make_builder(store=store, memo=memo)
+    before = builder.compute_factor_table()
+
+    frame = fake_ohlcv("A1.CA").iloc[-5:][["Open", "High", "Low", "Close", "Volume"]] * 1.5
+    frame.index = pd.bdate_range(frame.index[-1] + pd.offsets.BDay(), periods=5)
+    store.append("A1.CA", frame)
+    after = builder.compute_factor_table()
+
+    assert memo.stats()["entries"] == 1
+    assert before.set_index("symbol").loc["A1", "last_price"] != after.set_index("symbol").loc["A1", "last_price"]
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from build_memo import BuildMemo
+from portfolio_allocation import cap_weights, constrain_weights
+from price_store import PriceStore
+
+SECTORS = np.array(["banks", "banks", "banks", "telecom", "food"])
+
+
+def _group_sums(weights, labels):
+    return {name: weights[labels == name].sum() for name in np.unique(labels)}
+
+
+def test_cap_weights_redistributes_excess():
+    w = cap_weights(np.array([0.6, 0.3, 0.1]), np.full(3, 0.4))
+    np.testing.assert_allclose(w, [0.4, 0.4, 0.2])
+    assert w.sum() == pytest.approx(1.0)
+
+
+def test_sector_cap_is_respected_and_excess_redistributed():
+    w = constrain_weights(np.array([0.3, 0.25, 0.15, 0.2, 0.1]), caps=0.5, groups=[(SECTORS, 0.4)])
+
+    sums = _group_sums(w, SECTORS)
+    assert sums["banks"] == pytest.approx(0.4)
+    assert w.sum() == pytest.approx(1.0)
+    # داخل القطاع المقفول النسب بين الأسهم زي ما هي
+    np.testing.assert_allclose(w[:3] / w[:3].sum(), np.array([0.3, 0.25, 0.15]) / 0.7)
+    # الزيادة بتروح للقطاعات التانية بنسبة أوزانها
+    assert w[3] / w[4] == pytest.approx(2.0)
+
+
+def test_unplaceable_excess_stays_in_cash():
+    w = constrain_weights(np.array([0.5, 0.3, 0.2, 0.0, 0.0]), caps=0.5, groups=[(SECTORS, 0.4)])
+    assert _group_sums(w, SECTORS)["banks"] == pytest.approx(0.4)
+    assert w.sum() == pytest.approx(0.4)
+
+
+def test_per_group_caps_and_batches():
+    buckets = np.array(["large", "small", "small", "large", "small"])
+    batch = np.array([[0.3, 0.25, 0.15, 0.2, 0.1], [0.2, 0.2, 0.2, 0.2, 0.2]])
+    out = constrain_weights(batch, caps=0.3, groups=[(SECTORS, 0.5), (buckets, {"small": 0.3})])
+
+    assert out.shape == batch.shape
+    for w, row in zip(out, batch):
+        np.testing.assert_allclose(w, constrain_weights(row, caps=0.3, groups=[(SECTORS, 0.5), (buckets, {"small": 0.3})]))
+        assert _group_sums(w, SECTORS)["banks"] <= 0.5 + 1e-9
+        assert _group_sums(w, buckets)["small"] <= 0.3 + 1e-9
+        assert w.max() <= 0.3 + 1e-9
+
+
+def test_builder_applies_sector_caps(make_builder):
+    sectors = {"A1": "banks", "A2": "banks", "A3": "telecom", "A4": "food"}
+    builder = make_builder(store=PriceStore(), memo=BuildMemo(), sector_map=sectors)
+    pf_df, _ = builder.build_portfolio(capital=1_000_000, max_stocks=4, max_weight_per_stock=0.5,
+                                       sector_caps={"banks": 0.3})
+
+    banks = pf_df[pf_df["sector"] == "banks"]
+    assert banks["weight_target"].sum() <= 0.3 + 1e-9
+    assert set(pf_df["sector"]) <= {"banks", "telecom", "food"}
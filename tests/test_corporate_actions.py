@@ -0,0 +1,42 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from corporate_actions import adjustment_factors
+
+
+def _close(values):
+    return pd.Series(values, index=pd.bdate_range("2024-01-01", periods=len(values)), dtype=float)
+
+
+def test_unrecorded_split_is_inferred():
+    factors = adjustment_factors(_close([100.0, 100.0, 50.0, 50.0]))
+    assert factors["price"].tolist() == [0.5, 0.5, 1.0, 1.0]
+    assert factors["volume"].tolist() == [2.0, 2.0, 1.0, 1.0]
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [10.0, 10.5, 11.0, 0.0],                 # صفر في آخر شمعة
+        [10.0, 10.5, 0.0, 0.0, 11.0, 11.2],      # صفرين ورا بعض في النص
+        [10.0, 10.5, -1.0, 11.0, 11.2],          # سعر سالب
+        [10.0, np.nan, 0.0, 10.8, 11.0],         # NaN جنب صفر
+    ],
+)
+def test_nonpositive_prices_are_not_splits(values):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        factors = adjustment_factors(_close(values))
+    assert factors["price"].tolist() == [1.0] * len(values)
+    assert factors["volume"].tolist() == [1.0] * len(values)
+
+
+def test_recorded_split_next_to_zero_price_is_ignored():
+    close = _close([10.0, 0.0, 5.0, 5.0])
+    actions = pd.DataFrame({"dividend": [0.0], "split": [2.0]}, index=close.index[[1]])
+    factors = adjustment_factors(close, actions)
+    assert np.isfinite(factors["price"]).all()
+    assert (factors["price"] > 0).all()
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from build_memo import BuildMemo
+from conftest import fake_ohlcv
+from data_quality import STALE_RUN, validate_panel
+from price_store import PriceStore
+
+
+def _panel():
+    close = pd.DataFrame({sym: fake_ohlcv(sym)["Close"] for sym in ("A1.CA", "A2.CA", "A3.CA")})
+    close.iloc[50, 0] *= 10.0          # glitch: خطأ 10× ورجوع في الشمعة اللي بعدها
+    close.iloc[80, 0] = -1.0           # سعر سالب
+    close.iloc[100:100 + STALE_RUN, 1] = close.iloc[99, 1]
+    close.iloc[200:, 2] *= 2.0         # قفزة حقيقية بدون رجوع
+    return close
+
+
+def test_report_counts_each_problem():
+    _, report = validate_panel(_panel(), policy="flag")
+
+    assert report.loc["A1.CA", ["glitches", "nonpositive"]].tolist() == [1, 1]
+    assert report.loc["A2.CA", "stale"] == STALE_RUN
+    assert report.loc["A3.CA", ["spikes", "glitches"]].tolist() == [1, 0]
+    assert not report["quarantined"].any()
+    assert report.loc["A3.CA", "quality_score"] < 1.0
+
+
+def test_repair_blanks_bad_bars_only():
+    close = _panel()
+    clean, report = validate_panel(close, policy="repair")
+
+    assert np.isnan(clean.iloc[50, 0]) and np.isnan(clean.iloc[80, 0])
+    assert clean.iloc[100:100 + STALE_RUN, 1].isna().sum() == STALE_RUN
+    # القفزة من غير رجوع ممكن تكون حدث حقيقي فبتفضل زي ما هي
+    pd.testing.assert_series_equal(clean["A3.CA"], close["A3.CA"])
+    assert clean.notna().sum().sum() == close.size - 2 - STALE_RUN
+
+
+def test_quarantine_drops_low_quality_symbols():
+    close = _panel()
+    close.iloc[::3, 1] = 0.0
+    clean, report = validate_panel(close, policy="quarantine")
+    assert list(clean.columns) == ["A1.CA", "A3.CA"]
+    assert report["quarantined"].tolist() == [False, True, False]
+
+    with pytest.raises(ValueError):
+        validate_panel(close, policy="drop")
+
+
+def test_last_price_comes_from_repaired_close(make_builder, fake_yahoo):
+    frame = fake_ohlcv("A1.CA")
+    frame.iloc[-1, frame.columns.get_loc("Close")] = 0.0
+    fake_yahoo.frames["A1.CA"] = frame
+
+    builder = make_builder(store=PriceStore(), memo=BuildMemo())
+    pf_df, _ = builder.build_portfolio(capital=100_000, max_stocks=4, max_weight_per_stock=0.4)
+
+    # الإغلاق الصفري اتصلح (NaN) فآخر سعر هو الإغلاق اللي قبله
+    last_price = builder.last_factor_df.set_index("symbol")["last_price"]
+    assert last_price["A1"] == pytest.approx(frame["Close"].iloc[-2])
+    assert (pf_df["last_price"] > 0).all()
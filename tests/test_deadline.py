@@ -0,0 +1,138 @@
+import time
+
+import pytest
+
+from build_memo import BuildMemo
+from circuit_breaker import CircuitBreaker, get_default_breaker
+from conftest import fake_ohlcv
+from egx_yahoo import EGXYahoo
+from price_store import PriceStore
+
+HEALTHY = [f"A{i}" for i in range(1, 9)]
+UNIVERSE = HEALTHY + ["SLOW"]
+DEADLINE = 0.5
+
+
+@pytest.fixture
+def slow_symbol(fake_yahoo):
+    fake_yahoo.delays["SLOW.CA"] = 2.0
+    return fake_yahoo
+
+
+def _timed(func):
+    t0 = time.monotonic()
+    result = func()
+    return result, time.monotonic() - t0
+
+
+def test_slow_symbol_is_dropped_alone(make_builder, slow_symbol):
+    builder = make_builder(UNIVERSE, deadline_seconds=DEADLINE, memo=BuildMemo())
+    factor_df, elapsed = _timed(builder.compute_factor_table)
+
+    assert elapsed < DEADLINE + 0.5
+    assert builder.last_dropped_symbols == ["SLOW"]
+    assert builder.last_stale_symbols == []
+    assert sorted(factor_df["symbol"]) == HEALTHY
+    assert not factor_df["stale"].any()
+
+
+def test_cold_build_uses_batched_requests(make_builder, fake_yahoo):
+    builder = make_builder(HEALTHY, deadline_seconds=DEADLINE, memo=BuildMemo())
+    builder.compute_factor_table()
+
+    # طلب مجمع واحد لكل PREFETCH_BATCH_SYMBOLS سهم بدل طلب لكل سهم
+    assert [len(symbols) for symbols, _ in fake_yahoo.calls] == [8]
+    assert builder.last_dropped_symbols == []
+
+
+def test_slow_batch_is_split_per_symbol(make_builder, slow_symbol):
+    # السهم البطيء في نفس الدفعة مع 7 أسهم سليمة
+    universe = ["SLOW"] + HEALTHY[:7]
+    builder = make_builder(universe, deadline_seconds=DEADLINE, memo=BuildMemo())
+    factor_df, elapsed = _timed(builder.compute_factor_table)
+
+    assert elapsed < DEADLINE + 0.5
+    assert builder.last_dropped_symbols == ["SLOW"]
+    assert sorted(factor_df["symbol"]) == HEALTHY[:7]
+    batch, *singles = [symbols for symbols, _ in slow_symbol.calls]
+    assert len(batch) == 8
+    assert sorted(singles) == sorted((f"{sym}.CA",) for sym in universe)
+    assert get_default_breaker()._failures == {"SLOW.CA": 1}
+
+
+def test_missed_refresh_falls_back_to_cached_bars(make_builder, slow_symbol):
+    store = PriceStore(max_age_seconds=1.0)
+    make_builder(UNIVERSE, store=store).egx.prefetch(UNIVERSE)
+    time.sleep(1.1)
+
+    builder = make_builder(UNIVERSE, store=store, deadline_seconds=DEADLINE, memo=BuildMemo())
+    factor_df, elapsed = _timed(builder.compute_factor_table)
+
+    assert elapsed < DEADLINE + 0.5
+    assert builder.last_stale_symbols == ["SLOW"]
+    assert builder.last_dropped_symbols == []
+    assert factor_df.set_index("symbol")["stale"].to_dict() == {sym: sym == "SLOW" for sym in UNIVERSE}
+
+
+def test_drop_policy_excludes_stale_symbols(make_builder, slow_symbol):
+    store = PriceStore(max_age_seconds=1.0)
+    make_builder(UNIVERSE, store=store).egx.prefetch(UNIVERSE)
+    time.sleep(1.1)
+
+    builder = make_builder(UNIVERSE, store=store, deadline_seconds=DEADLINE, stale_policy="drop", memo=BuildMemo())
+    pf_df, _ = builder.build_portfolio(capital=100_000, max_stocks=9, max_weight_per_stock=0.3)
+
+    assert builder.last_dropped_symbols == ["SLOW"]
+    assert "SLOW" not in set(pf_df["symbol"])
+
+
+def test_repeated_timeouts_open_only_the_slow_symbol(make_builder, slow_symbol):
+    for _ in range(3):
+        make_builder(UNIVERSE, store=PriceStore(), deadline_seconds=DEADLINE, memo=BuildMemo()).compute_factor_table()
+    assert get_default_breaker().open_symbols() == ["SLOW.CA"]
+
+    # السهم المقفول بيتخطى من غير طلب ولا انتظار
+    slow_symbol.calls.clear()
+    builder = make_builder(UNIVERSE, store=PriceStore(), deadline_seconds=DEADLINE, memo=BuildMemo())
+    _, elapsed = _timed(builder.compute_factor_table)
+    assert elapsed < DEADLINE
+    assert builder.last_dropped_symbols == ["SLOW"]
+    assert all("SLOW.CA" not in symbols for symbols, _ in slow_symbol.calls)
+
+
+def test_unknown_stale_policy(make_builder):
+    with pytest.raises(ValueError):
+        make_builder(UNIVERSE, deadline_seconds=DEADLINE, stale_policy="keep")
+
+
+def test_prefetch_timeout_keeps_late_data(fake_yahoo):
+    fake_yahoo.delays["SLOW.CA"] = 0.3
+    store = PriceStore()
+    egx = EGXYahoo(["A1", "SLOW"], verbose=False, store=store)
+
+    assert egx.prefetch(timeout=0.1) == ["A1.CA"]
+    assert egx.breaker._failures == {"SLOW.CA": 1}
+    # الطلب المتأخر بيكمل في الخلفية ونتيجته بتدخل المخزن
+    time.sleep(0.4)
+    assert store.has("SLOW.CA")
+    assert len(store.get("SLOW.CA")) == len(fake_ohlcv("SLOW.CA"))
+
+
+def test_circuit_breaker_cooldown_and_reset():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=0.1)
+    breaker.record_failure("X")
+    assert breaker.allow("X")
+    breaker.record_failure("X")
+    assert not breaker.allow("X")
+    assert breaker.open_symbols() == ["X"]
+
+    # بعد المدة محاولة واحدة (half-open): الفشل بيقفله تاني والنجاح بيصفّره
+    time.sleep(0.15)
+    assert breaker.allow("X")
+    breaker.record_failure("X")
+    assert not breaker.allow("X")
+
+    time.sleep(0.15)
+    breaker.record_success("X")
+    breaker.record_failure("X")
+    assert breaker.allow("X")
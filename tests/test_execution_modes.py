@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+import ai_portfolio_builder_v2
+from build_memo import BuildMemo
+
+UNIVERSE = [f"S{i}" for i in range(8)]
+
+
+@pytest.fixture
+def force_parallel(monkeypatch):
+    # الكون صغير على حد التقسيم التلقائي: نفرض شريحتين
+    def _choose(n_cells, n_items, execution="auto", workers=None, **kwargs):
+        return ("parallel", 2) if execution == "parallel" else ("serial", 1)
+
+    calls = []
+    sharded = ai_portfolio_builder_v2.compute_factor_table_sharded
+
+    def _sharded(*args, **kwargs):
+        calls.append(kwargs.get("n_shards"))
+        return sharded(*args, **kwargs)
+
+    monkeypatch.setattr(ai_portfolio_builder_v2, "choose_execution", _choose)
+    monkeypatch.setattr(ai_portfolio_builder_v2, "compute_factor_table_sharded", _sharded)
+    return calls
+
+
+def _table(make_builder, execution):
+    # memo لكل builder: المفتاح مستقل عن طريقة التنفيذ فكان هيرجّع نتيجة الـ serial
+    builder = make_builder(UNIVERSE, execution=execution, memo=BuildMemo())
+    return builder.compute_factor_table().sort_values("symbol").reset_index(drop=True)
+
+
+def test_parallel_and_stream_match_serial(make_builder, small_chunks, force_parallel):
+    serial = _table(make_builder, "serial")
+    for execution in ("parallel", "stream"):
+        pd.testing.assert_frame_equal(_table(make_builder, execution), serial, check_exact=True)
+    assert force_parallel == [2]
+
+
+def test_portfolios_match_across_modes(make_builder, small_chunks, force_parallel):
+    results = {}
+    for execution in ("serial", "parallel", "stream"):
+        builder = make_builder(UNIVERSE, execution=execution, memo=BuildMemo())
+        results[execution] = builder.build_portfolio(capital=100_000, max_stocks=5, max_weight_per_stock=0.4)
+
+    pf_serial, cash_serial = results["serial"]
+    for execution in ("parallel", "stream"):
+        pf, cash = results[execution]
+        pd.testing.assert_frame_equal(pf, pf_serial, check_exact=True)
+        assert cash == cash_serial
+    assert force_parallel == [2]
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from factor_normalization import NORMALIZATION_METHODS, normalize_cross_section
+
+
+def test_minmax_matches_scalar_formula():
+    values = np.array([3.0, 1.0, np.nan, 5.0])
+    out = normalize_cross_section(values, "minmax")
+    np.testing.assert_allclose(out[[0, 1, 3]], [0.5, 0.0, 1.0])
+    assert np.isnan(out[2])
+
+    # كل القيم متساوية → 0.5 للكل (زي _min_max_normalize القديمة)
+    np.testing.assert_array_equal(normalize_cross_section(np.full(3, 7.0), "minmax"), [0.5, 0.5, 0.5])
+
+
+def test_rank_matches_pandas_average_rank():
+    values = np.array([4.0, 1.0, 4.0, np.nan, 2.0, 9.0])
+    expected = pd.Series(values).rank(method="average", pct=False).sub(1).div(4).to_numpy()
+    np.testing.assert_allclose(normalize_cross_section(values, "rank"), expected)
+
+
+def test_zscore_is_robust_to_outliers():
+    values = np.append(np.arange(1.0, 20.0), 1e9)
+    out = normalize_cross_section(values, "zscore", winsor_quantile=0.1)
+    assert out.min() >= 0.0 and out.max() <= 1.0
+    # القيمة الشاذة بتتقص عند الـ quantile، فباقي الأسهم ما بتتضغطش جنب بعض
+    assert out[-1] == out[-2]
+    raw = normalize_cross_section(values, "zscore", winsor_quantile=0.0)
+    assert np.ptp(out[:-1]) > 10 * np.ptp(raw[:-1])
+
+
+def test_sector_neutral_ranks_within_each_sector():
+    values = np.array([1.0, 2.0, 100.0, 200.0])
+    groups = ["banks", "banks", "telecom", "telecom"]
+    out = normalize_cross_section(values, "sector", groups=groups)
+    np.testing.assert_allclose(out[:2], out[2:])
+    assert out[0] < 0.5 < out[1]
+
+    with pytest.raises(ValueError):
+        normalize_cross_section(values, "sector")
+
+
+@pytest.mark.parametrize("method", [m for m in NORMALIZATION_METHODS if m != "sector"])
+def test_batched_matches_one_factor_at_a_time(method):
+    rng = np.random.default_rng(0)
+    panel = rng.normal(size=(3, 20, 4))
+    panel[0, 5, 1] = np.nan
+
+    out = normalize_cross_section(panel, method)
+    assert out.shape == panel.shape
+    for d in range(panel.shape[0]):
+        for f in range(panel.shape[2]):
+            np.testing.assert_allclose(out[d, :, f], normalize_cross_section(panel[d, :, f], method))
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        normalize_cross_section(np.ones(3), "softmax")
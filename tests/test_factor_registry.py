@@ -0,0 +1,47 @@
+import pytest
+
+from build_memo import BuildMemo
+from conftest import fake_ohlcv
+from factor_registry import FACTOR_REGISTRY, Factor, FactorConfig, FactorContext, compute_factors, register_factor
+from price_store import PriceStore
+
+
+def _context(symbols=("A1.CA", "A2.CA", "A3.CA")):
+    return FactorContext({sym: fake_ohlcv(sym)["Close"] for sym in symbols})
+
+
+def test_only_active_factors_and_their_inputs_are_computed():
+    ctx = _context()
+    factor_df = compute_factors(ctx, FactorConfig(weights={"mom": 1.0, "risk": 0.0}))
+
+    assert "mom_score_raw" in factor_df.columns
+    assert "risk_score_raw" not in factor_df.columns
+    assert ctx.computed_inputs() == ["close"]
+
+
+def test_user_defined_factor(monkeypatch):
+    monkeypatch.setitem(FACTOR_REGISTRY, "last_close", None)
+    register_factor(Factor(
+        "last_close", inputs=("close",), output="last_close_raw", score_column="last_close_score",
+        compute=lambda ctx, window: ctx.get("close").iloc[-1].rename("last_close_raw").to_frame(),
+    ))
+    factor_df = compute_factors(_context(), FactorConfig(weights={"last_close": 1.0}))
+    assert factor_df["last_close_raw"].tolist() == [fake_ohlcv(s)["Close"].iloc[-1] for s in ("A1.CA", "A2.CA", "A3.CA")]
+
+    with pytest.raises(ValueError):
+        FactorConfig(weights={"unknown": 1.0})
+
+
+def test_momentum_blend_follows_window(make_builder, fake_yahoo):
+    config = FactorConfig(params={"mom": {"window": 252}})
+    builder = make_builder(store=PriceStore(), memo=BuildMemo(), factor_config=config, lookback_days=400)
+    factor_df = builder.compute_factor_table()
+
+    # 126 جلسة ليها اسم معروف (6m)، والباقي بعدد الجلسات
+    assert {"mom_42d", "mom_6m", "mom_252d"} <= set(factor_df.columns)
+    assert "mom_1m" not in factor_df.columns
+    assert factor_df["mom_252d"].notna().all()
+
+    close = fake_ohlcv("A1.CA")["Close"]
+    expected = close.iloc[-1] / close.iloc[-252] - 1.0
+    assert factor_df.set_index("symbol").loc["A1", "mom_252d"] == pytest.approx(expected)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from build_memo import BuildMemo
+from conftest import fake_ohlcv
+from egx_yahoo import EGXYahoo
+from portfolio_allocation import liquidity_caps
+from price_store import PriceStore
+
+
+def test_liquidity_caps():
+    caps = liquidity_caps(1_000_000, [2_000_000, np.nan, 50_000], 0.1)
+    np.testing.assert_allclose(caps, [0.2, np.inf, 0.005])
+
+
+def test_store_keeps_compact_ohlcv(fake_yahoo):
+    store = PriceStore()
+    egx = EGXYahoo(["A1"], verbose=False, store=store)
+    frame = egx.get_ohlcv("A1", adjusted=False)
+
+    assert list(frame.columns) == ["Open", "High", "Low", "Close", "Volume"]
+    assert frame["Close"].dtype == np.float64 and frame["Volume"].dtype == np.float32
+    np.testing.assert_array_equal(frame["Close"].to_numpy(), fake_ohlcv("A1.CA")["Close"].to_numpy())
+
+
+def test_positions_respect_traded_value_cap(make_builder):
+    builder = make_builder(store=PriceStore(), memo=BuildMemo())
+    pf_df, cash_left = builder.build_portfolio(capital=10_000_000, max_stocks=4, max_weight_per_stock=0.5,
+                                               max_adv_fraction=0.01)
+
+    assert (pf_df["market_value"] <= 0.01 * pf_df["avg_traded_value"] + 1e-6).all()
+    assert pf_df["liquidity_capped"].all()
+    assert pf_df["market_value"].sum() + cash_left == pytest.approx(10_000_000)
+
+
+def test_snapshot_without_adtv_column(make_builder):
+    builder = make_builder(store=PriceStore(), memo=BuildMemo())
+    snapshot = builder.compute_factor_table().drop(columns=["avg_traded_value"], errors="ignore")
+
+    pf_df, cash_left = builder.build_portfolio(capital=100_000, max_stocks=4, max_weight_per_stock=0.4,
+                                               factor_snapshot=snapshot, max_adv_fraction=0.1)
+    assert len(pf_df) > 0
+    assert pf_df["avg_traded_value"].isna().all()
+    assert pf_df["market_value"].sum() + cash_left == pytest.approx(100_000)
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from build_memo import BuildMemo
+from conftest import DATES, fake_ohlcv
+from price_store import PriceStore
+
+UNIVERSE = ["A1", "A2", "A3", "A4", "A5"]
+AS_OF = DATES[249]
+
+
+def test_as_of_build_matches_build_on_that_day(make_builder, fake_yahoo):
+    # build بـ as_of على كل التاريخ = build عادي لو البيانات كانت واقفة عند as_of
+    history = make_builder(UNIVERSE, store=PriceStore(), memo=BuildMemo())
+    past_df = history.compute_factor_table(as_of=AS_OF)
+    past_pf, past_cash = history.build_portfolio(capital=100_000, max_stocks=4, max_weight_per_stock=0.4, as_of=AS_OF)
+
+    for sym in UNIVERSE:
+        fake_yahoo.frames[f"{sym}.CA"] = fake_ohlcv(f"{sym}.CA").loc[:AS_OF]
+    live = make_builder(UNIVERSE, store=PriceStore(), memo=BuildMemo())
+    live_df = live.compute_factor_table()
+    live_pf, live_cash = live.build_portfolio(capital=100_000, max_stocks=4, max_weight_per_stock=0.4)
+
+    columns = [col for col in live_df.columns if col != "fund_score_raw"]
+    pd.testing.assert_frame_equal(past_df[columns], live_df[columns], check_exact=True)
+    pd.testing.assert_frame_equal(past_pf, live_pf, check_exact=True)
+    assert past_cash == live_cash
+
+
+def test_as_of_is_reproducible_after_new_bars(make_builder, fake_yahoo):
+    builder = make_builder(UNIVERSE, store=PriceStore(), memo=BuildMemo())
+    for sym in UNIVERSE:
+        fake_yahoo.frames[f"{sym}.CA"] = fake_ohlcv(f"{sym}.CA").iloc[:280]
+    before = builder.compute_factor_table(as_of=AS_OF)
+
+    # شموع جديدة بعد as_of ما بتغيرش النتيجة
+    builder.egx.store.append("A1.CA", fake_ohlcv("A1.CA").iloc[280:][["Open", "High", "Low", "Close", "Volume"]])
+    after = builder.compute_factor_table(as_of=AS_OF)
+    pd.testing.assert_frame_equal(before, after, check_exact=True)
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_risk import PortfolioRiskAnalyzer
+
+
+def _returns(n_days=500, seed=0):
+    rng = np.random.default_rng(seed)
+    cov = np.array([[4.0, 1.0, 0.0], [1.0, 2.0, 0.5], [0.0, 0.5, 1.0]]) * 1e-4
+    values = rng.multivariate_normal([0.0005, 0.0003, 0.0001], cov, size=n_days)
+    return pd.DataFrame(values, columns=["A", "B", "C"], index=pd.bdate_range("2023-01-02", periods=n_days))
+
+
+def test_historical_var_and_cvar_from_the_tail():
+    returns = pd.DataFrame({"A": np.linspace(-0.10, 0.09, 20)})
+    var, cvar = PortfolioRiskAnalyzer(pd.Series({"A": 1.0}), returns).historical_var(alpha=0.9)
+
+    tail = np.sort(returns["A"].to_numpy())
+    assert var == pytest.approx(-np.quantile(tail, 0.1))
+    assert cvar == pytest.approx(-tail[tail <= np.quantile(tail, 0.1)].mean())
+    assert cvar >= var
+
+
+def test_parametric_var_uses_portfolio_volatility():
+    analyzer = PortfolioRiskAnalyzer(pd.Series({"A": 0.5, "B": 0.3, "C": 0.2}), _returns())
+    var, cvar = analyzer.parametric_var(alpha=0.99)
+
+    w = analyzer.weights
+    sigma = np.sqrt(w @ analyzer.cov @ w)
+    mu = w @ analyzer.mean
+    assert var == pytest.approx(2.3263478740 * sigma - mu, rel=1e-6)
+    assert cvar == pytest.approx(2.6652142203 * sigma - mu, rel=1e-6)
+    # أفق أطول بيكبر الـ VaR بجذر عدد الأيام تقريباً
+    assert analyzer.parametric_var(alpha=0.99, horizon_days=4)[0] == pytest.approx(2 * sigma * 2.3263478740 - 4 * mu, rel=1e-6)
+
+
+@pytest.mark.parametrize("method", ["bootstrap", "normal"])
+def test_simulated_var_is_seeded_and_close_to_closed_form(method):
+    analyzer = PortfolioRiskAnalyzer(pd.Series({"A": 0.5, "B": 0.3, "C": 0.2}), _returns(2000))
+    first = analyzer.simulated_var(alpha=0.95, n_paths=50_000, method=method, seed=7)
+    assert analyzer.simulated_var(alpha=0.95, n_paths=50_000, method=method, seed=7) == first
+
+    parametric = analyzer.parametric_var(alpha=0.95)
+    assert first[0] == pytest.approx(parametric[0], rel=0.1)
+    assert first[1] == pytest.approx(parametric[1], rel=0.1)
+
+    with pytest.raises(ValueError):
+        analyzer.simulated_var(method="garch")
+
+
+def test_risk_contributions_sum_to_volatility():
+    analyzer = PortfolioRiskAnalyzer(pd.Series({"A": 0.5, "B": 0.3, "C": 0.2}), _returns())
+    contributions = analyzer.risk_contributions()
+
+    assert contributions["risk_share"].sum() == pytest.approx(1.0)
+    assert contributions["component_risk"].sum() == pytest.approx(analyzer.portfolio_vol() * np.sqrt(250))
+    assert contributions["symbol"].iloc[0] == "A"
+
+
+def test_max_drawdown_and_report_in_pounds():
+    returns = pd.DataFrame({"A": [0.1, -0.5, 0.2, 0.0]})
+    analyzer = PortfolioRiskAnalyzer(pd.Series({"A": 1.0}), returns, portfolio_value=1000.0)
+    assert analyzer.max_drawdown() == pytest.approx(-0.5)
+
+    summary, _ = analyzer.report(alpha=0.75, n_paths=100, seed=1)
+    assert summary["historical_var_egp"] == pytest.approx(summary["historical_var"] * 1000.0)
+
+
+def test_portfolio_without_returns():
+    with pytest.raises(ValueError):
+        PortfolioRiskAnalyzer(pd.Series({"Z": 1.0}), _returns())
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from egx_yahoo import EGXYahoo
+from price_store import PriceStore
+
+
+def _expire(store, symbol):
+    with store._lock:
+        stored_at, value = store._items[symbol]
+        store._items[symbol] = (stored_at - store.max_age_seconds - 1, value)
+
+
+def test_stale_entries_stay_readable(fake_yahoo):
+    store = PriceStore(max_age_seconds=60)
+    egx = EGXYahoo(["A1"], verbose=False, store=store)
+    egx.prefetch()
+    _expire(store, "A1.CA")
+
+    assert not store.has("A1.CA")
+    assert store.is_stale("A1.CA")
+    assert store.get("A1.CA") is None
+    assert len(store.get("A1.CA", allow_stale=True)) == 300
+    assert store.last_date("A1.CA") == pd.Timestamp("2025-02-21")
+    assert egx.data_status(["A1", "A2"]) == {"A1": "stale", "A2": "missing"}
+
+
+def test_expired_symbols_are_refreshed_incrementally(fake_yahoo):
+    store = PriceStore(max_age_seconds=60)
+    egx = EGXYahoo(["A1", "A2"], verbose=False, store=store)
+    egx.prefetch()
+    full = store.get("A1.CA")
+
+    # آخر 3 شموع ناقصة والبيانات قديمة: التحديث بيطلب من آخر تاريخ مخزن بس
+    with store._lock:
+        stored_at, value = store._items["A1.CA"]
+        store._items["A1.CA"] = (stored_at - 61, value.iloc[:-3])
+    fake_yahoo.calls.clear()
+
+    assert egx.prefetch() == ["A1.CA"]
+    assert len(fake_yahoo.calls) == 1
+    symbols, start = fake_yahoo.calls[0]
+    assert symbols == ("A1.CA",) and start is not None
+    pd.testing.assert_frame_equal(store.get("A1.CA"), full)
+    assert store.has("A1.CA")
+
+
+def test_evict_notifies_listeners(fake_yahoo):
+    store = PriceStore()
+    EGXYahoo(["A1", "A2"], verbose=False, store=store).prefetch()
+    changed = []
+    store.add_listener(changed.append)
+
+    store.evict(["A1.CA", "ZZZ.CA"])
+    assert store.symbols() == ["A2.CA"]
+    assert changed == ["A1.CA"]
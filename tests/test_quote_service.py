@@ -0,0 +1,108 @@
+import gc
+import time
+
+import pandas as pd
+import pytest
+
+from quote_service import FakeQuoteFeed, PortfolioRevaluer, QuoteService
+
+
+def _portfolio():
+    return pd.DataFrame({"symbol": ["A", "B"], "shares": [10, 20], "last_price": [100.0, 50.0]})
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_revaluer_updates_changed_symbols_only():
+    revaluer = PortfolioRevaluer(_portfolio(), cash=500.0)
+    assert revaluer.update({"A": 110.0, "Z": 1.0}) == 1
+
+    summary = revaluer.summary()
+    assert summary["market_value"] == pytest.approx(10 * 110.0 + 20 * 50.0)
+    assert summary["total_value"] == pytest.approx(summary["market_value"] + 500.0)
+    assert summary["pnl"] == pytest.approx(100.0)
+    assert revaluer.frame()["price"].tolist() == [110.0, 50.0]
+
+
+def test_poll_sends_only_changes():
+    feed = FakeQuoteFeed({"A": 100.0, "B": 50.0}, volatility=0.0)
+    service = QuoteService(["A", "B"], feed=feed)
+    received = []
+    service.subscribe(received.append)
+
+    assert service.poll_once() == {"A": 100.0, "B": 50.0}
+    assert service.poll_once() == {}
+    feed.set_price("B", 51.0)
+    assert service.poll_once() == {"B": 51.0}
+    assert received == [{"A": 100.0, "B": 50.0}, {"B": 51.0}]
+
+
+def test_shared_service_polls_subscribed_symbols():
+    feed = FakeQuoteFeed({"A": 100.0, "B": 50.0, "C": 10.0}, volatility=0.0)
+    service = QuoteService(feed=feed, interval_seconds=60)
+    service.start()
+    try:
+        first = PortfolioRevaluer(_portfolio())
+        service.subscribe(first.update, symbols=["A", "B"])
+        # أسهم جديدة بتصحّي الـ polling فوراً بدل ما تستنى interval_seconds
+        assert _wait_for(lambda: first.updated_at is not None)
+
+        second = PortfolioRevaluer(pd.DataFrame({"symbol": ["C"], "shares": [1], "last_price": [9.0]}))
+        service.subscribe(second.update, symbols=["C"])
+        service.unsubscribe(first.update)
+        assert service.symbols == ["C"]
+        assert _wait_for(lambda: second.updated_at is not None)
+        assert second.summary()["market_value"] == 10.0
+    finally:
+        service.stop(timeout=1.0)
+    assert not service.running
+
+
+class RecordingFeed(FakeQuoteFeed):
+    def __init__(self, prices):
+        super().__init__(prices, volatility=0.0)
+        self.requests = []
+
+    def fetch(self, symbols):
+        self.requests.append(list(symbols))
+        return super().fetch(symbols)
+
+
+def test_unsubscribe_drops_symbols_from_next_poll():
+    feed = RecordingFeed({"A": 100.0, "B": 50.0, "C": 10.0})
+    service = QuoteService(["A"], feed=feed)
+    revaluer = PortfolioRevaluer(_portfolio())
+    service.subscribe(revaluer.update, symbols=["A", "B", "C"])
+    service.poll_once()
+
+    service.unsubscribe(revaluer.update)
+    service.poll_once()
+    assert feed.requests == [["A", "B", "C"], ["A"]]
+
+
+def test_dead_subscriber_is_dropped_with_its_symbols():
+    feed = RecordingFeed({"A": 100.0, "B": 50.0, "C": 10.0})
+    service = QuoteService(feed=feed)
+    kept = PortfolioRevaluer(_portfolio())
+    service.subscribe(kept.update, symbols=["A", "B"])
+    gone = PortfolioRevaluer(pd.DataFrame({"symbol": ["C"], "shares": [1], "last_price": [9.0]}))
+    service.subscribe(gone.update, symbols=["C"])
+    received = []
+    service.subscribe(received.append)
+
+    # جلسة اتقفلت من غير unsubscribe: الخدمة مش ماسكة الـ revaluer
+    del gone
+    gc.collect()
+    service.poll_once()
+
+    assert feed.requests == [["A", "B"]]
+    assert service.symbols == ["A", "B"]
+    assert len(service._subscribers) == 2
+    assert kept.updated_at is not None and received == [{"A": 100.0, "B": 50.0}]
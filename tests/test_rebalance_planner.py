@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from rebalance_planner import RebalancePlanner, load_holdings
+
+PRICES = {"A": 10.0, "B": 20.0, "C": 7.0, "D": 20.0}
+
+
+def _planner(**kwargs):
+    kwargs.setdefault("max_weight_per_stock", 0.35)
+    kwargs.setdefault("no_trade_band", 0.02)
+    return RebalancePlanner(pd.Series({"A": 0.3, "B": 0.3, "C": 0.3}), pd.Series(PRICES), **kwargs)
+
+
+def test_no_trade_band_lots_and_exits():
+    # A وزنه 0.29 (جوه النطاق)، D مش في الهدف، و C بيتشري بـ lots من 100
+    trades, summary = _planner(lot_sizes={"C": 100}).plan({"A": 2900, "D": 500}, cash=61_000.0)
+    by_symbol = trades.set_index("symbol")
+
+    assert "A" not in by_symbol.index
+    assert by_symbol.loc["D", "side"] == "SELL" and by_symbol.loc["D", "target_shares"] == 0
+    assert by_symbol.loc["C", "target_shares"] % 100 == 0
+    assert by_symbol.loc["B", "side"] == "BUY"
+    assert (trades["weight_after"] <= 0.35 + 1e-12).all()
+    assert summary["portfolio_value"] == pytest.approx(100_000.0)
+    assert summary["cash_after"] >= 0.0
+    assert summary["turnover"] == pytest.approx(trades["trade_value"].abs().sum())
+
+
+def test_overweight_holding_trades_inside_the_band():
+    # الهدف 0.4 بيتقص لـ 0.35، والوزن الحالي 0.36 قريب منه بس فوق الحد فلازم يتباع
+    planner = RebalancePlanner(pd.Series({"A": 0.4}), pd.Series(PRICES), max_weight_per_stock=0.35,
+                               no_trade_band=0.05)
+    trades, _ = planner.plan({"A": 3600}, cash=64_000.0)
+
+    assert trades["symbol"].tolist() == ["A"]
+    assert trades["side"].iloc[0] == "SELL"
+    assert trades["weight_after"].iloc[0] <= 0.35
+
+
+def test_unpriced_holding_uses_lookup_or_fails():
+    planner = _planner(price_lookup=lambda sym: 5.0 if sym == "E" else None)
+    trades, _ = planner.plan({"E": 100}, cash=10_000.0)
+    assert trades.set_index("symbol").loc["E", "price"] == 5.0
+
+    with pytest.raises(ValueError):
+        planner.plan({"Z": 100}, cash=10_000.0)
+
+
+def test_batch_reads_holdings_files(tmp_path):
+    (tmp_path / "client1.csv").write_text("symbol,shares\na,2900\nD,500\nCASH,61000\n")
+    (tmp_path / "client2.csv").write_text("symbol,shares\nZ,10\n")
+
+    shares, cash = load_holdings(tmp_path / "client1.csv")
+    assert shares.to_dict() == {"A": 2900, "D": 500} and cash == 61_000.0
+
+    summary = _planner().plan_batch(str(tmp_path / "*.csv"), out_dir=str(tmp_path / "out"))
+    assert summary["client"].tolist() == ["client1", "client2"]
+    assert pd.isna(summary.loc[0, "error"]) and isinstance(summary.loc[1, "error"], str)
+    assert (tmp_path / "out" / "client1_trades.csv").exists()
@@ -0,0 +1,68 @@
+import datetime as dt
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from results_store import ResultsStore, _has_pyarrow, export_frames, universe_key
+
+FORMATS = ["csv", pytest.param("parquet", marks=pytest.mark.skipif(not _has_pyarrow(), reason="pyarrow غير متاح"))]
+
+
+def _portfolio(weights):
+    return pd.DataFrame({
+        "symbol": list(weights),
+        "shares": [100] * len(weights),
+        "last_price": [10.5] * len(weights),
+        "market_value": [1050.0] * len(weights),
+        "weight_target": list(weights.values()),
+    })
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_save_and_load_round_trip(tmp_path, fmt):
+    store = ResultsStore(root=str(tmp_path), fmt=fmt)
+    pf_df = _portfolio({"A1": 0.6, "A2": 0.4})
+    factor_df = pd.DataFrame({"symbol": ["A1", "A2", "A3"], "total_score": [0.9, 0.5, 0.1 + 0.2]})
+
+    build_id = store.save_build(pf_df, 123.456789, factor_df, universe=["A1", "A2", "A3"],
+                                params={"capital": 10000, "max_stocks": 2})
+    loaded_pf, cash_left, loaded_factors = store.load_build(build_id)
+
+    pd.testing.assert_frame_equal(loaded_pf, pf_df)
+    pd.testing.assert_frame_equal(loaded_factors, factor_df)
+    assert cash_left == 123.456789
+
+    index = store.list_builds(universe=["A3", "A2", "A1"], params={"max_stocks": 2, "capital": 10000})
+    assert index["build_id"].tolist() == [build_id]
+    assert index["universe_key"].iloc[0] == universe_key(["a1", "a2", "a3"])
+
+
+def test_weight_drift_across_builds(tmp_path):
+    store = ResultsStore(root=str(tmp_path), fmt="csv")
+    universe = ["A1", "A2", "A3"]
+    first = dt.datetime(2024, 1, 1)
+    store.save_build(_portfolio({"A1": 0.5, "A2": 0.5}), 0.0, universe=universe, built_at=first)
+    store.save_build(_portfolio({"A1": 0.7, "A3": 0.3}), 0.0, universe=universe, built_at=first + dt.timedelta(days=1))
+
+    drift = store.weight_drift(universe)
+    assert drift.to_dict("list") == {"A1": [0.5, 0.7], "A2": [0.5, 0.0], "A3": [0.0, 0.3]}
+
+
+def test_load_unknown_build(tmp_path):
+    with pytest.raises(ValueError):
+        ResultsStore(root=str(tmp_path), fmt="csv").load_build("missing")
+
+
+def test_export_csv_zip():
+    frames = {"portfolio": _portfolio({"A1": 1.0}), "factors": None}
+    data, file_name, mime = export_frames(frames, "csv")
+
+    assert file_name.endswith(".zip") and mime == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == ["portfolio.csv"]
+        pd.testing.assert_frame_equal(pd.read_csv(archive.open("portfolio.csv")), frames["portfolio"])
+
+    with pytest.raises(ValueError):
+        export_frames(frames, "json")
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scenario_engine import ScenarioEngine, shrunk_covariance
+
+
+def _inputs(n_days=400):
+    rng = np.random.default_rng(3)
+    returns = pd.DataFrame(rng.normal(0.0004, 0.015, size=(n_days, 3)), columns=["A", "B", "C"])
+    holdings = pd.DataFrame({"symbol": ["A", "B", "C", "D"], "shares": [100, 50, 0, 10],
+                             "last_price": [10.0, 40.0, 5.0, 1.0]})
+    return holdings, returns
+
+
+@pytest.mark.parametrize("method", ["normal", "bootstrap"])
+def test_same_seed_same_scenarios(method):
+    engine = ScenarioEngine(*_inputs(), cash=500.0)
+    first = engine.simulate(horizon_days=60, n_paths=3000, method=method, chunk_size=1000, seed=42)
+    second = engine.simulate(horizon_days=60, n_paths=3000, method=method, chunk_size=1000, seed=42)
+
+    for key in ("terminal", "drawdown", "bands"):
+        pd.testing.assert_frame_equal(first[key], second[key], check_exact=True)
+    assert first["prob_loss"] == second["prob_loss"]
+
+    other = engine.simulate(horizon_days=60, n_paths=3000, method=method, chunk_size=1000, seed=43)
+    assert not first["terminal"]["value"].equals(other["terminal"]["value"])
+
+
+def test_simulation_shape_and_cash():
+    engine = ScenarioEngine(*_inputs(), cash=500.0)
+    # الأسهم من غير عوائد أو من غير أسهم فعلية بتتساب، والكاش ثابت
+    assert engine.symbols == ["A", "B"]
+    assert engine.start_value == pytest.approx(100 * 10.0 + 50 * 40.0 + 500.0)
+
+    result = engine.simulate(horizon_days=23, n_paths=500, seed=0, band_step=5)
+    assert result["bands"].index.tolist() == [5, 10, 15, 20, 23]
+    assert result["bands"]["p50"].iloc[-1] == pytest.approx(result["terminal"].set_index("percentile").loc[50, "value"])
+    assert (result["drawdown"]["max_drawdown"] <= 0).all()
+    assert result["terminal"]["value"].is_monotonic_increasing
+    assert 0.0 <= result["prob_loss"] <= 1.0
+
+
+def test_shrunk_covariance_is_between_sample_and_target():
+    rng = np.random.default_rng(0)
+    returns = rng.normal(size=(30, 10))
+    cov, shrinkage = shrunk_covariance(returns)
+
+    assert 0.0 < shrinkage <= 1.0
+    np.testing.assert_allclose(cov, cov.T)
+    assert np.linalg.eigvalsh(cov).min() > 0
+
+
+def test_unknown_method_and_short_history():
+    holdings, returns = _inputs()
+    with pytest.raises(ValueError):
+        ScenarioEngine(holdings, returns).simulate(method="garch")
+    with pytest.raises(ValueError):
+        ScenarioEngine(holdings, returns.iloc[:1])
@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+from build_memo import BuildMemo
+from conftest import fake_ohlcv
+from factor_registry import FactorConfig
+from price_store import PriceStore
+from streaming_factors import iter_chunks, prefetched
+from transaction_costs import CostModel
+
+UNIVERSE = [f"S{i}" for i in range(8)]
+
+
+def test_stream_skips_chunk_that_cannot_be_scored(make_builder, fake_yahoo, small_chunks):
+    # دفعة كاملة تاريخها أقصر من نوافذ الزخم: الحساب الكامل بيتجاهلها وكذلك الـ stream
+    for sym in ("B1.CA", "B2.CA"):
+        fake_yahoo.frames[sym] = fake_ohlcv(sym).iloc[-15:]
+    universe = ["A1", "A2", "B1", "B2"]
+
+    for execution in ("serial", "stream"):
+        builder = make_builder(universe, execution=execution)
+        factor_df = builder.compute_factor_table()
+        assert factor_df.loc[~factor_df["quarantined"], "symbol"].tolist() == ["A1", "A2"]
+        assert sorted(builder.last_quality_df["symbol"]) == universe
+
+
+def test_stream_evicts_only_symbols_it_loaded(make_builder, small_chunks):
+    builder = make_builder(["A1", "A2", "A3"], execution="stream")
+    builder.egx.prefetch(["A1"])
+    builder.compute_factor_table()
+    assert builder.egx.store.symbols() == ["A1.CA"]
+
+
+def test_stream_matches_serial_with_costs_and_deadline(make_builder, fake_yahoo, small_chunks):
+    results = {}
+    for execution in ("serial", "stream"):
+        fake_yahoo.calls.clear()
+        builder = make_builder(UNIVERSE, execution=execution, store=PriceStore(), memo=BuildMemo(),
+                               cost_model=CostModel(), deadline_seconds=5.0)
+        pf_df, cash_left = builder.build_portfolio(capital=100_000, max_stocks=5, max_weight_per_stock=0.4)
+        returns = builder.get_returns_panel(pf_df["symbol"].tolist())
+        requested = [sym for symbols, _ in fake_yahoo.calls for sym in symbols]
+        results[execution] = (pf_df, cash_left, returns, requested)
+
+    pf_serial, cash_serial, returns_serial, requested_serial = results["serial"]
+    pf_stream, cash_stream, returns_stream, requested_stream = results["stream"]
+    pd.testing.assert_frame_equal(pf_stream, pf_serial, check_exact=True)
+    assert cash_stream == cash_serial
+    pd.testing.assert_frame_equal(returns_stream, returns_serial, check_exact=True)
+    assert pf_stream["spread_est"].notna().all()
+
+    # كل سهم بيتحمل مرة واحدة: مفيش تحميل تاني للـ spread ولا لعوائد المحفظة بعد الـ build
+    expected = sorted(f"{sym}.CA" for sym in UNIVERSE)
+    assert sorted(requested_serial) == expected
+    assert sorted(requested_stream) == expected
+    assert len(fake_yahoo.calls) == len(UNIVERSE) // 2
+
+
+def test_iter_chunks_keeps_order():
+    assert list(iter_chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    with pytest.raises(ValueError):
+        list(iter_chunks([1], 0))
+
+
+def test_prefetched_keeps_order_and_raises_at_the_failing_chunk():
+    def fetch(chunk):
+        if chunk == [4]:
+            raise ValueError("bad chunk")
+        return chunk
+
+    results = prefetched(iter_chunks(range(5), 2), fetch, depth=1)
+    assert next(results) == [0, 1]
+    assert next(results) == [2, 3]
+    with pytest.raises(ValueError):
+        next(results)
+
+
+def test_stream_differs_only_where_chunk_calendars_differ(make_builder, fake_yahoo, small_chunks):
+    # A3 و A4 (دفعة لوحدهم) موقوفين آخر 3 جلسات: نوافذ الصفوف في الدفعة دي بتتحسب على تقويمها
+    for sym in ("A3.CA", "A4.CA"):
+        fake_yahoo.frames[sym] = fake_ohlcv(sym).iloc[:-3]
+    config = {"mom": 0.5, "rsi": 0.5}
+
+    tables = {}
+    for execution in ("serial", "stream"):
+        builder = make_builder(execution=execution, memo=BuildMemo(),
+                               factor_config=FactorConfig(weights=dict(config)))
+        tables[execution] = builder.compute_factor_table().set_index("symbol")
+    serial, stream = tables["serial"], tables["stream"]
+
+    pd.testing.assert_series_equal(serial["mom_score_raw"], stream["mom_score_raw"])
+    pd.testing.assert_series_equal(serial.loc[["A1", "A2"], "rsi"], stream.loc[["A1", "A2"], "rsi"])
+    assert (serial.loc[["A3", "A4"], "rsi"] != stream.loc[["A3", "A4"], "rsi"]).all()
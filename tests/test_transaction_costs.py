@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from build_memo import BuildMemo
+from price_store import PriceStore
+from transaction_costs import CostModel, corwin_schultz, estimate_spread
+
+RATES = dict(commission_rate=0.001, fees_rate=0.0002, stamp_tax_rate=0.0003, fixed_fee=5.0,
+             spread_fraction=0.5, default_spread=0.01, impact_coef=0.0)
+
+
+def test_order_cost_arithmetic():
+    model = CostModel(**RATES)
+    costs = model.order_costs([10_000.0, -10_000.0, 0.0], spread=[0.02, np.nan, 0.02])
+
+    # 5 + 10000 × (0.001 + 0.0002 + 0.0003 + 0.5 × spread)
+    np.testing.assert_allclose(costs, [5.0 + 10_000 * 0.0115, 5.0 + 10_000 * 0.0065, 0.0])
+
+
+def test_square_root_market_impact():
+    model = CostModel(**dict(RATES, impact_coef=1.0, default_daily_vol=0.02))
+    rate = model.proportional_rate([40_000.0, 40_000.0, 40_000.0], spread=0.0,
+                                   adtv=[1_000_000.0, np.nan, 0.0], daily_vol=[0.03, 0.03, np.nan])
+
+    base = 0.0015
+    np.testing.assert_allclose(rate, [base + 0.03 * np.sqrt(0.04), base, base])
+
+
+def test_sized_orders_fit_their_budgets():
+    model = CostModel(**dict(RATES, impact_coef=1.0))
+    budgets = np.array([10_000.0, 250_000.0, 3.0])
+    prices = np.array([7.3, 41.0, 1.0])
+    shares, costs = model.size_orders(budgets, prices, lot_sizes=[1, 10, 1], spread=0.02, adtv=500_000.0)
+
+    assert shares[1] % 10 == 0
+    assert shares[2] == 0 and costs[2] == 0.0
+    assert np.all(shares * prices + costs <= budgets)
+    # النسبة محسوبة على الميزانية كلها (أثر السوق لأكبر أمر ممكن)
+    rate = 0.0015 + 0.5 * 0.02 + 0.02 * np.sqrt(budgets / 500_000.0)
+    lots = np.array([1, 10, 1])
+    expected = np.floor(np.maximum(budgets - 5.0, 0.0) / (prices * lots * (1 + rate))) * lots
+    np.testing.assert_array_equal(shares, expected)
+
+
+def test_corwin_schultz_spread():
+    high = np.array([101.0, 102.0, 101.5, 102.5])
+    low = np.array([99.0, 100.0, 99.5, 100.5])
+    daily = corwin_schultz(high, low)
+
+    assert np.isnan(daily[0]) and np.all(daily[1:] >= 0)
+    assert estimate_spread(high[:, None], low[:, None])[0] == pytest.approx(np.nanmean(daily))
+    # مفيش فرق بين High و Low → spread صفر
+    assert estimate_spread(np.full((5, 1), 10.0), np.full((5, 1), 10.0))[0] == 0.0
+
+
+def test_builder_deducts_costs_from_cash(make_builder):
+    capital = 100_000.0
+    plain, plain_cash = make_builder(store=PriceStore(), memo=BuildMemo()).build_portfolio(
+        capital=capital, max_stocks=4, max_weight_per_stock=0.4)
+    costed, costed_cash = make_builder(store=PriceStore(), memo=BuildMemo(), cost_model=CostModel()).build_portfolio(
+        capital=capital, max_stocks=4, max_weight_per_stock=0.4)
+
+    assert (costed["trade_cost"] > 0).all()
+    assert costed_cash == pytest.approx(capital - costed["market_value"].sum() - costed["trade_cost"].sum())
+    assert costed_cash >= 0.0
+    assert costed["shares"].sum() <= plain["shares"].sum()
+    assert plain_cash == pytest.approx(capital - plain["market_value"].sum())
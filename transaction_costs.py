@@ -0,0 +1,136 @@
+"""
+نموذج تكاليف التنفيذ (عمولات + رسوم + ضرائب + spread + أثر السوق) لأوامر EGX.
+
+تكلفة أمر بقيمة V (جنيه):
+    fixed_fee + V × (commission + fees + stamp_tax + spread_fraction × spread + impact)
+- spread: مقدّر من أسعار High/Low اليومية (Corwin–Schultz) لكل سهم، ولو مش متاح
+  بناخد default_spread
+- impact = impact_coef × التذبذب اليومي × sqrt(V / متوسط قيمة التداول اليومي)
+  (نموذج الجذر التربيعي: الأمر الكبير بالنسبة لسيولة السهم بيحرّك السعر ضده)
+
+كل الدوال vectorized على كل الأوامر مرة واحدة (مصفوفات numpy)، فإضافتها لبناء
+المحفظة أو للـ backtest ما بتزودش وقت يذكر.
+القيم الافتراضية تقريبية – عدّلها حسب جدول عمولات السمسار.
+"""
+import warnings
+
+import numpy as np
+
+# نسب من قيمة الأمر (لكل جهة: شراء أو بيع)
+COMMISSION_RATE = 0.0015     # عمولة السمسرة
+FEES_RATE = 0.0003           # رسوم البورصة والمقاصة والرقابة المالية
+STAMP_TAX_RATE = 0.0005      # ضريبة الدمغة
+FIXED_FEE = 2.0              # رسم ثابت لكل أمر (جنيه)
+
+SPREAD_FRACTION = 0.5        # الأمر بيدفع نص الـ spread (الشراء بسعر العرض والبيع بسعر الطلب)
+DEFAULT_SPREAD = 0.01        # spread افتراضي لو مافيش High/Low كفاية
+IMPACT_COEF = 1.0
+DEFAULT_DAILY_VOL = 0.02     # تذبذب يومي افتراضي لأثر السوق
+
+
+def corwin_schultz(high, low):
+    """
+    تقدير الـ spread النسبي لكل يوم من High/Low لليوم ده واللي قبله (Corwin & Schultz 2012).
+    high / low: مصفوفات (dates x symbols) أو سلسلة واحدة. أول صف NaN، والتقديرات السالبة = 0.
+    """
+    h = np.asarray(high, dtype=float)
+    lo = np.asarray(low, dtype=float)
+    squeeze = h.ndim == 1
+    if squeeze:
+        h, lo = h[:, None], lo[:, None]
+
+    k = 3.0 - 2.0 * np.sqrt(2.0)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        hl = np.log(h / lo) ** 2
+        beta = hl[1:] + hl[:-1]
+        gamma = np.log(np.maximum(h[1:], h[:-1]) / np.minimum(lo[1:], lo[:-1])) ** 2
+        alpha = (np.sqrt(2.0 * beta) - np.sqrt(beta)) / k - np.sqrt(gamma / k)
+        spread = 2.0 * (np.exp(alpha) - 1.0) / (1.0 + np.exp(alpha))
+    spread = np.where(spread < 0, 0.0, spread)
+
+    daily = np.vstack([np.full((1, h.shape[1]), np.nan), spread])
+    return daily[:, 0] if squeeze else daily
+
+
+def estimate_spread(high, low):
+    """
+    متوسط الـ spread النسبي لكل سهم على كل الفترة (NaN لو مافيش تقدير)
+    """
+    daily = corwin_schultz(high, low)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmean(daily, axis=0)
+
+
+def _filled(values, default, shape):
+    if values is None:
+        return np.full(shape, default)
+    values = np.broadcast_to(np.asarray(values, dtype=float), shape)
+    return np.where(np.isnan(values), default, values)
+
+
+class CostModel:
+    def __init__(self, commission_rate=COMMISSION_RATE, fees_rate=FEES_RATE, stamp_tax_rate=STAMP_TAX_RATE,
+                 fixed_fee=FIXED_FEE, spread_fraction=SPREAD_FRACTION, default_spread=DEFAULT_SPREAD,
+                 impact_coef=IMPACT_COEF, default_daily_vol=DEFAULT_DAILY_VOL):
+        self.commission_rate = float(commission_rate)
+        self.fees_rate = float(fees_rate)
+        self.stamp_tax_rate = float(stamp_tax_rate)
+        self.fixed_fee = float(fixed_fee)
+        self.spread_fraction = float(spread_fraction)
+        self.default_spread = float(default_spread)
+        self.impact_coef = float(impact_coef)
+        self.default_daily_vol = float(default_daily_vol)
+
+    def key(self):
+        """
+        تمثيل ثابت للإعدادات (لمفتاح الـ memo)
+        """
+        return dict(sorted(vars(self).items()))
+
+    def proportional_rate(self, order_values, spread=None, adtv=None, daily_vol=None):
+        """
+        التكلفة النسبية (بدون الرسم الثابت) لكل أمر.
+        spread / adtv / daily_vol: لكل أمر (أو رقم واحد)، NaN = القيمة الافتراضية.
+        الأسهم اللي مالهاش متوسط قيمة تداول (adtv) ما عليهاش أثر سوق.
+        """
+        order_values = np.abs(np.asarray(order_values, dtype=float))
+        shape = order_values.shape
+
+        rate = (
+            self.commission_rate + self.fees_rate + self.stamp_tax_rate
+            + self.spread_fraction * _filled(spread, self.default_spread, shape)
+        )
+        if adtv is not None and self.impact_coef:
+            adtv = np.broadcast_to(np.asarray(adtv, dtype=float), shape)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                participation = np.where(adtv > 0, order_values / adtv, 0.0)
+            vol = _filled(daily_vol, self.default_daily_vol, shape)
+            rate = rate + self.impact_coef * vol * np.sqrt(np.nan_to_num(participation))
+        return rate
+
+    def order_costs(self, order_values, spread=None, adtv=None, daily_vol=None):
+        """
+        تكلفة كل أمر بالجنيه (الأوامر الصفرية تكلفتها صفر)
+        """
+        order_values = np.abs(np.asarray(order_values, dtype=float))
+        rate = self.proportional_rate(order_values, spread, adtv, daily_vol)
+        return np.where(order_values > 0, self.fixed_fee + order_values * rate, 0.0)
+
+    def size_orders(self, budgets, prices, lot_sizes=1, spread=None, adtv=None, daily_vol=None):
+        """
+        أوامر شراء: أقصى عدد أسهم (مضاعفات lot) لكل سهم بحيث قيمة الأسهم + تكلفة الأمر
+        ما تعديش الميزانية بتاعته. النسبة بتتحسب على الميزانية كلها، وأثر السوق بيزيد مع
+        حجم الأمر، فالتكلفة الفعلية للأمر بعد التقريب عمرها ما بتعدي التقدير.
+        يرجّع (shares: int array, costs: array بالجنيه)
+        """
+        budgets = np.asarray(budgets, dtype=float)
+        prices = np.asarray(prices, dtype=float)
+        lots = np.broadcast_to(np.asarray(lot_sizes, dtype=float), prices.shape)
+
+        rate = self.proportional_rate(budgets, spread, adtv, daily_vol)
+        net = np.maximum(budgets - self.fixed_fee, 0.0)
+        shares = (np.floor(net / (prices * lots * (1.0 + rate))) * lots).astype(int)
+
+        costs = self.order_costs(shares * prices, spread, adtv, daily_vol)
+        return shares, costs
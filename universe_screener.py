@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from egx_universe import load_egx_listing
+from egx_yahoo import EGXYahoo
+from factor_registry import nth_last_valid
+
+
+class UniverseScreener:
+    """
+    فلترة مبدئية سريعة لكل أسهم السوق قبل حساب العوامل المكلفة:
+    - طول التاريخ السعري (عدد الجلسات)
+    - السيولة (متوسط قيمة التداول اليومي)
+    - مستوى السعر
+    - الإيقاف: آخر شمعة قديمة أو حجم تداول صفر في آخر الجلسات
+
+    البيانات كلها بتتحمل في طلب مجمع واحد لمخزن الأسعار،
+    والفلترة بتتم على مصفوفة (dates x symbols) مرة واحدة بدون loop على الأسهم.
+    الأسهم الناجحة بتتمرر لـ AIPortfolioBuilderV2 وبتلاقي بياناتها في المخزن.
+    """
+
+    def __init__(self, symbols=None, min_history=126, min_avg_traded_value=1_000_000.0,
+                 min_price=1.0, liquidity_window=20, max_stale_days=7, halt_volume_days=5,
+                 auto_suffix=True, verbose=True, store=None):
+        self.symbols = list(symbols) if symbols is not None else load_egx_listing()
+        self.min_history = min_history
+        self.min_avg_traded_value = min_avg_traded_value
+        self.min_price = min_price
+        self.liquidity_window = liquidity_window
+        self.max_stale_days = max_stale_days
+        self.halt_volume_days = halt_volume_days
+        self.egx = EGXYahoo(self.symbols, auto_suffix=auto_suffix, verbose=verbose, store=store)
+        self.verbose = verbose
+
+        # آخر جدول فلترة لعرضه في الواجهة
+        self.last_screen_df = None
+
+    def _log(self, msg):
+        if self.verbose:
+            print(msg)
+
+    def _load_panels(self):
+        """
+        مصفوفتين (dates x symbols) للإغلاق والحجم من المخزن بعد تحميل مجمع واحد
+        """
+        self.egx.prefetch(self.symbols)
+
+        closes = {}
+        volumes = {}
+        for sym in self.symbols:
+            frame = self.egx.get_ohlcv(sym)
+            if frame is None or frame.empty:
+                continue
+            closes[sym] = frame["Close"]
+            if "Volume" in frame.columns:
+                volumes[sym] = frame["Volume"]
+
+        if not closes:
+            return pd.DataFrame(), pd.DataFrame()
+
+        close = pd.DataFrame(closes).sort_index()
+        volume = pd.DataFrame(volumes).reindex(index=close.index, columns=close.columns)
+        return close, volume
+
+    def screen(self):
+        """
+        يرجّع DataFrame لكل رموز السوق فيه مقاييس الفلترة وعمود passed وسبب الاستبعاد
+        """
+        close, volume = self._load_panels()
+        all_syms = pd.Index(self.symbols, name="symbol")
+
+        if close.empty:
+            df = pd.DataFrame(index=all_syms)
+            df["passed"] = False
+            df["reason"] = "no_data"
+            self.last_screen_df = df.reset_index()
+            return self.last_screen_df
+
+        values = close.values
+        valid = ~np.isnan(values)
+
+        history_len = valid.sum(axis=0)
+        last_price = nth_last_valid(values, 1)
+
+        # متوسط قيمة التداول على آخر liquidity_window جلسة للسهم (مش للسوق)
+        counts = history_len
+        rank_from_end = counts - np.cumsum(valid, axis=0) + 1
+        in_window = valid & (rank_from_end <= self.liquidity_window)
+        traded = np.where(in_window, values * np.nan_to_num(volume.values), 0.0)
+        n_window = in_window.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            adtv = np.where(n_window > 0, traded.sum(axis=0) / n_window, np.nan)
+
+        # الإيقاف: آخر شمعة أقدم من max_stale_days من آخر تاريخ في السوق
+        last_idx = np.where(valid.any(axis=0), len(close.index) - 1 - np.argmax(valid[::-1], axis=0), 0)
+        last_dates = close.index.values[last_idx]
+        stale_days = (close.index.values[-1] - last_dates) / np.timedelta64(1, "D")
+
+        # أو حجم تداول صفر في آخر halt_volume_days جلسة
+        recent = valid & (rank_from_end <= self.halt_volume_days)
+        recent_volume = np.where(recent, np.nan_to_num(volume.values), 0.0).sum(axis=0)
+        zero_volume = (recent_volume == 0) & volume.notna().any(axis=0).values
+
+        df = pd.DataFrame({
+            "history_len": history_len,
+            "last_price": last_price,
+            "avg_traded_value": adtv,
+            "stale_days": stale_days,
+            "zero_volume_recent": zero_volume,
+        }, index=close.columns).reindex(all_syms)
+
+        reasons = np.select(
+            [
+                df["history_len"].isna(),
+                df["history_len"] < self.min_history,
+                df["stale_days"] > self.max_stale_days,
+                df["zero_volume_recent"].fillna(False).astype(bool),
+                df["last_price"] < self.min_price,
+                df["avg_traded_value"] < self.min_avg_traded_value,
+            ],
+            ["no_data", "short_history", "halted", "halted", "low_price", "illiquid"],
+            default="",
+        )
+        df["passed"] = reasons == ""
+        df["reason"] = reasons
+
+        self.last_screen_df = df.reset_index()
+        self._log(f"✅ screener: {int(df['passed'].sum())}/{len(df)} symbols passed")
+        return self.last_screen_df
+
+    def survivors(self):
+        """
+        الرموز اللي عدّت الفلترة (مرتبة حسب السيولة من الأعلى)
+        """
+        df = self.screen()
+        passed = df[df["passed"]].sort_values("avg_traded_value", ascending=False)
+        return passed["symbol"].tolist()